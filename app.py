@@ -7,6 +7,9 @@ from datetime import datetime
 from src.models.recommender import ContentBasedRecommender
 from src.models.semantic_engine import SemanticEngine
 from src.models.emotion import EmotionDetector
+from src.models.emotion_stream import EmotionStream
+from src.models.hybrid import HybridRanker
+from src.models.filters import request_filters
 from src.logger import get_logger
 
 logger = get_logger(__name__)
@@ -34,12 +37,15 @@ def load_brains():
         
         emotion_detector = EmotionDetector()
         
-        return recommender, semantic_engine, emotion_detector
+        # Language Brain + Math Brain in one ranked list
+        hybrid_ranker = HybridRanker(semantic_engine, recommender)
+        
+        return recommender, semantic_engine, emotion_detector, hybrid_ranker
     except Exception as e:
         logger.error(f"Failed to load models: {e}")
-        return None, None, None
+        return None, None, None, None
 
-recommender, semantic_engine, emotion_detector = load_brains()
+recommender, semantic_engine, emotion_detector, hybrid_ranker = load_brains()
 
 # Custom CSS (Enhanced)
 st.markdown("""
@@ -105,39 +111,29 @@ def get_recommendations(user_input, emotion=None, language="All", region="Global
     The Master Algorithm.
     Combines: User Text + Facial Emotion + Language Filters + Diversity Logic.
     """
-    if not recommender:
-        return "⚠️ Brains initializing... please wait.", []
+    if not hybrid_ranker:
+        logger.warning("⚠️ Brains initializing... please wait.")
+        return [], {}
 
-    # 1. Update Query based on Filters
+    # 1. Filters the catalog has columns for are applied inside the index;
+    #    the rest can only nudge the query text
+    filters, unsupported = request_filters(semantic_engine.metadata, language, region)
     search_query = user_input
     if emotion:
         search_query += f" {emotion} mood"
-    if language != "All":
+    if 'language' in unsupported:
         search_query += f" {language} song"
     
-    # 2. Semantic Search (Main Results)
-    # Fetch MORE than needed so we can filter/shuffle
-    raw_results = semantic_engine.search(search_query, top_k=50)
-    
-    # 3. Apply Diversity / "Explore-Exploit"
-    # We want mostly what they asked for, but some surprises
+    # 2. Hybrid Search: Semantic matches (Exploit) + songs that SOUND like them
+    #    from the Math Model (Palette Cleansers), fused and diversified (MMR)
+    raw_results, timings = hybrid_ranker.rank(search_query, top_k=30, filters=filters)
+    logger.info("⏱️ Hybrid ranking: " + ", ".join(f"{stage} {ms:.1f} ms" for stage, ms in timings.items()))
     
+    # 3. One card per title
     final_recs = []
     seen_songs = set()
-    
-    # Add top 20 matches (Exploit)
-    for r in raw_results[:20]:
-        if r['name'] not in seen_songs:
-            final_recs.append(r)
-            seen_songs.add(r['name'])
-            
-    # Add 5 random "Palette Cleansers" from Math Model if possible
-    # (Simplified here to just shuffle the tail of semantic results)
-    import random
-    surprise_pool = raw_results[20:]
-    random.shuffle(surprise_pool)
-    for r in surprise_pool[:5]:
-         if r['name'] not in seen_songs:
+    for r in raw_results:
+        if r['name'] not in seen_songs and len(final_recs) < 25:
             final_recs.append(r)
             seen_songs.add(r['name'])
 
@@ -150,11 +146,12 @@ def get_recommendations(user_input, emotion=None, language="All", region="Global
             "artist": r['artist'],
             "score": r.get('score', 0),
             "tags": r.get('tags', ''),
+            "sources": r.get('sources', ''),
             "spotify_url": links['spotify'],
             "youtube_url": links['youtube']
         })
         
-    return display_recs
+    return display_recs, timings
 
 def display_song(song, index):
     with st.container():
@@ -202,28 +199,40 @@ def main():
             
             st.warning("Running Face AI on video stream... Click 'Start' below.")
             
-            # Simple processor to check emotion every 30 frames
+            # Face finder on every frame, emotion model on a worker thread every few frames
+            # (see src/models/emotion_stream.py), so the video never waits for DeepFace
             class EmotionProcessor(VideoTransformerBase):
                 def __init__(self):
-                    self.frame_count = 0
+                    self.stream = EmotionStream(emotion_detector)
                     
                 def transform(self, frame):
-                    self.frame_count += 1
                     img = frame.to_ndarray(format="bgr24")
+                    emotion, box = self.stream.process(img)
                     
-                    # Only analyze every 30th frame to prevent lag
-                    if self.frame_count % 30 == 0:
-                        try:
-                           # We can't easily return data to Streamlit main thread from here
-                           # But we can draw on the frame
-                           pass
-                        except:
-                            pass
-                            
+                    if box is not None:
+                        x, y, w, h = box
+                        cv2.rectangle(img, (x, y), (x + w, y + h), (84, 185, 29), 2)
+                        if emotion:
+                            cv2.putText(img, emotion.upper(), (x, max(20, y - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (84, 185, 29), 2)
+                    stats = self.stream.stats()
+                    cv2.putText(
+                        img, f"{stats['fps']:.0f} fps | model {stats['model_per_second']:.1f}/s",
+                        (10, img.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1
+                    )
                     return img
+                    
+                def on_ended(self):
+                    self.stream.close()
 
             ctx = webrtc_streamer(key="example", video_processor_factory=EmotionProcessor)
-            st.info("Real-time mode is viewing-only. For music updates, please use Snapshot mode for now as it is more stable.")
+            if ctx.video_processor and st.button("🎯 Use my current mood"):
+                stats = ctx.video_processor.stream.stats()
+                captured_emotion = stats['emotion']
+                if captured_emotion:
+                    st.success(f"Detected: {captured_emotion.upper()} 😲 ({stats['fps']:.0f} fps, model {stats['model_per_second']:.1f}/s)")
+                    st.session_state.pop('last_emotion', None)  # A new reading, even if the mood is the same
+                else:
+                    st.warning("No face yet. Look at the camera for a second.")
         
         st.markdown("---")
         if st.button("🗑️ Clear History"):
@@ -252,6 +261,8 @@ def main():
         
         if 'recs' in msg:
             st.markdown("###  🎹 Curated Playlist")
+            if msg.get('timings'):
+                st.caption("⏱️ " + " · ".join(f"{stage} {ms:.1f} ms" for stage, ms in msg['timings'].items()))
             for i, r in enumerate(msg['recs']):
                 display_song(r, i)
 
@@ -268,13 +279,14 @@ def handle_input(text, emotion=None, lang="All", reg="Global"):
         ai_msg = random.choice(responses)
         
         # 2. Get Songs
-        recs = get_recommendations(text, emotion=emotion, language=lang, region=reg)
+        recs, timings = get_recommendations(text, emotion=emotion, language=lang, region=reg)
         
         # Add AI Message
         st.session_state.chat_history.append({
             "type": "AI DJ", 
             "content": ai_msg,
-            "recs": recs
+            "recs": recs,
+            "timings": timings
         })
     st.rerun()
 
@@ -0,0 +1,453 @@
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from src.config import Config
+from src.models.topk import top_k, SongColumns
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+def synthetic_catalog(n, seed=0, start=0, tempo_shift=0.0):
+    """A fake catalog shaped like songs_raw.csv (ids start at 'start')"""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(start, start + n).astype(str)
+    return pd.DataFrame({
+        'name': np.char.add('Song ', ids),
+        'artist': np.char.add('Artist ', (rng.integers(0, max(1, n // 10), n)).astype(str)),
+        'id': ids,
+        'popularity': rng.integers(0, 100, n),
+        'search_tag': rng.choice(['genre:pop', 'genre:rock', 'mood:sad', 'workout'], n),
+        'danceability': rng.random(n),
+        'energy': rng.random(n),
+        'valence': rng.random(n),
+        'tempo': rng.normal(120 + tempo_shift, 25, n),
+        'acousticness': rng.random(n),
+        'instrumentalness': rng.random(n)
+    })
+
+def time_once(fn):
+    """Wall time of one fn() call in milliseconds (for slow, stateful calls)"""
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+def time_per_call(fn, repeat=20):
+    """Median wall time of fn() in milliseconds"""
+    fn()  # Warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+def bench_topk(sizes=(10_000, 100_000, 1_000_000), k=30):
+    """
+    Old path: full argsort + one df.iloc per hit.
+    New path: argpartition top-k + columnar gather.
+    """
+    logger.info(f"⏱️ Top-{k} selection + result assembly (ms per query)")
+    rng = np.random.default_rng(0)
+
+    for n in sizes:
+        data = synthetic_catalog(n)
+        columns = SongColumns(data)
+        scores = rng.standard_normal(n).astype(np.float32)
+
+        def old():
+            results = []
+            for idx in np.argsort(scores)[::-1][:k]:
+                song = data.iloc[idx]
+                results.append({
+                    'name': song['name'],
+                    'artist': song['artist'],
+                    'score': float(scores[idx]),
+                    'tags': song.get('search_tag', '')
+                })
+            return results
+
+        def new():
+            rows = top_k(scores, k)
+            return columns.gather(rows, scores[rows], fields={'name': 'name', 'artist': 'artist', 'tags': 'search_tag'})
+
+        assert [r['name'] for r in old()] == [r['name'] for r in new()[0]]
+
+        old_ms = time_per_call(old)
+        new_ms = time_per_call(new)
+        logger.info(f"   n={n:>9,}: argsort+iloc {old_ms:8.3f} ms | argpartition+columns {new_ms:8.3f} ms | {old_ms / new_ms:5.1f}x")
+
+def bench_refit(sizes=(10_000, 100_000, 1_000_000), new_fraction=0.01):
+    """
+    Adding 1% new songs to the recommender:
+    full retrain vs append with the frozen pipeline vs drift-triggered refit.
+    """
+    from src.models.recommender import ContentBasedRecommender
+
+    logger.info(f"⏱️ Recommender: adding {new_fraction:.0%} new songs (ms, including saving)")
+    # The neighbour table has its own benchmark (patch: restored even if a run fails)
+    with patch.object(Config, 'NEIGHBOUR_K', 0), tempfile.TemporaryDirectory() as tmp:
+        def fresh(catalog):
+            recommender = ContentBasedRecommender()
+            recommender.model_path = Path(tmp) / "recommender"
+            recommender.train(catalog)
+            return recommender
+
+        for n in sizes:
+            catalog = synthetic_catalog(n)
+            n_new = max(1, int(n * new_fraction))
+            similar = synthetic_catalog(n_new, seed=1, start=n)
+            drifted = synthetic_catalog(n_new, seed=1, start=n, tempo_shift=2000)
+
+            retrain_ms = time_once(lambda: fresh(pd.concat([catalog, similar], ignore_index=True)))
+
+            recommender = fresh(catalog)
+            append_ms = time_once(lambda: recommender.add_tracks(similar))
+            assert len(recommender.data) == n + n_new
+
+            recommender = fresh(catalog)
+            refit_ms = time_once(lambda: recommender.add_tracks(drifted))
+            assert recommender.stats.drift() < 1e-3  # Refit reset the baseline
+
+            logger.info(
+                f"   n={n:>9,}: full retrain {retrain_ms:9.1f} ms | append {append_ms:9.1f} ms "
+                f"({retrain_ms / append_ms:5.1f}x) | drift refit {refit_ms:9.1f} ms"
+            )
+
+def bench_neighbours(sizes=(10_000, 100_000), n_recommendations=10):
+    """
+    recommend(): live brute-force kneighbors vs precomputed neighbour table.
+    Also reports the one-off (offline) cost of building the table.
+    """
+    from src.models.recommender import ContentBasedRecommender
+
+    logger.info(f"⏱️ Recommender: top-{n_recommendations} for one seed song (ms per call)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            recommender = ContentBasedRecommender()
+            recommender.model_path = Path(tmp) / "recommender"
+            build_ms = time_once(lambda: recommender.train(synthetic_catalog(n)))
+            seeds = iter(np.random.default_rng(0).integers(0, n, 10_000))
+
+            table_ms = time_per_call(lambda: recommender.recommend_by_id(str(next(seeds)), n_recommendations))
+            table, recommender.neighbour_ids = recommender.neighbour_ids, None
+            live_ms = time_per_call(lambda: recommender.recommend_by_id(str(next(seeds)), n_recommendations))
+
+            logger.info(
+                f"   n={n:>9,}: live {live_ms:8.3f} ms | table {table_ms:8.3f} ms ({live_ms / table_ms:6.1f}x) | "
+                f"train incl. table {build_ms / 1000:6.1f} s, table {table.nbytes * 1.5 / 1e6:.1f} MB"
+            )
+
+def synthetic_embeddings(n, dim=384, n_topics=100, seed=0):
+    """Unit vectors clustered around topics (closer to real MiniLM output than pure noise)"""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    vectors = topics[rng.integers(0, n_topics, n)] + 0.7 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def bench_quantize(sizes=(100_000,), k=10):
+    """
+    float32 vs float16 vs int8 scoring (exact search), with and without re-ranking.
+    Runs on the bundled dataset's semantic index (if trained) + synthetic catalogs.
+    """
+    from src.models.index import quantization_report
+    from src.models.semantic_engine import SemanticEngine
+
+    catalogs = []
+    try:
+        engine = SemanticEngine()
+        engine.load_from_disk()
+        catalogs.append(('bundled', engine.song_embeddings))
+    except FileNotFoundError:
+        logger.warning("⚠️ No semantic index. Run train_semantic.py to include the bundled dataset.")
+    catalogs += [(f"synthetic n={n:,}", synthetic_embeddings(n)) for n in sizes]
+
+    for name, vectors in catalogs:
+        logger.info(f"⏱️ Quantized scoring, {name} ({len(vectors):,} x {vectors.shape[1]}), recall@{k} vs float32")
+        for row in quantization_report(vectors, k=k):
+            per_10m = row['mb'] / len(vectors) * 10_000_000 / 1000
+            logger.info(
+                f"   {row['quantization']:>7} rerank={row['rerank']}: {row['mb']:8.2f} MB "
+                f"({row['memory_saved']:4.0%} saved, {per_10m:5.1f} GB per 10M songs) | "
+                f"recall@{k} {row['recall@k']:.3f} | {row['ms_per_query']:.3f} ms/query"
+            )
+
+def bench_cosine(sizes=(10_000, 100_000), batch_sizes=(1, 32, 256), k=10):
+    """
+    Throughput of SemanticEngine scoring: one GEMV per query vs one GEMM per batch.
+    (That the scores are true cosine similarities is checked by tests/test_semantic_cosine.py)
+    """
+    from src.models.index import FlatIndex
+    from src.models.neighbours import unit_rows
+
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        raw = synthetic_embeddings(n) * rng.uniform(0.5, 3, (n, 1)).astype(np.float32)  # Different lengths
+        index = FlatIndex().build(unit_rows(raw))
+        queries = unit_rows(raw[rng.choice(n, max(batch_sizes), replace=False)])
+
+        for batch in batch_sizes:
+            block = queries[:batch]
+            gemv_ms = time_per_call(lambda: [index.search(q[None, :], k) for q in block], repeat=5)
+            gemm_ms = time_per_call(lambda: index.search(block, k), repeat=5)
+            logger.info(
+                f"   n={n:>9,} batch={batch:>4}: one by one {batch / gemv_ms * 1000:9.0f} q/s | "
+                f"batched {batch / gemm_ms * 1000:9.0f} q/s ({gemv_ms / gemm_ms:4.1f}x)"
+            )
+
+def bench_filters(sizes=(100_000,), selectivities=(1.0, 0.5, 0.1, 0.01, 0.001), batch=32, k=10):
+    """
+    Metadata filters applied BEFORE top-k vs scoring everything and blanking
+    the rest (post-filter). Both must return the same songs; the pre-filter
+    only scores the matching subset, so it gets faster as filters get narrower.
+    Also checks IVF recall under filters (narrow filters fall back to exact search).
+    """
+    from src.models.filters import MetadataIndex
+    from src.models.index import FlatIndex, IVFIndex
+
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        vectors = synthetic_embeddings(n)
+        queries = vectors[rng.choice(n, batch, replace=False)]
+
+        # Nested tags: 'sel:0.1' is on exactly 10% of the songs
+        order = rng.permutation(n)
+        tags = np.full(n, '', dtype=object)
+        for selectivity in selectivities:
+            tags[order[:max(1, int(n * selectivity))]] += f" sel:{selectivity}"
+        metadata_ms = time_once(lambda: MetadataIndex(pd.DataFrame({'search_tag': tags})))
+        metadata = MetadataIndex(pd.DataFrame({'search_tag': tags}))
+        logger.info(f"⏱️ Filtered search, n={n:,}, {batch} queries, k={k} (bitmap index built in {metadata_ms:.1f} ms)")
+
+        flat = FlatIndex().build(vectors)
+        ivf = IVFIndex(n_probe=8).build(vectors)
+        for selectivity in selectivities:
+            mask = metadata.mask(tags=f"sel:{selectivity}")
+            mask_ms = time_per_call(lambda: metadata.mask(tags=f"sel:{selectivity}"))
+
+            pre_scores, pre_ids = flat.search(queries, k, mask=mask)
+            flat.SUBSET_SCAN_RATIO = 0  # Force the post-filter path
+            post_scores, post_ids = flat.search(queries, k, mask=mask)
+            post_ms = time_per_call(lambda: flat.search(queries, k, mask=mask), repeat=5)
+            del flat.SUBSET_SCAN_RATIO
+            pre_ms = time_per_call(lambda: flat.search(queries, k, mask=mask), repeat=5)
+
+            assert np.array_equal(pre_ids, post_ids), "Pre-filter returned different songs than post-filter"
+            assert mask[pre_ids[pre_ids >= 0]].all(), "Filtered search returned a song outside the filter"
+
+            _, ivf_ids = ivf.search(queries, k, mask=mask)
+            found = [len(np.intersect1d(a[a >= 0], b[b >= 0])) for a, b in zip(ivf_ids, pre_ids)]
+            recall = sum(found) / max(1, int((pre_ids >= 0).sum()))
+            logger.info(
+                f"   {selectivity:>6.1%} of songs: mask {mask_ms:6.3f} ms | post-filter {post_ms:8.2f} ms | "
+                f"pre-filter {pre_ms:8.2f} ms ({post_ms / pre_ms:5.1f}x) | IVF recall@{k} {recall:.3f}"
+            )
+
+def bench_emotion_load(concurrency=(1, 8, 32), requests_per_level=64, batch_size=8):
+    """
+    Load test for /detect-emotion and /detect-emotion/batch: concurrent
+    uploads against the real app (in-process, real EmotionDetector).
+    Reports p50/p99 upload latency, 429s (backpressure), and /healthz
+    latency DURING the load: a blocked event loop shows up there first.
+    """
+    import asyncio
+    import cv2
+    import httpx
+    import server.api as api
+    from src.models.emotion import EmotionDetector
+
+    if api.emotion_detector is None:
+        api.emotion_detector = EmotionDetector()
+        api.emotion_detector.warm_up()
+
+    rng = np.random.default_rng(0)
+    # Smooth, camera-like frame (pure noise makes the face finder unrealistically slow)
+    frame = cv2.GaussianBlur(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8), (31, 31), 0)
+    frame = cv2.imencode('.jpg', frame)[1].tobytes()
+    single = {'file': ('frame.jpg', frame, 'image/jpeg')}
+    batch = [('files', (f'frame{i}.jpg', frame, 'image/jpeg')) for i in range(batch_size)]
+
+    async def run_level(n_users, path, files):
+        latencies, statuses, health = [], [], []
+        remaining = [requests_per_level]
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            async def user():
+                while remaining[0] > 0:
+                    remaining[0] -= 1
+                    start = time.perf_counter()
+                    response = await client.post(path, files=files)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    statuses.append(response.status_code)
+
+            async def probe(stop):
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    await client.get('/healthz')
+                    health.append((time.perf_counter() - start) * 1000)
+                    await asyncio.sleep(0.01)
+
+            stop = asyncio.Event()
+            prober = asyncio.create_task(probe(stop))
+            start = time.perf_counter()
+            await asyncio.gather(*[user() for _ in range(n_users)])
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await prober
+        return np.array(latencies), np.array(statuses), np.array(health), elapsed
+
+    for path, files, frames in (('/detect-emotion', single, 1), ('/detect-emotion/batch', batch, batch_size)):
+        logger.info(f"⏱️ Load test {path} ({frames} frame(s) per request, {requests_per_level} requests per level)")
+        for n_users in concurrency:
+            latencies, statuses, health, elapsed = asyncio.run(run_level(n_users, path, files))
+            ok = latencies[statuses == 200]
+            p50, p99 = (np.percentile(ok, [50, 99]) if len(ok) else (float('nan'),) * 2)
+            logger.info(
+                f"   {n_users:>3} concurrent: p50 {p50:8.1f} ms | p99 {p99:8.1f} ms | "
+                f"{int((statuses == 200).sum()) * frames / elapsed:7.1f} frames/s | 429s {int((statuses == 429).sum()):3d} | "
+                f"/healthz p99 {np.percentile(health, 99) if len(health) else float('nan'):6.1f} ms"
+            )
+
+def _process_memory_mb(pid):
+    """(RSS, PSS) of one process in MB. PSS splits shared pages between the processes sharing them."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                values[key] = int(rest.split()[0]) / 1024
+    return values['Rss'], values['Pss']
+
+def _child_pids(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+def bench_workers(worker_counts=None, seconds=15, clients_per_worker=4, port=8765):
+    """
+    Requests/sec and memory of server/serve.py at 1..n worker processes (Linux).
+    Uses the trained artifacts. Hits /recommend/hybrid (not response-cached)
+    with varied prompts; Spotify covers are switched off.
+    Memory: total PSS over parent + workers should stay nearly flat as
+    workers are added (shared catalog), while per-worker RSS looks big
+    because it counts the shared pages too.
+    """
+    import os
+    import subprocess
+    import sys
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+
+    cores = os.cpu_count() or 1
+    worker_counts = worker_counts or sorted({1, 2, cores})
+    url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, 'SPOTIFY_COVER_ART': 'false'}
+
+    for workers in worker_counts:
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'server.serve', '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers)],
+            cwd=Config.ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            # Ready = several /readyz in a row answer 200 (each may hit a different worker)
+            deadline, streak = time.time() + 600, 0
+            while streak < 4 * workers:
+                if time.time() > deadline or server.poll() is not None:
+                    raise RuntimeError(f"Server with {workers} workers didn't become ready")
+                try:
+                    streak = streak + 1 if requests.get(f"{url}/readyz", timeout=5).status_code == 200 else 0
+                except requests.ConnectionError:
+                    streak = 0
+                time.sleep(0.05 if streak else 0.5)
+
+            def client(c):
+                session, latencies, i = requests.Session(), [], 0
+                stop_at = time.time() + seconds
+                while time.time() < stop_at:
+                    start = time.perf_counter()
+                    session.post(f"{url}/recommend/hybrid", json={'query': f"prompt {c} {i % 50}", 'top_k': 30}).raise_for_status()
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    i += 1
+                return latencies
+
+            with ThreadPoolExecutor(clients_per_worker * workers) as pool:
+                latencies = np.concatenate([l for l in pool.map(client, range(clients_per_worker * workers))])
+
+            # One worker = no fork, the server process itself serves
+            worker_pids = _child_pids(server.pid) or [server.pid]
+            pids = sorted({server.pid, *worker_pids})
+            worker_rss = np.mean([_process_memory_mb(pid)[0] for pid in worker_pids])
+            total_pss = sum(_process_memory_mb(pid)[1] for pid in pids)
+            logger.info(
+                f"⏱️ {workers} worker(s) ({cores} cores): {len(latencies) / seconds:8.1f} req/s | "
+                f"p50 {np.percentile(latencies, 50):7.1f} ms | p99 {np.percentile(latencies, 99):7.1f} ms | "
+                f"RSS/worker {worker_rss:7.1f} MB | total PSS {total_pss:7.1f} MB"
+            )
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+
+def bench_describe(sizes=(10_000, 100_000, 1_000_000)):
+    """
+    Semantic training's description step: row-wise apply() vs column string ops.
+    Both must build the exact same strings (content hashes depend on them).
+    """
+    from src.models.semantic_engine import SemanticEngine
+
+    logger.info("⏱️ Building song descriptions (ms)")
+    for n in sizes:
+        catalog = synthetic_catalog(n)
+        old = lambda: catalog.apply(lambda x: f"{x['name']} by {x['artist']} {x.get('search_tag', '')}", axis=1).tolist()
+        assert old() == SemanticEngine.describe(catalog)
+
+        apply_ms = time_once(old)
+        vectorized_ms = time_once(lambda: SemanticEngine.describe(catalog))
+        logger.info(
+            f"   n={n:>9,}: apply {apply_ms:9.1f} ms | vectorized {vectorized_ms:7.1f} ms ({apply_ms / vectorized_ms:5.1f}x)"
+        )
+
+def bench_metrics(n=100_000):
+    """
+    Cost of the instrumentation itself: one timed block, with metrics on and off.
+    A /recommend request runs ~10 of these.
+    """
+    from src.metrics import Registry
+
+    logger.info("⏱️ Metrics overhead (µs per timed block)")
+    for enabled in (True, False):
+        registry = Registry(enabled=enabled)
+
+        def timed_blocks():
+            for _ in range(n):
+                with registry.timer('bench_seconds', stage='x'):
+                    pass
+
+        per_call_us = time_once(timed_blocks) * 1000 / n
+        logger.info(f"   enabled={str(enabled):<5}: {per_call_us:6.2f} µs")
+
+BENCHMARKS = {
+    'topk': bench_topk,
+    'refit': bench_refit,
+    'neighbours': bench_neighbours,
+    'quantize': bench_quantize,
+    'cosine': bench_cosine,
+    'filters': bench_filters,
+    'emotion_load': bench_emotion_load,
+    'workers': bench_workers,
+    'describe': bench_describe,
+    'metrics': bench_metrics,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the recommendation hot paths")
+    parser.add_argument('benchmarks', nargs='*', help=f"Which to run: {', '.join(BENCHMARKS)} (default: all)")
+    args = parser.parse_args()
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    for name in args.benchmarks or BENCHMARKS:
+        BENCHMARKS[name]()
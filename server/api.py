@@ -1,8 +1,14 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import asyncio
+import hashlib
 import sys
 import os
+import time
+import uuid
 from pathlib import Path
 import cv2
 import numpy as np
@@ -13,7 +19,16 @@ sys.path.append(str(Path(__file__).parent.parent))
 from src.models.recommender import ContentBasedRecommender
 from src.models.semantic_engine import SemanticEngine
 from src.models.emotion import EmotionDetector
-from src.logger import get_logger
+from src.models.hybrid import HybridRanker
+from src.models.filters import request_filters
+from src.serving.batcher import QueryBatcher
+from src.serving.inference_pool import InferencePool, PoolFull
+from src.serving.response_cache import ResponseCache
+from src.serving.readiness import Readiness, WARMING, READY
+from src.data.spotify_client import get_spotify_handler
+from src.config import Config
+from src.metrics import metrics
+from src.logger import get_logger, request_id, logging_stats
 
 logger = get_logger(__name__)
 
@@ -28,99 +43,502 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """
+    Tag every log record written while serving this request with its id.
+    Honours the caller's X-Request-ID (e.g. from a proxy) and echoes it back.
+    """
+    token = request_id.set(request.headers.get("x-request-id") or uuid.uuid4().hex[:16])
+    try:
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = request_id.get()
+        return response
+    finally:
+        request_id.reset(token)
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    """Latency of every request, per endpoint (the route template, not the raw URL)"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.histogram(
+            'http_request_duration_seconds', "Request latency per endpoint",
+            method=request.method, endpoint=getattr(route, 'path', 'unmatched'), status=status
+        ).observe(time.perf_counter() - start)
+
 # Load Brains Global
+# Each one is only set once it is fully loaded AND warmed up
 recommender = None
 semantic_engine = None
 emotion_detector = None
+query_batcher = None
+hybrid_ranker = None  # Needs both the recommender and the semantic engine
+
+# Emotion model calls (image decode + TensorFlow) run here, never on the event loop
+emotion_pool = InferencePool(Config.EMOTION_WORKERS, Config.EMOTION_QUEUE_SIZE, name="emotion")
+
+# Rendered /recommend responses, keyed on the normalized request + semantic index version
+response_cache = ResponseCache(int(Config.RESPONSE_CACHE_MB * 1024 * 1024), Config.RESPONSE_CACHE_TTL)
+
+# Emotion only backs /detect-emotion: if it can't load, still serve recommendations
+readiness = Readiness(["recommender", "semantic"], optional=["emotion"])
+
+# Engines loaded by preload() in a parent process before it forked us (see server/serve.py)
+preloaded = {}
+
+def preload():
+    """
+    Load catalog / index / feature data ONCE, before forking workers.
+    
+    Only plain arrays and small objects are loaded here: workers share
+    them copy-on-write (the big matrices are memory-mapped anyway).
+    The Transformer and TensorFlow are NOT fork-safe once their thread
+    pools start, so each worker loads those itself at startup.
+    """
+    engine = ContentBasedRecommender()
+    engine.load_model()
+    preloaded['recommender'] = engine
+    
+    engine = SemanticEngine()
+    engine.load_from_disk(load_encoder=False)
+    preloaded['semantic'] = engine
+
+def load_recommender():
+    global recommender
+    with readiness.loading("recommender"):
+        engine = preloaded.pop('recommender', None)
+        if engine is None:
+            engine = ContentBasedRecommender()
+            engine.load_model()
+        recommender = engine
+
+def load_semantic():
+    global semantic_engine
+    with readiness.loading("semantic"):
+        engine = preloaded.pop('semantic', None)
+        if engine is None:
+            engine = SemanticEngine()
+            engine.load_from_disk()
+        else:
+            engine.load_model()
+        readiness.set_state("semantic", WARMING)
+        engine.warm_up()
+        semantic_engine = engine
+
+def load_emotion():
+    global emotion_detector
+    with readiness.loading("emotion"):
+        engine = EmotionDetector()
+        readiness.set_state("emotion", WARMING)
+        engine.warm_up()
+        emotion_detector = engine
+
+async def load_brains_in_background():
+    """All three brains load at the same time, in worker threads"""
+    loop = asyncio.get_running_loop()
+    
+    async def run(loader):
+        try:
+            await loop.run_in_executor(None, loader)
+        except Exception:
+            pass  # Already recorded in readiness (shows up in /healthz)
+    
+    async def semantic_then_batcher():
+        global query_batcher
+        await run(load_semantic)
+        if semantic_engine:
+            query_batcher = QueryBatcher(
+                semantic_engine,
+                max_batch_size=Config.BATCH_MAX_SIZE,
+                max_wait_ms=Config.BATCH_MAX_WAIT_MS
+            ).start()
+    
+    global hybrid_ranker
+    await asyncio.gather(run(load_recommender), semantic_then_batcher(), run(load_emotion))
+    if recommender and semantic_engine:
+        hybrid_ranker = HybridRanker(semantic_engine, recommender)
+    if readiness.is_ready():
+        degraded = readiness.degraded()
+        if degraded:
+            logger.warning(f"⚠️ Brains Active, without: {', '.join(degraded)}")
+        else:
+            logger.info("✅ Brains Active!")
 
 @app.on_event("startup")
 async def load_brains():
-    global recommender, semantic_engine, emotion_detector
-    logger.info("🧠 Loading AI Models...")
-    try:
-        recommender = ContentBasedRecommender()
-        recommender.load_model()
-        
-        semantic_engine = SemanticEngine()
-        semantic_engine.load_from_disk()
-        
-        emotion_detector = EmotionDetector()
-        logger.info("✅ Brains Active!")
-    except Exception as e:
-        logger.error(f"❌ Failed to load models: {e}")
+    # Don't block startup: the server answers /healthz while models load
+    logger.info("🧠 Loading AI Models (background)...")
+    app.state.loader = asyncio.get_running_loop().create_task(load_brains_in_background())
+
+@app.on_event("shutdown")
+async def save_caches():
+    if query_batcher:
+        await query_batcher.stop()
+    emotion_pool.shutdown()
+    # Persist hot query vectors so the next start skips the Transformer for them
+    if semantic_engine:
+        semantic_engine.save_query_cache()
 
 class RecommendationRequest(BaseModel):
     query: str
-    emotion: str = None
+    emotion: Optional[str] = None
     language: str = "All"
     region: str = "Global"
+    tags: List[str] = []            # e.g. ["genre:pop", "workout"]: any of them
+    include_synthetic: bool = True  # False = only real catalog songs
 
 @app.get("/")
 def home():
     return {"message": "Ultra AI DJ Server is Running 🎧"}
 
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up. Also shows each engine's load state."""
+    return {
+        "status": "ok",
+        "engines": readiness.snapshot(),
+        "emotion_pool": emotion_pool.snapshot(),
+        "response_cache": response_cache.stats()
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """
+    Prometheus text format: latency histograms per endpoint and per stage,
+    cache hit / miss counts, queue depths and model load times.
+    """
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+@metrics.collector
+def serving_stats():
+    """Numbers the caches, pools and readiness tracker already keep (read at scrape time)"""
+    caches = {'response': response_cache.stats()}
+    if semantic_engine:
+        caches['query'] = semantic_engine.query_cache.stats()
+    for cache, stats in caches.items():
+        yield 'cache_requests_total', 'counter', "Cache lookups by result", {'cache': cache, 'result': 'hit'}, stats['hits']
+        yield 'cache_requests_total', 'counter', "Cache lookups by result", {'cache': cache, 'result': 'miss'}, stats['misses']
+        yield 'cache_entries', 'gauge', "Entries currently cached", {'cache': cache}, stats['size']
+    yield 'response_cache_invalidations_total', 'counter', "Times the index changed and cached responses were dropped", {}, caches['response']['invalidations']
+    
+    pool = emotion_pool.snapshot()
+    yield 'inference_pool_pending', 'gauge', "Jobs queued or running", {'pool': 'emotion'}, pool['pending']
+    yield 'inference_pool_rejected_total', 'counter', "Jobs turned away with HTTP 429", {'pool': 'emotion'}, pool['rejected']
+    
+    logs = logging_stats()
+    yield 'log_queue_size', 'gauge', "Log records waiting for the writer thread", {}, logs['queued']
+    yield 'log_records_dropped_total', 'counter', "Log records dropped because the queue was full", {}, logs['dropped']
+    
+    for name, engine in readiness.snapshot().items():
+        yield 'engine_ready', 'gauge', "1 once the engine is loaded and warmed up", {'engine': name}, int(engine['state'] == READY)
+        if engine['load_seconds'] is not None:
+            yield 'engine_load_seconds', 'gauge', "Load + warm-up time of each engine", {'engine': name}, engine['load_seconds']
+
+@app.get("/readyz")
+def readyz():
+    """
+    Readiness: 200 once every engine is loaded and warmed up.
+    An optional engine that failed doesn't block it: it's listed under 'degraded'.
+    """
+    ready = readiness.is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "degraded": readiness.degraded(), "engines": readiness.snapshot()}
+    )
+
+@metrics.timer('emotion_stage_seconds', stage='decode')
+def decode_image(contents):
+    return cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+
+def detect_one(contents):
+    """Worker thread: bytes -> emotion"""
+    return emotion_detector.detect_emotion(decode_image(contents))
+
+def detect_many(contents_list):
+    """Worker thread: several uploads -> emotions, one model batch"""
+    return emotion_detector.detect_emotions([decode_image(c) for c in contents_list])
+
+def pool_full(e):
+    # Backpressure: tell the client to retry instead of queueing without limit
+    logger.warning(f"⚠️ {e}")
+    return HTTPException(status_code=429, detail="Emotion Engine busy, retry shortly", headers={"Retry-After": "1"})
+
 @app.post("/detect-emotion")
 async def detect_emotion(file: UploadFile = File(...)):
     if not emotion_detector:
         raise HTTPException(status_code=503, detail="Emotion Engine not ready")
         
+    contents = await file.read()
     try:
-        # Read image
-        contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        emotion = emotion_detector.detect_emotion(img)
+        emotion = await emotion_pool.run(detect_one, contents)
         return {"emotion": emotion or "neutral"}
+    except PoolFull as e:
+        raise pool_full(e)
     except Exception as e:
         logger.error(f"Emotion Error: {e}")
         return {"emotion": "neutral", "error": str(e)}
 
+@app.post("/detect-emotion/batch")
+async def detect_emotion_batch(files: List[UploadFile] = File(...)):
+    """
+    Several frames in one call (e.g. a burst from the webcam).
+    All faces go through the emotion model together, as ONE pool job.
+    """
+    if not emotion_detector:
+        raise HTTPException(status_code=503, detail="Emotion Engine not ready")
+    if len(files) > Config.EMOTION_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {Config.EMOTION_BATCH_MAX} frames per batch")
+        
+    contents_list = [await f.read() for f in files]
+    try:
+        emotions = await emotion_pool.run(detect_many, contents_list)
+    except PoolFull as e:
+        raise pool_full(e)
+    except Exception as e:
+        logger.error(f"Emotion Batch Error: {e}")
+        emotions = [None] * len(files)
+        
+    return {"emotions": [
+        {"file": f.filename, "emotion": emotion or "neutral"}
+        for f, emotion in zip(files, emotions)
+    ]}
+
+def build_search_query(query, emotion=None, language="All"):
+    search_query = query
+    if emotion:
+        search_query += f" {emotion} mood"
+    if language != "All":
+        search_query += f" {language}"
+    return search_query
+
+def search_filters(req):
+    """
+    Request options -> (metadata filters, language for the query text).
+    
+    Options the catalog has a column for become hard filters, applied
+    inside the index before top-k. A language it can't filter on still
+    goes into the query text as a hint (the old behaviour).
+    """
+    filters, unsupported = request_filters(
+        semantic_engine.metadata, req.language, req.region, req.tags, req.include_synthetic
+    )
+    if unsupported:
+        logger.debug(f"Catalog can't filter on {sorted(unsupported)}")
+    return filters, unsupported.get('language', "All")
+
+def stable_seed(text, buckets=1000):
+    """
+    Same text -> same number, in every process.
+    (Python's hash() of a str is randomized per process, so it changed
+    across uvicorn workers and restarts.)
+    """
+    return int.from_bytes(hashlib.md5(text.encode('utf-8')).digest()[:8], 'big') % buckets
+
+def format_track(r, covers=None):
+    # Real album art if Spotify gave us one
+    art_url = (covers or {}).get(r.get('spotify_id'))
+    
+    if not art_url:
+        # Fallback art
+        # Using a reliable placeholder service with a random seed based on song name to keep it consistent
+        seed = stable_seed(r['name'])
+        art_url = f"https://picsum.photos/seed/{seed}/300/300"
+    
+    return {
+        "name": r['name'],
+        "artist": r['artist'],
+        "score": r.get('score', r.get('similarity_score', 0)),
+        "cover": art_url,
+        "links": {
+            "spotify": f"https://open.spotify.com/search/{r['name'].replace(' ', '%20')}%20{r['artist'].replace(' ', '%20')}",
+            "youtube": f"https://www.youtube.com/results?search_query={r['name'].replace(' ', '+')}+{r['artist'].replace(' ', '+')}",
+            "apple": f"https://music.apple.com/us/search?term={r['name'].replace(' ', '+')}+{r['artist'].replace(' ', '+')}"
+        }
+    }
+
+async def fetch_covers(*result_lists):
+    """
+    Album art for every track with a Spotify ID, in one bulk lookup.
+    Uses the shared (pooled + cached) Spotify client, off the event loop.
+    Any failure just means placeholder art.
+    
+    Returns (covers, complete): complete=False when some lookups failed,
+    i.e. placeholders stand in for art Spotify may well have.
+    """
+    if not Config.SPOTIFY_COVER_ART:
+        return {}, True
+        
+    ids = [r.get('spotify_id') for results in result_lists for r in results if r.get('spotify_id')]
+    if not ids:
+        return {}, True
+        
+    try:
+        spotify = get_spotify_handler()
+        covers = await asyncio.get_running_loop().run_in_executor(None, spotify.get_cover_art, ids)
+        return covers, not covers.failed
+    except Exception as e:
+        logger.warning(f"⚠️ Cover art unavailable: {e}")
+        return {}, False
+
+def response_key(req):
+    """Requests that must get the same answer map to the same key"""
+    return (
+        SemanticEngine.normalize_query(req.query),
+        SemanticEngine.normalize_query(req.emotion or ""),
+        req.language.strip().lower(),
+        req.region.strip().lower(),
+        tuple(sorted({tag.strip().lower() for tag in req.tags})),
+        req.include_synthetic
+    )
+
+def recommend_stage(stage):
+    return metrics.timer('recommend_stage_seconds', "/recommend time per stage", stage=stage)
+
+def cacheable_response(body, etag, request):
+    """Stored bytes + validators. 304 when the client already has this exact response."""
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={Config.RESPONSE_CACHE_MAX_AGE}"}
+    known = {tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")}
+    if etag in known or "*" in known:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.post("/recommend")
-async def recommend(req: RecommendationRequest):
-    if not semantic_engine:
+async def recommend(req: RecommendationRequest, request: Request):
+    if not semantic_engine or not query_batcher:
         raise HTTPException(status_code=503, detail="AI Brain not ready")
         
-    search_query = req.query
-    if req.emotion:
-        search_query += f" {req.emotion} mood"
-    if req.language != "All":
-        search_query += f" {req.language}"
+    # Index version is part of the key: adding/removing songs drops old answers
+    with recommend_stage('cache'):
+        version = semantic_engine.version
+        key = response_key(req)
+        cached = response_cache.get(key, version)
+    if cached:
+        return cacheable_response(*cached, request)
         
-    # Get Semantic Results
-    results = semantic_engine.search(search_query, top_k=30)
+    with recommend_stage('query'):
+        filters, text_language = search_filters(req)
+        search_query = build_search_query(req.query, req.emotion, text_language)
+        
+    # Get Semantic Results (coalesced with concurrent requests, off the event loop)
+    with recommend_stage('search'):
+        results = await query_batcher.search(search_query, top_k=30, filters=filters)
+    
+    # Try to get art from Spotify if possible (Bonus)
+    with recommend_stage('covers'):
+        covers, complete = await fetch_covers(results)
     
     # Simple formatting
-    formatted = []
+    with recommend_stage('format'):
+        formatted = [format_track(r, covers) for r in results]
+        body = JSONResponse(content={"tracks": formatted}).body
+        if not complete:
+            # Placeholder art from a passing Spotify error: don't let us (or a CDN) keep serving it
+            return Response(content=body, media_type="application/json", headers={"Cache-Control": "no-store"})
+        etag = response_cache.put(key, version, body)
+    return cacheable_response(body, etag, request)
+
+@app.get("/recommend")
+async def recommend_get(
+    request: Request, query: str, emotion: Optional[str] = None, language: str = "All", region: str = "Global",
+    tags: List[str] = Query([]), include_synthetic: bool = True
+):
+    """Same as POST /recommend, as a plain URL that CDNs and browsers can cache"""
+    req = RecommendationRequest(
+        query=query, emotion=emotion, language=language, region=region,
+        tags=tags, include_synthetic=include_synthetic
+    )
+    return await recommend(req, request)
+
+class HybridRecommendationRequest(RecommendationRequest):
+    top_k: int = Field(30, ge=1, le=Config.RECOMMEND_TOP_K_MAX)
+
+@app.post("/recommend/hybrid")
+async def recommend_hybrid(req: HybridRecommendationRequest):
+    """
+    Semantic search + audio-feature neighbours, fused and diversified (see HybridRanker).
+    Per-stage latency comes back in 'timings_ms' and the Server-Timing header.
+    """
+    if not hybrid_ranker:
+        raise HTTPException(status_code=503, detail="AI Brain not ready")
+        
+    filters, text_language = search_filters(req)
+    search_query = build_search_query(req.query, req.emotion, text_language)
+    loop = asyncio.get_running_loop()
+    results, timings = await loop.run_in_executor(
+        None, hybrid_ranker.rank, search_query, req.top_k, filters
+    )
     
-    # Try to get art from Spotify if possible (Bonus)
-    from src.data.spotify_client import SpotifyHandler
-    sp = SpotifyHandler()
+    start = loop.time()
+    covers, _ = await fetch_covers(results)
+    timings['covers'] = (loop.time() - start) * 1000
+    for stage, ms in timings.items():
+        metrics.histogram('hybrid_stage_seconds', "/recommend/hybrid time per stage", stage=stage).observe(ms / 1000)
     
-    for r in results:
-        # Fallback art
-        # Using a reliable placeholder service with a random seed based on song name to keep it consistent
-        seed = abs(hash(r['name'])) % 1000
-        art_url = f"https://picsum.photos/seed/{seed}/300/300"
+    return JSONResponse(
+        content={
+            "tracks": [dict(format_track(r, covers), sources=r['sources']) for r in results],
+            "timings_ms": {stage: round(ms, 3) for stage, ms in timings.items()}
+        },
+        headers={"Server-Timing": ", ".join(f"{stage};dur={ms:.3f}" for stage, ms in timings.items())}
+    )
+
+class BatchRecommendationRequest(BaseModel):
+    # Bounded so one request can't ask for an unbounded amount of work (422 otherwise)
+    queries: List[str] = Field([], max_length=Config.RECOMMEND_BATCH_MAX)  # Free-text prompts -> Semantic Engine
+    songs: List[str] = Field([], max_length=Config.RECOMMEND_BATCH_MAX)    # Seed song names -> Math Model (audio features)
+    emotion: Optional[str] = None
+    language: str = "All"
+    region: str = "Global"
+    tags: List[str] = []
+    include_synthetic: bool = True
+    top_k: int = Field(30, ge=1, le=Config.RECOMMEND_TOP_K_MAX)
+
+@app.post("/recommend/batch")
+async def recommend_batch(req: BatchRecommendationRequest):
+    """
+    Many prompts / seed songs in one call (playlist generation, precompute jobs).
+    Each engine answers its whole batch with one matrix product.
+    """
+    if (req.queries and not semantic_engine) or (req.songs and not recommender):
+        raise HTTPException(status_code=503, detail="AI Brain not ready")
         
-        # In a real production app, we would cache this or fetch it during data collection
-        # For now, we use a high-quality placeholder that looks good
+    loop = asyncio.get_running_loop()
+    response = {"queries": [], "songs": []}
+    
+    if req.queries:
+        filters, text_language = search_filters(req)
+        search_queries = [build_search_query(q, req.emotion, text_language) for q in req.queries]
+        results = await loop.run_in_executor(None, semantic_engine.search_many, search_queries, req.top_k, filters)
+        covers, _ = await fetch_covers(*results)
+        response["queries"] = [
+            {"query": q, "tracks": [format_track(r, covers) for r in tracks]}
+            for q, tracks in zip(req.queries, results)
+        ]
         
-        formatted.append({
-            "name": r['name'],
-            "artist": r['artist'],
-            "score": r.get('score', 0),
-            "score": r.get('score', 0),
-            "cover": art_url,
-            "links": {
-                "spotify": f"https://open.spotify.com/search/{r['name'].replace(' ', '%20')}%20{r['artist'].replace(' ', '%20')}",
-                "youtube": f"https://www.youtube.com/results?search_query={r['name'].replace(' ', '+')}+{r['artist'].replace(' ', '+')}",
-                "apple": f"https://music.apple.com/us/search?term={r['name'].replace(' ', '+')}+{r['artist'].replace(' ', '+')}"
-            }
-        })
+    if req.songs:
+        results = await loop.run_in_executor(None, recommender.recommend_many, req.songs, req.top_k)
+        covers, _ = await fetch_covers(*results)
+        response["songs"] = [
+            {"song": name, "tracks": [format_track(r, covers) for r in tracks]}
+            for name, tracks in zip(req.songs, results)
+        ]
         
-    return {"tracks": formatted}
+    return response
+
+@app.get("/songs/suggest")
+async def suggest_songs(q: str, limit: int = Query(10, ge=1, le=50)):
+    """Autocomplete song titles by prefix"""
+    if not recommender:
+        raise HTTPException(status_code=503, detail="AI Brain not ready")
+    return {"songs": recommender.suggest(q, limit=limit)}
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    from server.serve import serve
+    serve(host="0.0.0.0", port=8001, workers=Config.SERVER_WORKERS)
@@ -0,0 +1,123 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from pathlib import Path
+import uvicorn
+
+# Add project root to sys path to import src modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.config import Config
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# A worker that dies sooner than this after starting is restarted with a delay
+CRASH_LOOP_SECONDS = 10
+
+
+def _bind(host, port):
+    """One listening socket, opened by the parent and shared by every worker"""
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock):
+    import server.api as api
+    # The app's startup hook picks up the preloaded engines and loads the models
+    uvicorn.Server(uvicorn.Config(api.app)).run(sockets=[sock])
+
+
+def serve(host="0.0.0.0", port=8000, workers=1):
+    """
+    Preload-then-fork server.
+
+    Why: 'uvicorn --workers N' starts N fresh interpreters, and each one
+    loads its own copy of the catalog, lookups and indexes. Here the parent
+    loads that data ONCE and then forks: workers share those pages
+    copy-on-write (the embedding and feature matrices are memory-mapped,
+    so they are shared page cache either way). Only the Transformer /
+    TensorFlow models are per worker: they aren't fork-safe.
+
+    The parent only supervises: it restarts workers that die and stops
+    them all on SIGTERM / Ctrl-C.
+    """
+    import server.api as api
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        if workers > 1:
+            logger.warning("⚠️ os.fork() isn't available on this platform: running a single worker")
+        uvicorn.run(api.app, host=host, port=port)
+        return
+
+    logger.info(f"📦 Preloading catalog + indexes before forking {workers} workers...")
+    api.preload()
+    # Park everything loaded so far outside the garbage collector: its
+    # sweeps would otherwise write to (and so copy) every shared page
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind(host, port)
+    children = {}  # pid -> start time
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                _run_worker(sock)
+            finally:
+                os._exit(0)
+        children[pid] = time.time()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+    logger.info(f"🚀 Serving on {host}:{port} with {workers} workers: {sorted(children)}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+        logger.warning(f"⚠️ Worker {pid} exited (status {status}), starting a new one")
+        if time.time() - started < CRASH_LOOP_SECONDS:
+            time.sleep(1)  # Don't spin if workers crash right away
+        spawn()
+
+    sock.close()
+    logger.info("👋 All workers stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the API: load data once, then fork worker processes")
+    parser.add_argument('--host', default="0.0.0.0")
+    parser.add_argument('--port', type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument('--workers', type=int, default=Config.SERVER_WORKERS, help="Default: $WEB_CONCURRENCY or 1")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers)
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+import joblib
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class TTLCache:
+    """
+    Bounded In-Memory Cache.
+
+    Why: Some answers are expensive to compute but cheap to remember
+    (e.g. running the Transformer on "sad heartbreak" for the 100th time).
+
+    Eviction rules:
+    1. LRU: When full, the least recently used entry is dropped.
+    2. TTL: Entries older than 'ttl' seconds are treated as missing.
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl  # None = never expires
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[0], now):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and not self._expired(entry[0], time.time())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+    def save(self, path):
+        """Persist the live entries so the next process starts warm"""
+        with self._lock:
+            entries = list(self._entries.items())
+        path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(entries, path)
+
+    def load(self, path):
+        """Warm start from a previous save(). Expired entries are skipped."""
+        if not path.exists():
+            return 0
+
+        try:
+            entries = joblib.load(path)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not warm cache from {path}: {e}")
+            return 0
+
+        now = time.time()
+        with self._lock:
+            for key, (stored_at, value) in entries[-self.max_size:]:
+                if not self._expired(stored_at, now):
+                    self._entries[key] = (stored_at, value)
+        return len(self._entries)
@@ -15,6 +15,22 @@ class Config:
     SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
     SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
     
+    # Spotify Client Settings
+    SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL")      # Override for a local fake server
+    SPOTIFY_TOKEN_URL = os.getenv("SPOTIFY_TOKEN_URL")  # Override for a local fake server
+    SPOTIFY_TIMEOUT = float(os.getenv("SPOTIFY_TIMEOUT", 5))
+    SPOTIFY_POOL_SIZE = int(os.getenv("SPOTIFY_POOL_SIZE", 10))
+    SPOTIFY_MAX_CONCURRENCY = int(os.getenv("SPOTIFY_MAX_CONCURRENCY", 4))
+    SPOTIFY_CACHE_SIZE = int(os.getenv("SPOTIFY_CACHE_SIZE", 50_000))
+    SPOTIFY_CACHE_TTL = float(os.getenv("SPOTIFY_CACHE_TTL", 7 * 24 * 3600))  # seconds
+    SPOTIFY_COVER_ART = os.getenv("SPOTIFY_COVER_ART", "true").lower() == "true"
+    SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", 5))  # On 429 (rate limited)
+    
+    # Ingestion (Data Collector)
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 8))
+    INGEST_PAGES_PER_QUERY = int(os.getenv("INGEST_PAGES_PER_QUERY", 0))  # 50 tracks per page, max 20; 0 = until every query is exhausted
+    TRACK_STALE_AFTER = float(os.getenv("TRACK_STALE_AFTER", 30 * 24 * 3600))  # Re-fetch songs older than this (seconds)
+    
     # Data Settings
     # __file__ is src/config.py -> parent is src/ -> parent is root
     ROOT_DIR = Path(__file__).resolve().parent.parent
@@ -23,6 +39,83 @@ class Config:
     # Paths (We use these objects directly)
     RAW_DATA_PATH = DATA_DIR / "raw" / "songs_raw.csv"
     PROCESSED_DATA_PATH = DATA_DIR / "processed" / "songs_processed.csv"
+    MODELS_DIR = DATA_DIR / "models"
+    TRACK_STORE_PATH = DATA_DIR / "store" / "tracks.db"
+    
+    # On-disk embedding precision: float32 (exact) or float16 (half the disk/page cache)
+    EMBEDDING_STORAGE_DTYPE = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32")
+    # Precomputed neighbours per song (recommend() becomes a lookup). 0 = always search live
+    NEIGHBOUR_K = int(os.getenv("NEIGHBOUR_K", 50))
+    NEIGHBOUR_WORKERS = int(os.getenv("NEIGHBOUR_WORKERS", 0)) or None  # None = all cores
+    # Semantic training encodes this many descriptions per chunk (written to disk as it goes)
+    ENCODE_CHUNK_SIZE = int(os.getenv("ENCODE_CHUNK_SIZE", 10_000))
+    ENCODE_WORKERS = int(os.getenv("ENCODE_WORKERS", 0)) or None  # Encoder processes, None = all cores
+    # Refit the recommender's scaler once appended songs shift any feature's mean/std
+    # by this many (training) standard deviations
+    RECOMMENDER_DRIFT_THRESHOLD = float(os.getenv("RECOMMENDER_DRIFT_THRESHOLD", 0.25))
+    # Compact the semantic index once this fraction of its rows are removed songs
+    COMPACT_TOMBSTONE_RATIO = float(os.getenv("COMPACT_TOMBSTONE_RATIO", 0.2))
+    
+    # Search Index Settings
+    # 'auto' = exact search for small catalogs, approximate (IVF) for big ones
+    SEMANTIC_INDEX = os.getenv("SEMANTIC_INDEX", "auto")
+    ANN_AUTO_THRESHOLD = int(os.getenv("ANN_AUTO_THRESHOLD", 50_000))
+    IVF_N_LISTS = int(os.getenv("IVF_N_LISTS", 0)) or None  # None = sqrt(catalog size)
+    IVF_N_PROBE = int(os.getenv("IVF_N_PROBE", 8))
+    # Score a compressed copy of the song vectors: 'none' (float32), 'float16' or 'int8'
+    EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "none")
+    # Re-score the best k * factor candidates with the exact float32 vectors (0 = off)
+    QUANTIZATION_RERANK = int(os.getenv("QUANTIZATION_RERANK", 4))
+    
+    # Hybrid Ranking (semantic search + audio-feature neighbours, see src/models/hybrid.py)
+    HYBRID_SEMANTIC_CANDIDATES = int(os.getenv("HYBRID_SEMANTIC_CANDIDATES", 100))
+    HYBRID_AUDIO_SEEDS = int(os.getenv("HYBRID_AUDIO_SEEDS", 5))            # Best semantic hits used as seeds
+    HYBRID_AUDIO_CANDIDATES = int(os.getenv("HYBRID_AUDIO_CANDIDATES", 20))  # Neighbours per seed
+    HYBRID_SEMANTIC_WEIGHT = float(os.getenv("HYBRID_SEMANTIC_WEIGHT", 1.0))
+    HYBRID_AUDIO_WEIGHT = float(os.getenv("HYBRID_AUDIO_WEIGHT", 0.5))
+    HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+    HYBRID_MMR_LAMBDA = float(os.getenv("HYBRID_MMR_LAMBDA", 0.7))  # 1 = pure relevance, lower = more diverse
+    
+    # Query Embedding Cache (skip the Transformer for repeated prompts)
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 4096))
+    EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", 24 * 3600))  # seconds
+    # Optional warm start file. Empty = in-memory only.
+    EMBEDDING_CACHE_PATH = Path(os.getenv("EMBEDDING_CACHE_PATH")) if os.getenv("EMBEDDING_CACHE_PATH") else None
+    
+    # Real-Time Emotion (video stream, see src/models/emotion_stream.py)
+    EMOTION_INFER_EVERY = int(os.getenv("EMOTION_INFER_EVERY", 15))          # Frames between emotion model runs
+    EMOTION_MOVE_IOU = float(os.getenv("EMOTION_MOVE_IOU", 0.5))              # Re-run early once the face box overlaps the last analysed one less than this
+    EMOTION_SMOOTHING_WINDOW = int(os.getenv("EMOTION_SMOOTHING_WINDOW", 5))  # Model results averaged
+    EMOTION_DETECT_WIDTH = int(os.getenv("EMOTION_DETECT_WIDTH", 320))        # Frame width for the face finder (pixels)
+    
+    # Server processes (server/serve.py): data is loaded once, then workers are forked
+    SERVER_WORKERS = int(os.getenv("WEB_CONCURRENCY", 1))
+    
+    # Emotion API workers (model calls never run on the event loop)
+    EMOTION_WORKERS = int(os.getenv("EMOTION_WORKERS", 2))
+    EMOTION_QUEUE_SIZE = int(os.getenv("EMOTION_QUEUE_SIZE", 16))  # Jobs queued or running; more = HTTP 429
+    EMOTION_BATCH_MAX = int(os.getenv("EMOTION_BATCH_MAX", 16))    # Frames per /detect-emotion/batch call
+    RECOMMEND_BATCH_MAX = int(os.getenv("RECOMMEND_BATCH_MAX", 64))  # Queries (and songs) per /recommend/batch call
+    RECOMMEND_TOP_K_MAX = int(os.getenv("RECOMMEND_TOP_K_MAX", 100))  # Largest top_k a client may ask for
+    
+    # Response Cache for /recommend (full rendered responses, dropped when the index changes)
+    RESPONSE_CACHE_MB = float(os.getenv("RESPONSE_CACHE_MB", 64))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 600))     # seconds
+    RESPONSE_CACHE_MAX_AGE = int(os.getenv("RESPONSE_CACHE_MAX_AGE", 60))  # Cache-Control for clients / CDNs (seconds)
+    
+    # Micro-Batching (trade a few ms of latency for throughput under load)
+    BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 32))
+    BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 5))
+    
+    # Logging (configured once in src/logger.py)
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")             # json (one object per line) or text
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10_000))  # Records waiting to be written; more are dropped
+    # Max INFO/DEBUG records per second for chatty loggers: "logger=rate,logger=rate"
+    LOG_RATE_LIMITS = os.getenv("LOG_RATE_LIMITS", "src.models.emotion=2")
+    
+    # Latency histograms / counters served at /metrics (cheap enough to leave on)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
     
     # Validation
     @classmethod
@@ -1,7 +1,9 @@
 import pandas as pd
 import numpy as np
 import random
-from src.data.spotify_client import SpotifyHandler
+from concurrent.futures import ThreadPoolExecutor
+from src.data.spotify_client import SpotifyHandler, SEARCH_PAGE_SIZE, SEARCH_MAX_OFFSET
+from src.data.track_store import TrackStore
 from src.config import Config
 from src.logger import get_logger
 
@@ -47,82 +49,192 @@ def generate_synthetic_features(query):
         'instrumentalness': random.random() if 'study' in q_lower else random.uniform(0, 0.3)
     }
 
-def run_pipeline():
+# Spotify search stops at offset 1000, so ONE query yields at most 20 pages x 50
+# = 1000 tracks. The catalog only grows with more distinct queries:
+# every genre is crawled once per era.
+GENRES = [
+    "pop", "rock", "hip-hop", "jazz", "indie", "electronic", "r-n-b", "country",
+    "classical", "metal", "k-pop", "indian", "latin", "spanish", "british"
+]
+YEARS = ["1980-1989", "1990-1999", "2000-2009", "2010-2019", "2020-2025"]
+
+QUERIES = [
+    "genre:pop year:2023",
+    "genre:rock",
+    "genre:hip-hop",
+    "genre:jazz",
+    "mood:sad",
+    "mood:happy",
+    "workout",
+    "study music",
+    "bollywood",
+    "punjabi"
+] + [f"genre:{genre} year:{years}" for genre in GENRES for years in YEARS]
+
+# Search terms that tell us a song's language / region (the API doesn't).
+# Values match the UI's options ("Korean (K-Pop)" filters on "Korean").
+LOCALES = {
+    'genre:k-pop': ('Korean', 'South Korea'),
+    'genre:indian': ('Hindi', 'India'),
+    'bollywood': ('Hindi', 'India'),
+    'punjabi': ('Punjabi', 'India'),
+    'genre:latin': ('Spanish', None),
+    'genre:spanish': ('Spanish', 'Spain'),
+    'genre:british': ('English', 'UK'),
+    'genre:country': ('English', 'USA'),
+}
+
+# Pages until a query hits the offset limit
+MAX_PAGES_PER_QUERY = SEARCH_MAX_OFFSET // SEARCH_PAGE_SIZE
+
+def fetch_pages(handler, tasks, max_workers):
+    """
+    Run every (query, offset) search in parallel.
+    Returns one item list per task (None if that search failed), in task order.
+    """
+    handler.ensure_token()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(handler.search_tracks, q, offset) for q, offset in tasks]
+        
+        pages = []
+        for (q, offset), future in zip(tasks, futures):
+            try:
+                items = [item for item in future.result() if item]
+                logger.info(f"🔍 {q} (offset {offset}): {len(items)} tracks")
+            except Exception as e:
+                logger.error(f"❌ Search failed for {q} (offset {offset}): {e}")
+                items = None
+            pages.append(items)
+    return pages
+
+def query_locale(q):
+    """(language, region) implied by a search query, None where it doesn't say"""
+    for term in str(q).lower().split():
+        if term in LOCALES:
+            return LOCALES[term]
+    return None, None
+
+def build_track(q, item, features, stored=None):
+    """
+    One store row from a search result.
+    features: real audio features (None if Spotify blocked them)
+    stored: what the store already has for this song; reused when there are no real
+            features, so a refresh doesn't replace them with NEW random numbers
+    """
+    # Generic Metadata
+    language, region = query_locale(q)
+    track_info = {
+        'name': item['name'],
+        'artist': item['artists'][0]['name'],
+        'id': item['id'],
+        'popularity': item['popularity'],
+        'search_tag': q,
+        'language': language,
+        'region': region
+    }
+    
+    if features:
+        # Use Real
+        track_info.update({
+            'danceability': features['danceability'],
+            'energy': features['energy'],
+            'valence': features['valence'],
+            'tempo': features['tempo'],
+            'instrumentalness': features['instrumentalness'],
+            'is_synthetic': False
+        })
+    elif stored:
+        # Keep what we had (real or generated): the song's vector stays put
+        track_info.update(stored)
+    else:
+        # Fallback to Synthetic
+        syn = generate_synthetic_features(q)
+        track_info.update(syn)
+        track_info['is_synthetic'] = True
+        
+    return track_info
+
+def run_pipeline(queries=QUERIES, pages_per_query=None, max_workers=None, restart=False):
+    """
+    Incremental, resumable crawl into the Track Store.
+    
+    Each round fetches the NEXT page of every query (from its checkpoint),
+    gets features only for songs that are new or stale, and saves the round.
+    A crash loses at most the round in flight; re-running picks up where we stopped.
+    
+    By default rounds continue until every query is exhausted (at most
+    MAX_PAGES_PER_QUERY pages each, i.e. ~1000 tracks per query); pass
+    pages_per_query to crawl a few pages per run instead.
+    """
     logger.info("🚀 Starting Data Ingestion Pipeline (Resilient Mode)...")
+    pages_per_query = min(pages_per_query or Config.INGEST_PAGES_PER_QUERY or MAX_PAGES_PER_QUERY, MAX_PAGES_PER_QUERY)
+    max_workers = max_workers or Config.INGEST_WORKERS
     
-    handler = SpotifyHandler()
-    all_tracks = []
+    store = TrackStore()
+    if len(store) == 0 and Config.RAW_DATA_PATH.exists():
+        # First run with a store: keep the songs we already collected
+        songs = pd.read_csv(Config.RAW_DATA_PATH).to_dict('records')
+        for song in songs:
+            song['language'], song['region'] = query_locale(song.get('search_tag', ''))
+        imported = store.upsert(songs)
+        logger.info(f"📥 Imported {imported} songs from {Config.RAW_DATA_PATH}")
+    if restart:
+        store.reset_checkpoints()
     
-    queries = [
-        "genre:pop year:2023",
-        "genre:rock",
-        "genre:hip-hop",
-        "genre:jazz",
-        "mood:sad",
-        "mood:happy",
-        "workout",
-        "study music"
-    ]
+    handler = SpotifyHandler()
+    saved = 0
     
-    for q in queries:
-        logger.info(f"🔍 Searching for: {q}")
-        try:
-            results = handler.sp.search(q=q, type='track', limit=40)
+    for _ in range(pages_per_query):
+        # 1. Next page of every query that still has results
+        tasks = []
+        for q in queries:
+            offset, exhausted = store.get_checkpoint(q)
+            if not exhausted and offset < SEARCH_MAX_OFFSET:
+                tasks.append((q, offset))
+        if not tasks:
+            logger.info("✅ Every query is fully crawled. Use restart=True to crawl again.")
+            break
             
-            for item in results['tracks']['items']:
-                try:
-                    # Generic Metadata
-                    track_info = {
-                        'name': item['name'],
-                        'artist': item['artists'][0]['name'],
-                        'id': item['id'],
-                        'popularity': item['popularity'],
-                        'search_tag': q
-                    }
-                    
-                    # Try fetch Real Features
-                    features = None
-                    try:
-                        features_list = handler.sp.audio_features(item['id'])
-                        if features_list:
-                            features = features_list[0]
-                    except Exception:
-                        pass # Expecting 403 here
-                    
-                    if features:
-                        # Use Real
-                        track_info.update({
-                            'danceability': features['danceability'],
-                            'energy': features['energy'],
-                            'valence': features['valence'],
-                            'tempo': features['tempo'],
-                            'instrumentalness': features['instrumentalness'],
-                            'is_synthetic': False
-                        })
-                    else:
-                        # Fallback to Synthetic
-                        syn = generate_synthetic_features(q)
-                        track_info.update(syn)
-                        track_info['is_synthetic'] = True
-                        
-                    all_tracks.append(track_info)
-                    
-                except Exception as e:
-                    continue
-                    
-        except Exception as e:
-            logger.error(f"❌ Search failed for {q}: {e}")
+        pages = fetch_pages(handler, tasks, max_workers)
+        
+        # 2. Skip songs we already have (and fetched recently)
+        found = [(q, item) for (q, _), items in zip(tasks, pages) for item in (items or [])]
+        fresh = store.fresh_ids([item['id'] for _, item in found])
+        todo = {}
+        for q, item in found:
+            if item['id'] not in fresh:
+                todo.setdefault(item['id'], (q, item))  # First query wins (like drop_duplicates)
+        
+        # 3. Try fetch Real Features, 100 tracks per call (instead of 1 call per track)
+        features_by_id = handler.fetch_audio_features(list(todo), max_workers=max_workers)
+        stored = store.stored_features([t for t in todo if t not in features_by_id])
+        
+        tracks, skipped = [], 0
+        for track_id, (q, item) in todo.items():
+            try:
+                tracks.append(build_track(q, item, features_by_id.get(track_id), stored.get(track_id)))
+            except Exception as e:
+                skipped += 1
+                logger.debug(f"Skipping malformed track {track_id}: {e}")
+        if skipped:
+            logger.warning(f"⚠️ Skipped {skipped} malformed tracks this round")
+        
+        # 4. Save the round, then move the checkpoints forward
+        saved += store.upsert(tracks)
+        for (q, offset), items in zip(tasks, pages):
+            if items is not None:
+                store.set_checkpoint(q, offset + len(items), exhausted=len(items) < SEARCH_PAGE_SIZE)
 
-    df = pd.DataFrame(all_tracks)
+    df = store.read()
+    store.close()
     if not df.empty:
-        df = df.drop_duplicates(subset=['id'])
         Config.RAW_DATA_PATH.parent.mkdir(parents=True, exist_ok=True)
         df.to_csv(Config.RAW_DATA_PATH, index=False)
         
         # Stats
         real_count = len(df[df['is_synthetic'] == False])
         syn_count = len(df[df['is_synthetic'] == True])
-        logger.info(f"✅ Pipeline Complete. Total: {len(df)}")
+        logger.info(f"✅ Pipeline Complete. New/Refreshed: {saved}, Total: {len(df)}")
         logger.info(f"   Real Features: {real_count}")
         logger.info(f"   Synthetic Features: {syn_count} (Generated due to API blocks)")
         
@@ -130,4 +242,10 @@ def run_pipeline():
         logger.error("❌ No data collected!")
 
 if __name__ == "__main__":
-    run_pipeline()
+    import argparse
+    parser = argparse.ArgumentParser(description="Crawl Spotify into the track store")
+    parser.add_argument("--pages", type=int, default=None, help="Pages (of 50) to fetch per query this run (default: until exhausted)")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel API calls")
+    parser.add_argument("--restart", action="store_true", help="Ignore checkpoints and crawl every query from page 1")
+    args = parser.parse_args()
+    run_pipeline(pages_per_query=args.pages, max_workers=args.workers, restart=args.restart)
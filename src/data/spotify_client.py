@@ -1,11 +1,58 @@
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
+from spotipy.exceptions import SpotifyException
+from spotipy.cache_handler import MemoryCacheHandler
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import random
 import time
 from src.config import Config
+from src.cache import TTLCache
+from src.metrics import metrics
 from src.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Spotify API limits
+TRACKS_BATCH_SIZE = 50            # ids per 'tracks' call
+AUDIO_FEATURES_BATCH_SIZE = 100   # ids per 'audio-features' call
+SEARCH_PAGE_SIZE = 50             # results per 'search' page
+SEARCH_MAX_OFFSET = 1000          # search can't page past this
+PLAYLIST_PAGE_SIZE = 100          # items per 'playlist_items' page
+
+def with_backoff(fn, *args, max_retries=None, **kwargs):
+    """
+    Call a Spotify API function, backing off when we get rate limited (HTTP 429).
+    Waits for 'Retry-After' if Spotify sent one, else exponential backoff with jitter.
+    Any other error is raised straight away.
+    """
+    max_retries = Config.SPOTIFY_MAX_RETRIES if max_retries is None else max_retries
+    for attempt in range(max_retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except SpotifyException as e:
+            if e.http_status != 429 or attempt == max_retries:
+                raise
+            retry_after = (e.headers or {}).get('Retry-After')
+            delay = float(retry_after) if retry_after else min(60, 2 ** attempt)
+            delay += random.uniform(0, 0.1 * delay)  # Don't let all workers retry in lockstep
+            logger.warning(f"⏳ Rate limited by Spotify. Retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            time.sleep(delay)
+
+class Lookup(dict):
+    """
+    {spotify_id: answer} for the ids Spotify could be asked about.
+    'failed' lists the ids whose call errored: they're not cached and
+    callers shouldn't treat them as "Spotify has nothing" (e.g. cache a page built without them).
+    """
+
+    def __init__(self, found=(), failed=()):
+        super().__init__(found)
+        self.failed = list(failed)
+
 class SpotifyHandler:
     """
     Industrial-Grade Spotify API Handler.
@@ -13,11 +60,47 @@ class SpotifyHandler:
     
     def __init__(self):
         try:
+            # One pooled HTTP session: keep-alive connections are reused across calls.
+            # The adapter only retries server errors: 429 is left to with_backoff,
+            # otherwise both layers retry and one rate limit costs up to 4 x 6 calls
+            self.session = requests.Session()
+            retry = Retry(
+                total=3,
+                status_forcelist=(500, 502, 503, 504),
+                backoff_factor=0.3,
+                respect_retry_after_header=False,  # Else urllib3 still retries a 429 that has Retry-After
+                allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE'])
+            )
+            adapter = HTTPAdapter(
+                pool_connections=Config.SPOTIFY_POOL_SIZE,
+                pool_maxsize=Config.SPOTIFY_POOL_SIZE,
+                max_retries=retry
+            )
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+            
+            # Token lives in memory and is reused until it expires
             self.client_credentials_manager = SpotifyClientCredentials(
                 client_id=Config.SPOTIFY_CLIENT_ID, 
-                client_secret=Config.SPOTIFY_CLIENT_SECRET
+                client_secret=Config.SPOTIFY_CLIENT_SECRET,
+                requests_session=self.session,
+                requests_timeout=Config.SPOTIFY_TIMEOUT,
+                cache_handler=MemoryCacheHandler()
+            )
+            self.sp = spotipy.Spotify(
+                client_credentials_manager=self.client_credentials_manager,
+                requests_session=self.session,
+                requests_timeout=Config.SPOTIFY_TIMEOUT
             )
-            self.sp = spotipy.Spotify(client_credentials_manager=self.client_credentials_manager)
+            
+            # Point at a different server (e.g. a local fake one in tests)
+            if Config.SPOTIFY_API_URL:
+                self.sp.prefix = Config.SPOTIFY_API_URL.rstrip("/") + "/"
+            if Config.SPOTIFY_TOKEN_URL:
+                self.client_credentials_manager.OAUTH_TOKEN_URL = Config.SPOTIFY_TOKEN_URL
+            
+            # Track metadata barely changes: remember it per Spotify ID
+            self.track_cache = TTLCache(Config.SPOTIFY_CACHE_SIZE, Config.SPOTIFY_CACHE_TTL)
             logger.info("✅ Spotify Client initialized successfully")
         except Exception as e:
             logger.error(f"❌ Failed to initialize Spotify Client: {e}")
@@ -25,19 +108,27 @@ class SpotifyHandler:
 
     def fetch_playlist_tracks(self, playlist_id, limit=50):
         """
-        Fetches tracks from a specific playlist.
+        Fetches up to 'limit' tracks from a specific playlist.
         Industrial Pattern: Batch processing.
+        Pages through the playlist, then gets audio features 100 ids per call.
         """
         try:
-            results = self.sp.playlist_items(playlist_id, limit=limit)
-            tracks_data = []
+            results = with_backoff(self.sp.playlist_items, playlist_id, limit=min(limit, PLAYLIST_PAGE_SIZE))
+            tracks = []
             
-            for item in results['items']:
-                track = item['track']
-                if not track: continue
+            while True:
+                tracks.extend(item['track'] for item in results['items'] if item.get('track'))
+                if not results.get('next') or len(tracks) >= limit:
+                    break
+                results = with_backoff(self.sp.next, results)
+            tracks = tracks[:limit]
                 
-                # Get features for this specific track
-                features = self.sp.audio_features(track['id'])[0]
+            # Get features for all tracks at once
+            features_by_id = self.fetch_audio_features([t['id'] for t in tracks])
+            
+            tracks_data = []
+            for track in tracks:
+                features = features_by_id.get(track['id'])
                 
                 if features:
                     track_info = {
@@ -61,3 +152,125 @@ class SpotifyHandler:
             import traceback
             logger.error(traceback.format_exc())
             return []
+
+    def ensure_token(self):
+        """Fetch/refresh the access token once up front, not once per parallel call"""
+        self.client_credentials_manager.get_access_token(as_dict=False)
+
+    def search_tracks(self, query, offset=0, limit=SEARCH_PAGE_SIZE):
+        """One page of track search results"""
+        results = with_backoff(self.sp.search, q=query, type='track', limit=limit, offset=offset)
+        return results['tracks']['items']
+
+    def fetch_audio_features(self, track_ids, max_workers=None):
+        """
+        Audio features for many tracks: {spotify_id: features}.
+        100 ids per call (the API maximum), several calls in parallel.
+        
+        Spotify blocks this endpoint (403) for many apps. Failed chunks are
+        simply missing from the result so callers can fall back.
+        """
+        track_ids = [t for t in dict.fromkeys(track_ids) if t]
+        chunks = [track_ids[i:i + AUDIO_FEATURES_BATCH_SIZE] for i in range(0, len(track_ids), AUDIO_FEATURES_BATCH_SIZE)]
+        if not chunks:
+            return {}
+        self.ensure_token()
+        
+        def fetch(chunk):
+            try:
+                return with_backoff(self.sp.audio_features, chunk) or []
+            except Exception as e:
+                logger.debug(f"audio_features failed for {len(chunk)} ids: {e}")  # Expecting 403 here
+                return []
+        
+        features_by_id = {}
+        with ThreadPoolExecutor(max_workers=max_workers or Config.INGEST_WORKERS) as pool:
+            for features_list in pool.map(fetch, chunks):
+                for features in features_list:
+                    if features:
+                        features_by_id[features['id']] = features
+        return features_by_id
+
+    @staticmethod
+    def _slim_track(track):
+        """Keep only the fields we serve (full track objects are large)"""
+        images = track.get('album', {}).get('images') or []
+        return {
+            'id': track['id'],
+            'name': track['name'],
+            'artist': track['artists'][0]['name'] if track.get('artists') else '',
+            'album': track.get('album', {}).get('name', ''),
+            # Images are sorted largest first; the 300px one is usually 2nd
+            'cover': images[1]['url'] if len(images) > 1 else (images[0]['url'] if images else None),
+            'popularity': track.get('popularity'),
+            'preview_url': track.get('preview_url')
+        }
+
+    def _fetch_tracks(self, ids):
+        with metrics.timer('spotify_request_seconds', "Spotify Web API call latency", endpoint='tracks'):
+            results = with_backoff(self.sp.tracks, ids)
+        return [self._slim_track(t) for t in results['tracks'] if t]
+
+    def get_tracks(self, track_ids):
+        """
+        Bulk track metadata: {spotify_id: metadata}.
+        
+        1. Cached ids are answered from memory.
+        2. The rest go to the multi-id 'tracks' endpoint, 50 ids per call,
+           with at most SPOTIFY_MAX_CONCURRENCY calls in flight.
+        Unknown ids are cached as None so we don't ask again.
+        Returns a Lookup: ids of calls that failed are in '.failed'.
+        """
+        found = {}
+        missing = []
+        failed = []
+        for track_id in dict.fromkeys(track_ids):
+            if not track_id:
+                continue
+            if track_id in self.track_cache:
+                found[track_id] = self.track_cache.get(track_id)
+            else:
+                missing.append(track_id)
+        
+        metrics.counter('cache_requests_total', "Cache lookups by result", cache='spotify_tracks', result='hit').inc(len(found))
+        metrics.counter('cache_requests_total', cache='spotify_tracks', result='miss').inc(len(missing))
+        if missing:
+            self.ensure_token()
+            chunks = [missing[i:i + TRACKS_BATCH_SIZE] for i in range(0, len(missing), TRACKS_BATCH_SIZE)]
+            with ThreadPoolExecutor(max_workers=Config.SPOTIFY_MAX_CONCURRENCY) as pool:
+                for chunk, future in zip(chunks, [pool.submit(self._fetch_tracks, c) for c in chunks]):
+                    try:
+                        fetched = {t['id']: t for t in future.result()}
+                    except Exception as e:
+                        logger.warning(f"⚠️ Spotify tracks lookup failed for {len(chunk)} ids: {e}")
+                        failed.extend(chunk)
+                        continue  # Not cached, so we retry next time
+                    for track_id in chunk:
+                        self.track_cache.put(track_id, fetched.get(track_id))
+                        found[track_id] = fetched.get(track_id)
+        
+        return Lookup({k: v for k, v in found.items() if v is not None}, failed)
+
+    def get_cover_art(self, track_ids):
+        """Lookup of {spotify_id: album cover url} for every id Spotify knows"""
+        tracks = self.get_tracks(track_ids)
+        return Lookup(
+            {track_id: track['cover'] for track_id, track in tracks.items() if track.get('cover')},
+            tracks.failed
+        )
+
+
+_handler = None
+_handler_lock = threading.Lock()
+
+def get_spotify_handler():
+    """
+    The process-wide SpotifyHandler (created on first use).
+    Share this instead of building a new client (and a new token) per request.
+    """
+    global _handler
+    if _handler is None:
+        with _handler_lock:
+            if _handler is None:
+                _handler = SpotifyHandler()
+    return _handler
@@ -0,0 +1,230 @@
+import sqlite3
+import threading
+import time
+import pandas as pd
+from src.config import Config
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Same columns (and order) as songs_raw.csv
+TRACK_COLUMNS = [
+    'name', 'artist', 'id', 'popularity', 'search_tag',
+    'danceability', 'energy', 'valence', 'tempo', 'acousticness', 'instrumentalness',
+    'is_synthetic', 'language', 'region'
+]
+# Added after the first release: created on old stores when they are opened
+ADDED_COLUMNS = {'language': 'TEXT', 'region': 'TEXT'}
+# Audio features (real or generated) and where they came from
+FEATURE_COLUMNS = ['danceability', 'energy', 'valence', 'tempo', 'acousticness', 'instrumentalness', 'is_synthetic']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    artist TEXT,
+    popularity INTEGER,
+    search_tag TEXT,
+    danceability REAL,
+    energy REAL,
+    valence REAL,
+    tempo REAL,
+    acousticness REAL,
+    instrumentalness REAL,
+    is_synthetic INTEGER,
+    language TEXT,
+    region TEXT,
+    fetched_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tracks_updated_at ON tracks(updated_at);
+
+CREATE TABLE IF NOT EXISTS checkpoints (
+    query TEXT PRIMARY KEY,
+    next_offset INTEGER NOT NULL,
+    exhausted INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class TrackStore:
+    """
+    Persistent Song Database (SQLite), keyed on Spotify ID.
+
+    Why: Rebuilding the CSV from scratch on every crawl means a crash
+    halfway through loses everything, and we re-download songs we already have.
+
+    - upsert(): insert new songs / refresh existing ones
+    - checkpoints: how far we've paged through each search query
+    - updated_at: a watermark, so training can read only what changed
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Config.TRACK_STORE_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(tracks)")}
+        for column, kind in ADDED_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE tracks ADD COLUMN {column} {kind}")
+
+    def close(self):
+        self._conn.close()
+
+    # --- Tracks ---
+
+    def upsert(self, tracks):
+        """
+        Insert or refresh tracks (dicts with TRACK_COLUMNS).
+        A song keeps the search_tag it was first found with, and its language /
+        region once a query told us.
+        updated_at (the watermark) only moves when a value actually changed,
+        so re-fetching an unchanged song doesn't send it to training again.
+        """
+        if not tracks:
+            return 0
+
+        now = time.time()
+        rows = [
+            tuple(track.get(col) for col in TRACK_COLUMNS) + (now, now)
+            for track in tracks
+        ]
+        columns = TRACK_COLUMNS + ['fetched_at', 'updated_at']
+        # A known language / region isn't erased by a search that doesn't tell us
+        values = {
+            col: f"COALESCE(excluded.{col}, tracks.{col})" if col in ADDED_COLUMNS else f"excluded.{col}"
+            for col in TRACK_COLUMNS if col not in ('id', 'search_tag')
+        }
+        updates = ", ".join(f"{col} = {value}" for col, value in values.items())
+        changed = " OR ".join(f"tracks.{col} IS NOT {value}" for col, value in values.items())
+        sql = (
+            f"INSERT INTO tracks ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT(id) DO UPDATE SET "
+            f"updated_at = CASE WHEN {changed} THEN excluded.updated_at ELSE tracks.updated_at END, "
+            f"{updates}, fetched_at = excluded.fetched_at, "
+            f"search_tag = COALESCE(tracks.search_tag, excluded.search_tag)"
+        )
+        with self._lock, self._conn:
+            self._conn.executemany(sql, rows)
+        return len(rows)
+
+    def fresh_ids(self, track_ids, max_age=None):
+        """Which of these songs we already have and fetched recently enough"""
+        max_age = Config.TRACK_STALE_AFTER if max_age is None else max_age
+        cutoff = time.time() - max_age
+        track_ids = list(dict.fromkeys(track_ids))
+
+        fresh = set()
+        with self._lock:
+            # SQLite limits the number of '?' per statement
+            for i in range(0, len(track_ids), 500):
+                chunk = track_ids[i:i + 500]
+                cursor = self._conn.execute(
+                    f"SELECT id FROM tracks WHERE fetched_at >= ? AND id IN ({', '.join('?' * len(chunk))})",
+                    [cutoff] + chunk
+                )
+                fresh.update(row[0] for row in cursor)
+        return fresh
+
+    def stored_features(self, track_ids):
+        """{id: audio features + is_synthetic} for the songs of these we already have"""
+        track_ids = list(dict.fromkeys(track_ids))
+        stored = {}
+        with self._lock:
+            for i in range(0, len(track_ids), 500):
+                chunk = track_ids[i:i + 500]
+                cursor = self._conn.execute(
+                    f"SELECT id, {', '.join(FEATURE_COLUMNS)} FROM tracks WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                )
+                for row in cursor:
+                    features = dict(zip(FEATURE_COLUMNS, row[1:]))
+                    features['is_synthetic'] = bool(features['is_synthetic'])
+                    stored[row[0]] = features
+        return stored
+
+    def read(self, since=None):
+        """
+        All songs as a DataFrame (same columns as songs_raw.csv).
+        With 'since', only songs added/changed after that watermark.
+        """
+        sql = f"SELECT {', '.join(TRACK_COLUMNS)} FROM tracks"
+        params = []
+        if since is not None:
+            sql += " WHERE updated_at > ?"
+            params.append(since)
+        sql += " ORDER BY rowid"
+
+        with self._lock:
+            df = pd.read_sql_query(sql, self._conn, params=params)
+        df['is_synthetic'] = df['is_synthetic'].astype(bool)
+        return df
+
+    def watermark(self):
+        """Latest updated_at in the store (pass to read(since=...) next time)"""
+        with self._lock:
+            value = self._conn.execute("SELECT MAX(updated_at) FROM tracks").fetchone()[0]
+        return value or 0.0
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    # --- Pagination Checkpoints ---
+
+    def get_checkpoint(self, query):
+        """(next_offset, exhausted) for a search query"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT next_offset, exhausted FROM checkpoints WHERE query = ?", (query,)
+            ).fetchone()
+        return (row[0], bool(row[1])) if row else (0, False)
+
+    def set_checkpoint(self, query, next_offset, exhausted=False):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO checkpoints (query, next_offset, exhausted, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(query) DO UPDATE SET next_offset = excluded.next_offset, "
+                "exhausted = excluded.exhausted, updated_at = excluded.updated_at",
+                (query, next_offset, int(exhausted), time.time())
+            )
+
+    def reset_checkpoints(self):
+        """Start every query from page 1 again (e.g. to pick up new releases)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM checkpoints")
+
+
+def load_tracks(since=None):
+    """
+    Songs for training.
+    Reads the track store if there is one, else the raw CSV.
+    'since' (a watermark) is only supported by the store.
+    """
+    if Config.TRACK_STORE_PATH.exists():
+        store = TrackStore()
+        try:
+            return store.read(since=since)
+        finally:
+            store.close()
+
+    if since is not None:
+        raise ValueError("Reading a delta needs the track store. Run the collector first!")
+    if not Config.RAW_DATA_PATH.exists():
+        raise FileNotFoundError(f"No track store or CSV at {Config.RAW_DATA_PATH}. Run collector first!")
+    return pd.read_csv(Config.RAW_DATA_PATH)
+
+
+def current_watermark():
+    """The track store's watermark, or None when training from the CSV"""
+    if not Config.TRACK_STORE_PATH.exists():
+        return None
+    store = TrackStore()
+    try:
+        return store.watermark()
+    finally:
+        store.close()
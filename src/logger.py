@@ -1,27 +1,218 @@
+import atexit
+import copy
+import json
 import logging
+import os
+import queue
 import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from src.config import Config
+
+# Id of the HTTP request being served (set by the API middleware), added to every record
+request_id = ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has: anything else came in through extra={...}
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'request_id'}
+
+_setup_lock = threading.Lock()
+_queue_handler = None
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: easy to ship, search and aggregate"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic 'Timestamp - Name - Level - Message' line (for reading in a terminal)"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        return f"{line} [{record.request_id}]" if getattr(record, 'request_id', None) else line
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps the current request id on the record (runs in the caller's thread / task)"""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    At most 'rate' INFO/DEBUG records per second for the configured loggers.
+
+    Why: Some messages fire on every frame or request (e.g. "📸 Detected
+    Emotion"). Under load they flood the logs and cost time on the hot path.
+    Warnings and errors always pass. The next record that gets through
+    carries 'suppressed': how many were dropped in between.
+
+    limits: {logger name prefix: records per second}, longest prefix wins
+    """
+
+    def __init__(self, limits):
+        super().__init__()
+        self.limits = dict(limits)
+        self._buckets = {}  # logger name -> [tokens, last refill, suppressed]
+        self._lock = threading.Lock()
+
+    def _rate(self, name):
+        matches = [prefix for prefix in self.limits if name == prefix or name.startswith(prefix + '.')]
+        return self.limits[max(matches, key=len)] if matches else None
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.limits:
+            return True
+        rate = self._rate(record.name)
+        if rate is None:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.setdefault(record.name, [rate, now, 0])
+            # Refill, with a burst of up to one second's worth
+            bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed, bucket[2] = bucket[2], 0
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread. Logging never waits on stdout:
+    if the queue is full the record is dropped (and counted).
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback now: the args may change after we return
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_rate_limits(spec):
+    """'src.models.emotion=2,server.api=50' -> {'src.models.emotion': 2.0, 'server.api': 50.0}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, rate = item.partition('=')
+        limits[name.strip()] = float(rate)
+    return limits
+
+
+def _start_listener():
+    """New queue + listener thread (also used in a forked child, where the parent's thread doesn't exist)"""
+    global _listener
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if Config.LOG_FORMAT == 'json' else TextFormatter())
+    _queue_handler.queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+    _listener = QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush what's still queued (runs at exit)"""
+    if _listener is not None and _listener._thread is not None:
+        try:
+            _listener.stop()
+        except queue.Full:
+            pass  # No room for the stop signal: the listener is a daemon thread anyway
+
+
+def logging_stats():
+    if _queue_handler is None:
+        return {'queued': 0, 'dropped': 0}
+    return {'queued': _queue_handler.queue.qsize(), 'dropped': _queue_handler.dropped}
+
+
+def setup_logging():
+    """
+    Configure logging for the whole process, ONCE.
+
+    Why: Each module used to attach its own synchronous stdout handler, so
+    every log call wrote to the terminal on the caller's thread (the event
+    loop, a frame callback...). Now:
+    1. Calls only put the record on a queue; one background thread
+       (QueueListener) formats and writes it.
+    2. Records are JSON lines (LOG_FORMAT=text for the old format) with
+       the request id of the HTTP request that produced them.
+    3. Chatty loggers are rate limited (LOG_RATE_LIMITS).
+
+    Our loggers log at LOG_LEVEL; third-party libraries only show warnings.
+    """
+    global _queue_handler
+    with _setup_lock:
+        if _queue_handler is not None:
+            return
+
+        _queue_handler = _NonBlockingQueueHandler(None)
+        _queue_handler.addFilter(RequestIdFilter())
+        _queue_handler.addFilter(RateLimitFilter(parse_rate_limits(Config.LOG_RATE_LIMITS)))
+        _start_listener()
+
+        root = logging.getLogger()
+        root.addHandler(_queue_handler)
+        root.setLevel(logging.WARNING)
+
+        atexit.register(shutdown_logging)
+        if hasattr(os, 'register_at_fork'):
+            # server/serve.py forks workers after logging is set up
+            os.register_at_fork(after_in_child=_start_listener)
+
 
 def get_logger(name):
     """
     Creates a configured logger.
-    
+
     Why: In production, you don't look at the console. You look at logs files.
     'print' statements are bad practice in industrial code because they don't have
     timestamps or severity levels (INFO/WARN/ERROR).
+
+    Handlers live on the root logger (see setup_logging), not on each module's logger.
     """
+    setup_logging()
     logger = logging.getLogger(name)
-    
-    if not logger.handlers:
-        logger.setLevel(logging.INFO)
-        
-        # Create console handler
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setLevel(logging.INFO)
-        
-        # Create formatter (Timestamp - Name - Level - Message)
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        
-        logger.addHandler(handler)
-        
+    logger.setLevel(Config.LOG_LEVEL)
     return logger
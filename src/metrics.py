@@ -0,0 +1,189 @@
+import bisect
+import functools
+import threading
+import time
+from src.config import Config
+
+# Latency buckets in seconds: 0.5 ms .. 10 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """A number that only goes up (requests, cache hits...)"""
+
+    def __init__(self, registry):
+        self._registry = registry
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        if self._registry.enabled:
+            with self._lock:
+                self.value += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Histogram:
+    """
+    Counts observations per bucket (plus their sum), like a Prometheus histogram.
+
+    Why: An average hides the slow requests. With buckets, percentiles
+    (p50 / p99) can be computed later for any time window, and observing
+    is one bisect + one lock: cheap enough for every request.
+    """
+
+    def __init__(self, registry, buckets=LATENCY_BUCKETS):
+        self._registry = registry
+        self._lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot = above every bucket (+Inf)
+        self.sum = 0.0
+
+    def observe(self, value):
+        if not self._registry.enabled:
+            return
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[slot] += 1
+            self.sum += value
+
+    def samples(self, name, labels):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            yield f"{name}_bucket", {**labels, 'le': _format_value(bound)}, cumulative
+        yield f"{name}_sum", labels, total
+        yield f"{name}_count", labels, cumulative
+
+
+class Timer:
+    """
+    Time a block or a function into a histogram (in seconds).
+
+        with metrics.timer('semantic_stage_seconds', stage='encode'):
+            ...
+
+        @metrics.timer('model_load_seconds', model='recommender')
+        def load_model(self): ...
+    """
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.elapsed = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._start
+        self.histogram.observe(self.elapsed)
+        return False
+
+    def __call__(self, fn):
+        histogram = self.histogram
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return timed
+
+
+class Registry:
+    """
+    Every metric of this process, rendered in the Prometheus text format.
+
+    Metrics are identified by name + labels and created on first use.
+    Collectors are called at scrape time only, to export numbers other
+    objects already keep (cache hit counts, pool sizes): zero cost per request.
+
+    Each process has its own registry. With several server workers
+    (server/serve.py), a scrape of /metrics answers for the worker that
+    got the request.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._families = {}   # name -> [kind, help, {label items: metric}]
+        self._collectors = []
+
+    def _metric(self, kind, name, help, labels, factory):
+        key = tuple(sorted(labels.items()))
+        family = self._families.get(name)
+        metric = family[2].get(key) if family else None
+        if metric is None:
+            with self._lock:
+                family = self._families.setdefault(name, [kind, help, {}])
+                if family[0] != kind:
+                    raise ValueError(f"Metric '{name}' is a {family[0]}, not a {kind}")
+                family[1] = family[1] or help
+                metric = family[2].setdefault(key, factory())
+        return metric
+
+    def counter(self, name, help="", **labels):
+        return self._metric('counter', name, help, labels, lambda: Counter(self))
+
+    def histogram(self, name, help="", buckets=LATENCY_BUCKETS, **labels):
+        return self._metric('histogram', name, help, labels, lambda: Histogram(self, buckets))
+
+    def timer(self, name, help="", **labels):
+        return Timer(self.histogram(name, help, **labels))
+
+    def collector(self, fn):
+        """
+        Register fn() -> iterable of (name, kind, help, labels, value).
+        kind is 'counter' or 'gauge'. Usable as a decorator.
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        families = {}
+        with self._lock:
+            for name, (kind, help, metrics) in self._families.items():
+                families[name] = [kind, help, [
+                    sample for key, metric in list(metrics.items()) for sample in metric.samples(name, dict(key))
+                ]]
+        for collect in self._collectors:
+            for name, kind, help, labels, value in collect():
+                family = families.setdefault(name, [kind, help, []])
+                family[1] = family[1] or help
+                family[2].append((name, labels, value))
+
+        lines = []
+        for name, (kind, help, samples) in families.items():
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample, labels, value in samples:
+                lines.append(f"{sample}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# The process-wide registry that /metrics renders
+metrics = Registry(enabled=Config.METRICS_ENABLED)
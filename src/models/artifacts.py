@@ -0,0 +1,279 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+import joblib
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Bump when the on-disk layout changes in a way old code can't read
+FORMAT_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+DATA_FILE = "data.parquet"
+OBJECTS_FILE = "objects.joblib"
+
+
+def save_artifact(directory, arrays, data, objects=None, meta=None):
+    """
+    Write a model artifact as a folder:
+
+        manifest.json    small, human readable: version, shapes, dtypes
+        <name>.npy       one raw matrix per array (memory-mappable)
+        data.parquet     song metadata, columnar
+        objects.joblib   small Python objects (sklearn pipeline, index structure...)
+
+    Why: joblib-pickling everything together means every worker process
+    deserializes its own private copy. Raw .npy files can be mmap'd instead,
+    so all workers share ONE page-cached copy and startup is instant.
+
+    The folder is written next to the target and swapped in at the end,
+    so a crash never leaves a half-written artifact behind.
+    """
+    tmp = directory.with_name(directory.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'created_at': time.time(),
+        'rows': len(data),
+        'data_file': DATA_FILE,
+        'arrays': {},
+        'meta': meta or {}
+    }
+
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        np.save(tmp / f"{name}.npy", array)
+        manifest['arrays'][name] = {
+            'file': f"{name}.npy",
+            'dtype': str(array.dtype),
+            'shape': list(array.shape)
+        }
+
+    data.to_parquet(tmp / DATA_FILE, index=False)
+
+    if objects:
+        joblib.dump(objects, tmp / OBJECTS_FILE)
+        manifest['objects_file'] = OBJECTS_FILE
+
+    with open(tmp / MANIFEST_FILE, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap in
+    old = directory.with_name(directory.name + ".old")
+    if directory.exists():
+        if old.exists():
+            shutil.rmtree(old)
+        directory.rename(old)
+    tmp.rename(directory)
+    if old.exists():
+        shutil.rmtree(old)
+
+    logger.info(f"💾 Saved artifact v{FORMAT_VERSION} to {directory}")
+    return manifest
+
+
+def artifact_version(manifest):
+    """
+    Short id that changes whenever the artifact is rewritten or updated
+    (e.g. to invalidate caches of results computed from it).
+    """
+    stamp = f"{manifest.get('created_at')}:{manifest.get('updated_at')}:{manifest.get('rows')}"
+    return hashlib.sha1(stamp.encode()).hexdigest()[:12]
+
+
+def artifact_exists(directory):
+    return (directory / MANIFEST_FILE).exists()
+
+
+def read_manifest(directory):
+    with open(directory / MANIFEST_FILE) as f:
+        manifest = json.load(f)
+
+    version = manifest.get('format_version', 0)
+    if version > FORMAT_VERSION:
+        raise ValueError(
+            f"Artifact {directory} is format v{version}, this code reads up to v{FORMAT_VERSION}. Upgrade the app."
+        )
+    return manifest
+
+
+def load_artifact(directory, mmap=True):
+    """
+    Load an artifact written by save_artifact().
+    Arrays are memory-mapped read-only unless mmap=False.
+
+    Returns:
+        (arrays, data, objects, manifest)
+    """
+    manifest = read_manifest(directory)
+
+    arrays = {name: _load_committed(directory, spec, mmap) for name, spec in manifest['arrays'].items()}
+    data = pd.read_parquet(directory / manifest['data_file'])
+
+    objects = {}
+    if manifest.get('objects_file'):
+        objects = joblib.load(directory / manifest['objects_file'])
+
+    return arrays, data, objects, manifest
+
+
+def _load_committed(directory, spec, mmap=True):
+    """
+    An array as the manifest describes it. Rows appended by an update that
+    crashed before writing its manifest are ignored (the next append overwrites them).
+    """
+    array = np.load(directory / spec['file'], mmap_mode='r' if mmap else None)
+    rows = spec['shape'][0] if spec['shape'] else None
+    if rows is not None and len(array) > rows:
+        array = array[:rows]
+    return array
+
+
+def load_array(directory, name, mmap=True):
+    """Load just one array of an artifact (e.g. after appending rows to it)"""
+    return _load_committed(directory, read_manifest(directory)['arrays'][name], mmap)
+
+
+def _read_npy_header(f):
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    return version, shape, fortran_order, dtype
+
+
+def append_rows(path, rows, committed=None):
+    """
+    Append rows to a .npy file IN PLACE (no rewrite of the existing data).
+
+    NumPy pads .npy headers so the row count can grow without moving the data.
+    We write the new rows at the end first and patch the header last, so a
+    crash in between leaves a file that still loads as the old array.
+
+    committed: row count the manifest knows about. Rows past it were left by
+    an update that crashed before its manifest was written: they're overwritten.
+    Returns the new shape.
+    """
+    with open(path, 'r+b') as f:
+        version, shape, fortran_order, dtype = _read_npy_header(f)
+        data_start = f.tell()
+        rows = np.ascontiguousarray(rows, dtype=dtype)
+        if fortran_order or rows.shape[1:] != tuple(shape[1:]):
+            raise ValueError(f"Can't append {rows.shape} rows to {path} with shape {shape}")
+        if committed is not None:
+            shape = (min(committed, shape[0]),) + tuple(shape[1:])
+
+        new_shape = (shape[0] + len(rows),) + tuple(shape[1:])
+        header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': new_shape}
+
+        # Does the bigger shape still fit in the padded header?
+        probe = io.BytesIO()
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(probe, header)
+        else:
+            np.lib.format.write_array_header_2_0(probe, header)
+        if probe.tell() != data_start:
+            raise ValueError(f"No room to grow the header of {path}")
+
+        f.seek(data_start + shape[0] * dtype.itemsize * int(np.prod(shape[1:], dtype=np.int64)))
+        f.write(rows.tobytes())
+        if f.tell() < os.fstat(f.fileno()).st_size:
+            f.truncate()  # Leftovers from an append that crashed before its header patch
+        f.flush()
+        os.fsync(f.fileno())
+
+        f.seek(0)
+        f.write(probe.getvalue())
+    return new_shape
+
+
+def write_rows(path, rows, values):
+    """
+    Overwrite some rows of a .npy file IN PLACE (e.g. songs whose vectors changed).
+    Processes that have the file memory-mapped see the new values right away.
+    """
+    array = np.load(path, mmap_mode='r+')
+    array[np.asarray(rows, dtype=np.int64)] = np.asarray(values, dtype=array.dtype)
+    array.flush()
+    del array
+
+
+def _replace_file(path, write):
+    """Write to a temp file (via write(file_object)), then atomically swap it in"""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def update_artifact(directory, append=None, replace=None, data=None, objects=None, meta=None, overwrite=None):
+    """
+    Change an existing artifact without rewriting everything.
+
+    Args:
+        append: {name: rows} rows to add at the end of existing arrays (in place)
+        overwrite: {name: (row positions, values)} existing rows to change (in place)
+        replace: {name: array} small arrays to rewrite (e.g. tombstone flags)
+        data: new song metadata (rewritten; it's small next to the embeddings)
+        objects: new small Python objects (rewritten)
+        meta: keys to merge into the manifest's meta
+
+    The manifest is the commit point: it's written last, and readers only
+    trust what it lists. Appended rows past its shapes are ignored, and
+    rewritten files get new names (the old ones stay until the next update,
+    for readers that already hold the previous manifest). A crash anywhere
+    before the manifest swap leaves the previous version loadable.
+    Overwritten rows are the exception: they change in place right away.
+    """
+    manifest = read_manifest(directory)
+    generation = manifest.get('generation', 0) + 1
+    # Files the manifest before the previous one referenced: nobody reads them anymore
+    obsolete = manifest.get('superseded', [])
+    superseded = []
+
+    def new_file(old_name, name, suffix):
+        if old_name:
+            superseded.append(old_name)
+        return f"{name}.{generation}{suffix}"
+
+    for name, (rows, values) in (overwrite or {}).items():
+        write_rows(directory / manifest['arrays'][name]['file'], rows, values)
+
+    for name, rows in (append or {}).items():
+        spec = manifest['arrays'][name]
+        spec['shape'] = list(append_rows(directory / spec['file'], rows, committed=spec['shape'][0]))
+
+    for name, array in (replace or {}).items():
+        array = np.ascontiguousarray(array)
+        file = new_file(manifest['arrays'].get(name, {}).get('file'), name, ".npy")
+        _replace_file(directory / file, lambda f: np.save(f, array))
+        manifest['arrays'][name] = {'file': file, 'dtype': str(array.dtype), 'shape': list(array.shape)}
+
+    if data is not None:
+        manifest['data_file'] = new_file(manifest['data_file'], "data", ".parquet")
+        _replace_file(directory / manifest['data_file'], lambda f: data.to_parquet(f, index=False))
+        manifest['rows'] = len(data)
+
+    if objects is not None:
+        manifest['objects_file'] = new_file(manifest.get('objects_file'), "objects", ".joblib")
+        _replace_file(directory / manifest['objects_file'], lambda f: joblib.dump(objects, f))
+
+    manifest['generation'] = generation
+    manifest['superseded'] = superseded
+    manifest['updated_at'] = time.time()
+    manifest['meta'].update(meta or {})
+    _replace_file(directory / MANIFEST_FILE, lambda f: f.write(json.dumps(manifest, indent=2).encode()))
+
+    for name in obsolete:
+        (directory / name).unlink(missing_ok=True)
+    return manifest
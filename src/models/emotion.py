@@ -1,10 +1,19 @@
+import threading
 import cv2
 import numpy as np
 from deepface import DeepFace
+from src.config import Config
+from src.metrics import metrics
 from src.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Output order of DeepFace's emotion model
+EMOTIONS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+# The emotion model looks at 48x48 grayscale faces
+FACE_SIZE = 48
+CASCADE_FILE = "haarcascade_frontalface_default.xml"
+
 class EmotionDetector:
     """
     The 'Eyes' of the System.
@@ -12,10 +21,37 @@ class EmotionDetector:
     """
     
     def __init__(self):
-        # DeepFace loads models on the first call, so we do a dummy call here
-        # or we just wait for the first user interaction.
-        pass
+        # DeepFace loads models on the first call, so we do a dummy call
+        # in warm_up() instead of waiting for the first user interaction.
+        self.emotion_model = None  # DeepFace's Keras emotion classifier (batch path)
+        # Frames are analyzed on several InferencePool threads at once:
+        # a CascadeClassifier must not be shared between threads, and Keras
+        # predict() isn't safe to call concurrently on one model
+        self._local = threading.local()
+        self._model_lock = threading.Lock()
+        self.face_detector  # Load this thread's cascade now: a missing file fails at startup
+
+    @property
+    def face_detector(self):
+        """This thread's OpenCV Haar cascade (each thread loads its own, once)"""
+        detector = getattr(self._local, 'face_detector', None)
+        if detector is None:
+            detector = cv2.CascadeClassifier(cv2.data.haarcascades + CASCADE_FILE)
+            if detector.empty():
+                raise RuntimeError(f"❌ Could not load the face cascade {CASCADE_FILE}")
+            self._local.face_detector = detector
+        return detector
+
+    def warm_up(self):
+        """
+        Force DeepFace to load the TensorFlow emotion model now.
+        Raises if the model can't be loaded (so readiness reports 'failed').
+        """
+        blank = np.zeros((224, 224, 3), dtype=np.uint8)
+        DeepFace.analyze(img_path=blank, actions=['emotion'], enforce_detection=False)
+        self.detect_emotions([blank])  # The batch path calls the Keras model directly
 
+    @metrics.timer('emotion_stage_seconds', "Emotion detection time per stage", stage='analyze')
     def detect_emotion(self, image):
         """
         Analyze a webcam frame and return the dominant emotion.
@@ -30,7 +66,8 @@ class EmotionDetector:
             
             # Analyze
             # actions=['emotion'] makes it faster (skips age/gender/race)
-            analysis = DeepFace.analyze(img_path=image, actions=['emotion'], enforce_detection=False)
+            with self._model_lock:
+                analysis = DeepFace.analyze(img_path=image, actions=['emotion'], enforce_detection=False)
             
             if not analysis:
                 return None
@@ -45,3 +82,86 @@ class EmotionDetector:
         except Exception as e:
             logger.error(f"❌ Emotion Detection Failed: {e}")
             return None
+
+    def detect_faces(self, image, width=None):
+        """
+        Cheap face finder (Haar cascade, no neural net): fast enough for EVERY video frame.
+        The frame is shrunk to 'width' pixels first; boxes come back in full-frame pixels.
+        Returns:
+            (n, 4) int array of (x, y, w, h), biggest face first
+        """
+        width = width or Config.EMOTION_DETECT_WIDTH
+        scale = min(1.0, width / image.shape[1])
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        if scale < 1:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        
+        boxes = self.face_detector.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(24, 24))
+        if len(boxes) == 0:
+            return np.empty((0, 4), dtype=int)
+        boxes = np.round(np.asarray(boxes) / scale).astype(int)
+        return boxes[np.argsort(-(boxes[:, 2] * boxes[:, 3]))]
+
+    def emotion_scores(self, face):
+        """
+        Emotion probabilities for an already cropped face: {"happy": 0.93, "sad": 0.01, ...}
+        
+        Why: We found the face ourselves, so DeepFace skips its own
+        detector ('skip') and the model only sees the small crop.
+        """
+        with self._model_lock:
+            analysis = DeepFace.analyze(img_path=face, actions=['emotion'], detector_backend='skip', enforce_detection=False)
+        if not analysis:
+            return None
+        return {emotion: float(score) / 100 for emotion, score in analysis[0]['emotion'].items()}
+
+    def _load_emotion_model(self):
+        """Call with _model_lock held (so two threads don't both build it)"""
+        if self.emotion_model is None:
+            with metrics.timer('model_load_seconds', model='emotion'):
+                try:
+                    model = DeepFace.build_model("Emotion", task="facial_attribute")
+                except TypeError:
+                    model = DeepFace.build_model("Emotion")  # deepface < 0.0.93
+            # Newer deepface wraps the Keras model in a client object
+            self.emotion_model = getattr(model, 'model', model)
+        return self.emotion_model
+
+    def detect_emotions(self, images):
+        """
+        Dominant emotion for MANY frames with ONE forward pass of the emotion model.
+        
+        Why: DeepFace.analyze handles one image per call (face detection,
+        preprocessing, a batch-of-1 model call). Here we crop each face with
+        the cheap Haar finder, stack the 48x48 crops and let TensorFlow
+        process them together.
+        
+        Returns:
+            list: an emotion per image (None where the image is unusable)
+        """
+        faces, usable = [], []
+        for i, image in enumerate(images):
+            if image is None or image.size == 0:
+                continue
+            boxes = self.detect_faces(image)
+            if len(boxes):
+                x, y, w, h = boxes[0]
+                image = image[y:y + h, x:x + w]
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+            faces.append(cv2.resize(gray, (FACE_SIZE, FACE_SIZE)))
+            usable.append(i)
+        
+        emotions = [None] * len(images)
+        if not faces:
+            return emotions
+        
+        batch = np.stack(faces).astype(np.float32)[..., None] / 255
+        with self._model_lock:
+            model = self._load_emotion_model()
+            with metrics.timer('emotion_stage_seconds', stage='model'):
+                probabilities = np.asarray(model.predict(batch, verbose=0))
+        for i, best in zip(usable, probabilities.argmax(axis=1).tolist()):
+            emotions[i] = EMOTIONS[best]
+        
+        logger.info(f"📸 Detected Emotions for {len(faces)} frames in one batch")
+        return emotions
@@ -0,0 +1,138 @@
+import re
+import numpy as np
+import pandas as pd
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Single-value columns we can filter on (when the catalog has them)
+FILTER_COLUMNS = ('language', 'region', 'is_synthetic')
+
+# UI / API values that mean "no filter"
+ANY = {'', 'all', 'global', 'any'}
+
+
+def normalize_value(value):
+    return str(value).strip().lower()
+
+
+def option_value(value):
+    """UI label -> catalog value: 'Korean (K-Pop)' -> 'korean'"""
+    return normalize_value(re.sub(r"\(.*?\)", "", str(value)))
+
+
+class MetadataIndex:
+    """
+    Bitmap Index over song metadata: column -> value -> packed bit per song.
+
+    Why: Appending "Hindi" to the query text and hoping the Transformer gets it
+    is luck, not filtering. With a bitmap per value, a filter is a few bitwise
+    ORs/ANDs over n/8 bytes, done BEFORE scoring, so the index only scores
+    songs that can actually be returned.
+
+    Filterable: language / region / is_synthetic (if the catalog has them)
+    and 'tags' = the whitespace-separated tokens of search_tag
+    ("genre:pop year:2023" -> "genre:pop", "year:2023").
+    """
+
+    def __init__(self, data: pd.DataFrame):
+        self.n = len(data)
+        self.bitmaps = {}
+
+        for col in FILTER_COLUMNS:
+            if col in data:
+                # Songs we don't know the value for (None / empty) match no value
+                known = data[col].notna() & (data[col].astype(str).str.strip() != '')
+                values = data.loc[known, col].map(normalize_value).to_numpy()
+                self.bitmaps[col] = self._build(values, np.flatnonzero(known.to_numpy()))
+
+        if self.supports('is_synthetic') and not self.has('is_synthetic', False):
+            logger.warning("⚠️ Every song has synthetic features: include_synthetic=False will be ignored")
+
+        if 'search_tag' in data:
+            tokens = data['search_tag'].fillna('').astype(str).str.lower().str.split().explode().dropna()
+            self.bitmaps['tags'] = self._build(tokens.to_numpy(), tokens.index.to_numpy())
+
+    def _build(self, values, rows):
+        bitmaps = {}
+        for value, positions in pd.Series(rows).groupby(values, sort=False).indices.items():
+            bits = np.zeros(self.n, dtype=bool)
+            bits[rows[positions]] = True
+            bitmaps[value] = np.packbits(bits)
+        return bitmaps
+
+    def supports(self, column):
+        """Can we filter on this? (the column exists AND some song has a value for it)"""
+        return bool(self.bitmaps.get(column))
+
+    def has(self, column, value):
+        """Does any song have this value?"""
+        return normalize_value(value) in self.bitmaps.get(column, {})
+
+    def values(self, column):
+        return sorted(self.bitmaps.get(column, {}))
+
+    def mask(self, **filters):
+        """
+        mask(language="hindi", tags=["mood:sad", "genre:pop"])
+        Several values for one column = OR, several columns = AND.
+        Returns a boolean array (True = song matches) or None if nothing is filtered.
+        """
+        packed = None
+        for column, wanted in filters.items():
+            if wanted is None:
+                continue
+            if column not in self.bitmaps:
+                raise ValueError(f"Catalog has no '{column}' to filter on")
+            if not isinstance(wanted, (list, tuple, set)):
+                wanted = [wanted]
+
+            empty = np.zeros((self.n + 7) // 8, dtype=np.uint8)
+            column_bits = empty
+            for value in wanted:
+                column_bits = column_bits | self.bitmaps[column].get(normalize_value(value), empty)
+            packed = column_bits if packed is None else packed & column_bits
+
+        if packed is None:
+            return None
+        return np.unpackbits(packed, count=self.n).astype(bool)
+
+
+def request_filters(index, language=None, region=None, tags=None, include_synthetic=True):
+    """
+    UI / API options -> keyword arguments for MetadataIndex.mask().
+
+    Returns (filters, unsupported): 'unsupported' holds the options this
+    catalog has no column for (e.g. language when songs have no 'language').
+    """
+    filters, unsupported = {}, {}
+    for column, value in (('language', language), ('region', region)):
+        if value is None or normalize_value(value) in ANY:
+            continue
+        if index.supports(column):
+            filters[column] = option_value(value)
+        else:
+            unsupported[column] = value
+
+    if tags:
+        if index.supports('tags'):
+            filters['tags'] = list(tags)
+        else:
+            unsupported['tags'] = list(tags)
+
+    if not include_synthetic:
+        if index.has('is_synthetic', False):
+            filters['is_synthetic'] = False
+        else:
+            # No real songs (or no column): filtering would return NOTHING, so don't
+            unsupported['is_synthetic'] = False
+
+    return filters, unsupported
+
+
+def filter_key(filters):
+    """Hashable version of a filters dict (to group queries with the same filters)"""
+    return tuple(sorted(
+        (column, tuple(value) if isinstance(value, (list, tuple, set)) else value)
+        for column, value in (filters or {}).items()
+    ))
@@ -0,0 +1,167 @@
+import time
+import numpy as np
+from src.config import Config
+from src.models.topk import top_k
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class HybridRanker:
+    """
+    Hybrid Retrieval: Language Brain + Math Brain in one ranked list.
+
+    Why: Semantic search understands the prompt ("rainy breakup songs")
+    but knows nothing about how songs SOUND. The audio-feature neighbours
+    of the best semantic hits bring in songs that feel the same, even if
+    their titles/tags never mention the prompt.
+
+    Pipeline (each stage is vectorized over the candidate set):
+    1. semantic: top candidates for the prompt (embedding index)
+    2. audio:    audio-feature neighbours of the best semantic hits
+    3. fuse:     Reciprocal Rank Fusion, sum of weight / (rrf_k + rank)
+                 per source. Ranks, not raw scores, so cosine similarities
+                 from two different spaces never need calibrating.
+    4. mmr:      Maximal Marginal Relevance: pick songs that are relevant
+                 AND not near-duplicates of songs already picked.
+    """
+
+    FIELDS = {'name': 'name', 'artist': 'artist', 'tags': 'search_tag', 'spotify_id': 'id'}
+
+    def __init__(self, semantic_engine, recommender,
+                 semantic_candidates=None, audio_seeds=None, audio_candidates=None,
+                 semantic_weight=None, audio_weight=None, rrf_k=None, mmr_lambda=None):
+        self.semantic = semantic_engine
+        self.recommender = recommender
+        self.semantic_candidates = semantic_candidates or Config.HYBRID_SEMANTIC_CANDIDATES
+        self.audio_seeds = audio_seeds or Config.HYBRID_AUDIO_SEEDS
+        self.audio_candidates = audio_candidates or Config.HYBRID_AUDIO_CANDIDATES
+        self.semantic_weight = Config.HYBRID_SEMANTIC_WEIGHT if semantic_weight is None else semantic_weight
+        self.audio_weight = Config.HYBRID_AUDIO_WEIGHT if audio_weight is None else audio_weight
+        self.rrf_k = rrf_k or Config.HYBRID_RRF_K
+        self.mmr_lambda = Config.HYBRID_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+
+        # Recommender row -> semantic row (both catalogs are keyed on Spotify ID)
+        self._row_map = None
+        self._row_map_sizes = None
+
+    def _audio_to_semantic(self):
+        """(recommender rows,) array of semantic rows, -1 = song missing from the semantic index"""
+        sizes = (len(self.recommender.data), len(self.semantic.data))
+        if self._row_map is None or self._row_map_sizes != sizes:
+            semantic_rows = {
+                song_id: row for row, song_id in enumerate(self.semantic.columns.columns['id'].tolist())
+            }
+            self._row_map = np.array(
+                [semantic_rows.get(song_id, -1) for song_id in self.recommender.columns.columns['id'].tolist()],
+                dtype=np.int64
+            )
+            self._row_map_sizes = sizes
+        return self._row_map
+
+    def rank(self, query: str, top_k=30, filters=None):
+        """
+        filters: metadata filters (see MetadataIndex.mask), applied to BOTH sources
+        Returns:
+            (results, timings): result dicts best first (with 'score' = fused score
+            and 'sources'), and per-stage latency in milliseconds
+        """
+        timings = {}
+        start = last = time.perf_counter()
+
+        def lap(stage):
+            nonlocal last
+            now = time.perf_counter()
+            timings[stage] = (now - last) * 1000
+            last = now
+
+        # 0. Prompt -> vector (cached)
+        query_vector = self.semantic.encode_query(query)
+        lap('encode')
+
+        # 1. Semantic candidates (filtered inside the index, before top-k)
+        mask = self.semantic.filter_mask(filters)
+        _, semantic_rows = self.semantic.search_rows(query_vector[None, :], self.semantic_candidates, mask=mask)
+        semantic_rows = semantic_rows[0][semantic_rows[0] >= 0]
+        lap('semantic')
+
+        # 2. Audio-feature neighbours of the best semantic hits
+        audio_rows = np.empty(0, dtype=np.int64)
+        audio_ranks = np.empty(0, dtype=np.int64)
+        row_map = self._audio_to_semantic()
+        seeds = semantic_rows[:self.audio_seeds]
+        seed_ids = self.semantic.columns.columns['id'][seeds]
+        seed_rows = [self.recommender.lookup.find_id(song_id) for song_id in seed_ids]
+        seed_rows = [row for row in seed_rows if row is not None]
+        if seed_rows and self.audio_weight > 0:
+            neighbours, _ = self.recommender.neighbour_rows(seed_rows, self.audio_candidates)
+            # Rank = position in the seed's list; a song close to several seeds keeps its best rank
+            ranks = np.broadcast_to(np.arange(neighbours.shape[1]), neighbours.shape)
+            mapped = row_map[neighbours.ravel()]
+            keep = mapped >= 0
+            if mask is not None:
+                keep[keep] = mask[mapped[keep]]  # Filtered out or removed from the semantic index
+            audio_rows, audio_ranks = mapped[keep], ranks.ravel()[keep]
+        lap('audio')
+
+        # 3. Reciprocal Rank Fusion over the union of both candidate sets
+        candidates, inverse = np.unique(np.concatenate([semantic_rows, audio_rows]), return_inverse=True)
+        fused = np.zeros(len(candidates))
+        from_semantic = np.zeros(len(candidates), dtype=bool)
+        from_audio = np.zeros(len(candidates), dtype=bool)
+
+        semantic_slots = inverse[:len(semantic_rows)]
+        fused[semantic_slots] += self.semantic_weight / (self.rrf_k + 1 + np.arange(len(semantic_rows)))
+        from_semantic[semantic_slots] = True
+
+        audio_slots = inverse[len(semantic_rows):]
+        best_rank = np.full(len(candidates), np.iinfo(np.int64).max)
+        np.minimum.at(best_rank, audio_slots, audio_ranks)
+        has_audio = best_rank < np.iinfo(np.int64).max
+        fused[has_audio] += self.audio_weight / (self.rrf_k + 1 + best_rank[has_audio])
+        from_audio[has_audio] = True
+        lap('fuse')
+
+        # 4. Diversity
+        picked = self._mmr(candidates, fused, top_k)
+        lap('mmr')
+
+        results = self.semantic.columns.gather(candidates[picked][None, :], fused[picked][None, :], self.FIELDS)[0]
+        sources = np.where(from_semantic[picked] & from_audio[picked], 'both', np.where(from_semantic[picked], 'semantic', 'audio'))
+        for result, source in zip(results, sources.tolist()):
+            result['sources'] = source
+        lap('gather')
+
+        timings['total'] = (time.perf_counter() - start) * 1000
+        return results, timings
+
+    def _mmr(self, candidates, relevance, k):
+        """
+        Greedy MMR: each step picks argmax of
+            lambda * relevance - (1 - lambda) * (max similarity to anything picked)
+        The 'max similarity' vector is updated with one column per step,
+        so the whole selection is O(k * candidates).
+        """
+        k = min(k, len(candidates))
+        if k == 0:
+            return np.empty(0, dtype=np.int64)
+        if self.mmr_lambda >= 1:
+            return top_k(relevance, k)
+
+        # Relevance on a 0..1 scale, comparable with cosine similarity
+        spread = relevance.max() - relevance.min()
+        relevance = (relevance - relevance.min()) / (spread if spread > 0 else 1)
+
+        vectors = np.asarray(self.semantic.song_embeddings[candidates], dtype=np.float32)
+        similarity = vectors @ vectors.T
+
+        picked = np.empty(k, dtype=np.int64)
+        redundancy = np.zeros(len(candidates), dtype=np.float32)
+        available = np.ones(len(candidates), dtype=bool)
+        for i in range(k):
+            mmr = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+            mmr[~available] = -np.inf
+            picked[i] = np.argmax(mmr)
+            available[picked[i]] = False
+            np.maximum(redundancy, similarity[picked[i]], out=redundancy)
+        return picked
@@ -0,0 +1,369 @@
+import time
+import numpy as np
+from src.config import Config
+from src.models.topk import top_k
+from src.models.quantize import ScalarQuantizer
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _VectorIndex:
+    """
+    Shared plumbing: the index points at the song vectors but never pickles them.
+    The vectors live in the model artifact (memory-mapped), and are
+    re-attached after loading.
+
+    Optionally the index scores a compressed copy of the vectors ('codes',
+    see quantize.py) and re-ranks its best candidates with the exact ones.
+    """
+
+    # Class defaults, so indexes pickled before quantization existed still load
+    quantizer = None
+    codes = None
+    rerank = 0
+
+    # A mask allowing at most this share of the catalog is searched by
+    # scoring only the allowed rows (gather + smaller GEMM); above it,
+    # scoring everything and blanking the rest is cheaper
+    SUBSET_SCAN_RATIO = 0.5
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['vectors'] = None
+        state['codes'] = None  # Saved next to the vectors in the artifact
+        return state
+
+    def attach(self, vectors, codes=None):
+        self.vectors = vectors
+        if self.quantizer is not None:
+            self.codes = codes if codes is not None else self.quantizer.encode(vectors)
+        return self
+
+    def quantize(self, kind, rerank=None):
+        """
+        Score on 'float16' / 'int8' codes instead of float32 ('none' = exact).
+        rerank: re-score the best k * rerank candidates exactly (0 = off)
+        """
+        if kind in (None, 'none'):
+            self.quantizer, self.codes, self.rerank = None, None, 0
+            return self
+        self.quantizer = ScalarQuantizer(kind).fit(self.vectors)
+        self.codes = self.quantizer.encode(self.vectors)
+        self.rerank = Config.QUANTIZATION_RERANK if rerank is None else rerank
+        return self
+
+    def extend(self, vectors, codes=None):
+        """
+        Rows were appended to the song matrix: index the new ones.
+        'vectors' is the FULL matrix (old rows + new rows), same for 'codes'.
+        """
+        if self.quantizer is not None and codes is None:
+            codes = np.concatenate([self.codes, self.quantizer.encode(vectors[len(self.codes):])])
+        return self.attach(vectors, codes)
+
+    def nbytes(self):
+        """RAM the hot search path touches (codes if quantized, else the vectors)"""
+        hot = self.codes if self.codes is not None else self.vectors
+        return 0 if hot is None else hot.nbytes
+
+    def _scores(self, queries, rows=None):
+        """Scores vs every song (or just 'rows'), on the compressed copy if we have one"""
+        if self.codes is not None:
+            return self.quantizer.scores(queries, self.codes if rows is None else self.codes[rows])
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        return queries @ vectors.T
+
+    def _n_candidates(self, k, rerank):
+        rerank = self.rerank if rerank is None else rerank
+        return k * rerank if self.codes is not None and rerank > 1 else k
+
+    def _rerank(self, queries, ids, k):
+        """Exact float32 scores for (m, c) candidate ids (-1 = empty); keep the best k"""
+        safe = np.where(ids >= 0, ids, 0)
+        candidates = np.asarray(self.vectors[safe.ravel()], dtype=np.float32).reshape(*ids.shape, -1)
+        exact = np.einsum('md,mcd->mc', queries, candidates)
+        exact[ids < 0] = -np.inf
+
+        best = top_k(exact, k)
+        scores = np.take_along_axis(exact, best, axis=1)
+        ids = np.where(np.isneginf(scores), -1, np.take_along_axis(ids, best, axis=1))
+        return scores, ids
+
+    def _exact_search(self, queries, k, mask=None, rerank=None):
+        """Score every allowed song (see FlatIndex.search)"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        rows = None
+        if mask is not None and np.count_nonzero(mask) <= self.SUBSET_SCAN_RATIO * len(mask):
+            # Selective filter: only the matching songs are ever scored
+            rows = np.flatnonzero(mask)
+            scores = self._scores(queries, rows)
+        else:
+            scores = self._scores(queries)
+            if mask is not None:
+                scores[:, ~mask] = -np.inf
+        n_candidates = self._n_candidates(k, rerank)
+        ids = top_k(scores, n_candidates)
+        top_scores = np.take_along_axis(scores, ids, axis=1)
+        if rows is not None:
+            ids = rows[ids]
+        pad = n_candidates - ids.shape[1]
+        if pad > 0:
+            # Fewer songs (or matching songs) than asked for: always (m, k), like IVFIndex
+            ids = np.pad(ids, ((0, 0), (0, pad)), constant_values=-1)
+            top_scores = np.pad(top_scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+        if mask is not None:
+            ids = np.where(np.isneginf(top_scores), -1, ids)
+        if n_candidates > k:
+            return self._rerank(queries, ids, k)
+        return top_scores, ids
+
+    def __len__(self):
+        return 0 if self.vectors is None else len(self.vectors)
+
+
+class FlatIndex(_VectorIndex):
+    """
+    The 'Exact' Index.
+    Scores the query against every song. Perfect recall, linear cost.
+    Best choice for small catalogs (a few thousand songs).
+    """
+
+    kind = 'flat'
+
+    def __init__(self):
+        self.vectors = None
+
+    def build(self, vectors):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        return self
+
+    def search(self, queries, k, mask=None, rerank=None):
+        """
+        Args:
+            queries: (m, d) matrix of query vectors
+            k: number of results per query
+            mask: optional boolean array, True = song may be returned
+                  (e.g. False for deleted or filtered-out songs)
+            rerank: override the re-ranking factor of a quantized index
+        Returns:
+            (scores, ids): two (m, k) arrays, best first.
+            Empty slots (fewer than k allowed songs) have id -1 and score -inf.
+        """
+        return self._exact_search(queries, k, mask, rerank)
+
+
+class IVFIndex(_VectorIndex):
+    """
+    The 'Approximate' Index (Inverted File).
+
+    Why: Scoring millions of songs per query is too slow.
+    We cluster the songs into 'n_lists' buckets (k-means) once at build time.
+    At query time we only open the 'n_probe' closest buckets.
+
+    Knobs:
+        n_lists: More buckets = smaller buckets = faster, but lower recall.
+        n_probe: More buckets opened = higher recall, but slower.
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, n_lists=None, n_probe=8, n_iter=10, sample_size=100_000, seed=42):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.sample_size = sample_size
+        self.seed = seed
+
+        self.vectors = None
+        self.centroids = None
+        # CSR layout: song ids sorted by bucket + where each bucket starts
+        self.list_ids = None
+        self.list_offsets = None
+        self.assignments = None  # Bucket of every song
+
+    def build(self, vectors, chunk_size=65_536):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = len(self.vectors)
+        if self.n_lists is None:
+            self.n_lists = max(1, int(np.sqrt(n)))
+        n_lists = min(self.n_lists, n)
+
+        # 1. Learn centroids on a sample (k-means on millions of rows is wasteful)
+        rng = np.random.default_rng(self.seed)
+        sample = self.vectors
+        if n > self.sample_size:
+            sample = self.vectors[rng.choice(n, self.sample_size, replace=False)]
+        self.centroids = self._kmeans(sample, n_lists, rng)
+
+        # 2. Assign every song to its closest centroid
+        self.assignments = self._assign(self.vectors, chunk_size)
+        self._build_lists()
+        logger.info(f"🗂️ IVF Index: {n} songs in {len(self.centroids)} buckets")
+        return self
+
+    def _assign(self, vectors, chunk_size=65_536):
+        # Chunked to bound memory
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk_size):
+            block = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+            assignments[start:start + chunk_size] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+
+    def _build_lists(self):
+        self.list_ids = np.argsort(self.assignments, kind='stable').astype(np.int64)
+        counts = np.bincount(self.assignments, minlength=len(self.centroids))
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def extend(self, vectors, codes=None):
+        """
+        New songs go into their closest EXISTING bucket (centroids are not retrained).
+        Recall slowly drifts as the catalog changes; compaction rebuilds from scratch.
+        """
+        if self.assignments is None:
+            # Indexes saved before 'assignments' existed: recover them from the lists
+            self.assignments = np.empty(len(self.list_ids), dtype=np.int32)
+            for l in range(len(self.centroids)):
+                self.assignments[self.list_ids[self.list_offsets[l]:self.list_offsets[l + 1]]] = l
+
+        new_rows = vectors[len(self.assignments):]
+        self.assignments = np.concatenate([self.assignments, self._assign(new_rows)])
+        self._build_lists()
+        return super().extend(vectors, codes)
+
+    def _kmeans(self, sample, n_lists, rng):
+        # Spherical k-means: the dot product is our similarity, so we cluster by it
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.n_iter):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+
+            # Empty buckets keep their old centroid
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        return centroids.astype(np.float32)
+
+    def search(self, queries, k, mask=None, n_probe=None, rerank=None):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        if mask is not None and np.count_nonzero(mask) <= len(self.list_ids) * n_probe / len(self.centroids):
+            # Fewer matching songs than the buckets would hold: the opened buckets
+            # could miss most of them, and scoring them all is cheaper anyway
+            return self._exact_search(queries, k, mask, rerank)
+        n_candidates = self._n_candidates(k, rerank)
+
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+
+        # Which buckets to open, for all queries at once
+        probes = top_k(queries @ self.centroids.T, n_probe)
+
+        for row, (query, lists) in enumerate(zip(queries, probes)):
+            candidates = np.concatenate([
+                self.list_ids[self.list_offsets[l]:self.list_offsets[l + 1]] for l in lists
+            ])
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+            if len(candidates) == 0:
+                continue
+            scores = self._scores(query[None, :], candidates)
+            best = top_k(scores, n_candidates)
+            best_scores, best_ids = np.take_along_axis(scores, best, axis=1), candidates[best]
+            if n_candidates > k:
+                best_scores, best_ids = self._rerank(query[None, :], best_ids, k)
+            best_scores, best_ids = best_scores[0], best_ids[0]
+            out_scores[row, :len(best_ids)] = best_scores
+            out_ids[row, :len(best_ids)] = best_ids
+
+        return out_scores, out_ids
+
+
+INDEX_TYPES = {
+    'flat': FlatIndex,
+    'ivf': IVFIndex,
+}
+
+
+def build_index(vectors, kind=None, quantization=None, **params):
+    """
+    Factory for the search index.
+    'auto' picks exact search for small catalogs and IVF for big ones.
+    quantization: 'none', 'float16' or 'int8' (see quantize.py)
+    Knobs not passed explicitly come from Config.
+    """
+    kind = kind or Config.SEMANTIC_INDEX
+    if kind == 'auto':
+        kind = 'ivf' if len(vectors) >= Config.ANN_AUTO_THRESHOLD else 'flat'
+
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}'. Choose from {list(INDEX_TYPES)}")
+
+    if len(vectors) == 0:
+        # Every song was removed: nothing to cluster or quantize, an empty exact index finds nothing
+        return FlatIndex().build(vectors)
+
+    if kind == 'ivf':
+        params = {'n_lists': Config.IVF_N_LISTS, 'n_probe': Config.IVF_N_PROBE, **params}
+
+    index = INDEX_TYPES[kind](**params).build(vectors)
+    return index.quantize(quantization or Config.EMBEDDING_QUANTIZATION)
+
+
+def recall_report(index, vectors, queries=None, k=10, n_queries=200, n_probes=(1, 2, 4, 8, 16, 32), seed=0):
+    """
+    How much accuracy do we trade for speed?
+    Compares the index against exact search and returns recall@k + latency.
+
+    If no queries are given we reuse random songs as queries
+    (realistic, since queries land in the same space as the songs).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if queries is None:
+        rng = np.random.default_rng(seed)
+        queries = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+
+    exact = FlatIndex().build(vectors)
+    start = time.perf_counter()
+    _, truth = exact.search(queries, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    settings = [{}]
+    if isinstance(index, IVFIndex):
+        settings = [{'n_probe': p} for p in n_probes if p <= len(index.centroids)]
+
+    report = []
+    for params in settings:
+        start = time.perf_counter()
+        _, found = index.search(queries, k, **params)
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        hits = sum(len(np.intersect1d(t, f[f >= 0])) for t, f in zip(truth, found))
+        report.append({
+            'index': index.kind,
+            'quantization': index.quantizer.kind if index.quantizer else 'none',
+            **params,
+            'recall@k': hits / truth.size,
+            'ms_per_query': ms,
+            'exact_ms_per_query': exact_ms,
+        })
+    return report
+
+
+def quantization_report(vectors, kinds=('none', 'float16', 'int8'), reranks=(0, 4), k=10, **kwargs):
+    """
+    Memory vs recall@k of exact search on compressed vectors.
+    'none' is the float32 baseline (recall 1.0 by definition).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    baseline = vectors.nbytes
+    report = []
+    for kind in kinds:
+        index = FlatIndex().build(vectors).quantize(kind)
+        for rerank in (reranks if kind != 'none' else (0,)):
+            index.rerank = rerank
+            row = recall_report(index, vectors, k=k, **kwargs)[0]
+            row.update(rerank=rerank, mb=index.nbytes() / 1e6, memory_saved=1 - index.nbytes() / baseline)
+            report.append(row)
+    return report
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+
+def normalize_names(values):
+    """'  Shape of   YOU ' -> 'shape of you' (vectorized over a whole column)"""
+    return (
+        pd.Series(values, dtype=object)
+        .fillna('')
+        .astype(str)
+        .str.lower()
+        .str.split()
+        .str.join(' ')
+    )
+
+
+def normalize_name(value):
+    return " ".join(str(value).lower().split())
+
+
+class SongLookup:
+    """
+    Hash Index over the catalog: Name / (Name, Artist) / Spotify ID -> row.
+
+    Why: Scanning + lowercasing the whole 'name' column on every request
+    costs more than the neighbour search itself on big catalogs.
+    We normalize everything ONCE at train time and answer lookups in O(1).
+    """
+
+    def __init__(self, data: pd.DataFrame):
+        names = normalize_names(data['name'].to_numpy()).to_numpy()
+        artists = normalize_names(data['artist'].to_numpy()).to_numpy()
+        rows = np.arange(len(data))
+
+        # Same title by different artists -> several rows (kept in catalog order)
+        self.by_name = {
+            name: group.astype(np.int64)
+            for name, group in pd.Series(rows).groupby(names, sort=False).indices.items()
+        }
+
+        # First occurrence wins for exact keys
+        self.by_name_artist = {}
+        for key, row in zip(zip(names, artists), rows):
+            self.by_name_artist.setdefault(key, int(row))
+
+        self.by_id = {}
+        if 'id' in data:
+            for spotify_id, row in zip(data['id'].to_numpy(), rows):
+                if isinstance(spotify_id, str) and spotify_id:
+                    self.by_id.setdefault(spotify_id, int(row))
+
+        # Sorted names for prefix search (autocomplete)
+        self.sorted_names = np.array(sorted(self.by_name), dtype=object)
+
+    def __getstate__(self):
+        """
+        Pickle as a few flat arrays instead of dicts of 100k+ tiny objects.
+        joblib (un)pickles dicts and object arrays entry by entry in pure Python,
+        which made saving the lookup slower than fitting the whole model.
+        Fixed-width string arrays are written as one raw block instead.
+        """
+        groups = list(self.by_name.values())
+        pairs = list(self.by_name_artist)
+        return {
+            'names': np.array(list(self.by_name), dtype=str),
+            'name_offsets': np.cumsum([0] + [len(g) for g in groups]),
+            'name_rows': np.concatenate(groups) if groups else np.empty(0, dtype=np.int64),
+            'pair_names': np.array([p[0] for p in pairs], dtype=str),
+            'pair_artists': np.array([p[1] for p in pairs], dtype=str),
+            'pair_rows': np.fromiter(self.by_name_artist.values(), dtype=np.int64, count=len(pairs)),
+            'ids': np.array(list(self.by_id), dtype=str),
+            'id_rows': np.fromiter(self.by_id.values(), dtype=np.int64, count=len(self.by_id)),
+            'sorted_names': np.array(self.sorted_names.tolist(), dtype=str)
+        }
+
+    def __setstate__(self, state):
+        if 'by_name' in state:
+            # Pickled before __getstate__ existed
+            self.__dict__.update(state)
+            return
+        rows, offsets = state['name_rows'], state['name_offsets']
+        self.by_name = {
+            name: rows[offsets[i]:offsets[i + 1]] for i, name in enumerate(state['names'].tolist())
+        }
+        self.by_name_artist = dict(zip(
+            zip(state['pair_names'].tolist(), state['pair_artists'].tolist()), state['pair_rows'].tolist()
+        ))
+        self.by_id = dict(zip(state['ids'].tolist(), state['id_rows'].tolist()))
+        self.sorted_names = state['sorted_names'].astype(object)
+
+    def extend(self, data: pd.DataFrame, offset):
+        """
+        Index songs appended to the catalog at rows offset, offset+1, ...
+        Existing entries win for exact keys (same as first occurrence in __init__).
+        """
+        names = normalize_names(data['name'].to_numpy()).to_numpy()
+        artists = normalize_names(data['artist'].to_numpy()).to_numpy()
+        rows = np.arange(offset, offset + len(data))
+        
+        new_names = []
+        for name, group in pd.Series(rows).groupby(names, sort=False).indices.items():
+            if name not in self.by_name:
+                new_names.append(name)
+                self.by_name[name] = rows[group].astype(np.int64)
+            else:
+                self.by_name[name] = np.concatenate([self.by_name[name], rows[group]])
+                
+        for key, row in zip(zip(names, artists), rows):
+            self.by_name_artist.setdefault(key, int(row))
+            
+        if 'id' in data:
+            for spotify_id, row in zip(data['id'].to_numpy(), rows):
+                if isinstance(spotify_id, str) and spotify_id:
+                    self.by_id.setdefault(spotify_id, int(row))
+                    
+        # Merge the new names into the sorted list (no full re-sort)
+        new_names = np.array(sorted(new_names), dtype=object)
+        positions = np.searchsorted(self.sorted_names, new_names)
+        self.sorted_names = np.insert(self.sorted_names, positions, new_names)
+        return self
+
+    def find(self, name, artist=None):
+        """
+        All rows matching a title. With an artist, at most one row.
+        Returns a list of row positions (empty if nothing matches).
+        """
+        name = normalize_name(name)
+        if artist is not None:
+            row = self.by_name_artist.get((name, normalize_name(artist)))
+            return [] if row is None else [row]
+        return self.by_name.get(name, np.empty(0, dtype=np.int64)).tolist()
+
+    def find_id(self, spotify_id):
+        return self.by_id.get(spotify_id)
+
+    def prefix(self, prefix, limit=10):
+        """Rows whose title starts with 'prefix', alphabetically, for autocomplete"""
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return []
+
+        start = np.searchsorted(self.sorted_names, prefix, side='left')
+        end = np.searchsorted(self.sorted_names, prefix + '\uffff', side='left')
+
+        rows = []
+        for name in self.sorted_names[start:end]:
+            rows.extend(self.by_name[name].tolist())
+            if len(rows) >= limit:
+                break
+        return rows[:limit]
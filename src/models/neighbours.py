@@ -0,0 +1,111 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src.models.topk import top_k
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Similarities computed per block and worker. Top-k selection needs
+# about 4x this on top (negated copy + int64 positions)
+BLOCK_BYTES = 32 * 1024 * 1024
+
+
+def unit_rows(features):
+    """Rows scaled to length 1, so cosine similarity = dot product (zero rows stay zero)"""
+    features = np.asarray(features, dtype=np.float32)
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.where(norms == 0, 1, norms)
+
+
+def _blocks(rows, n_columns):
+    """Split 'rows' into blocks whose (block x n_columns) float32 scores fit in BLOCK_BYTES"""
+    size = max(1, BLOCK_BYTES // (4 * max(n_columns, 1)))
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+
+def _run_blocks(fn, blocks, workers):
+    # NumPy releases the GIL inside the matrix product and selection,
+    # so threads use all cores without copying the matrix into processes
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(blocks) == 1:
+        return [fn(block) for block in blocks]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, blocks))
+
+
+def build_neighbour_table(features, k, workers=None):
+    """
+    Top-k most similar songs (cosine) for EVERY song, the song itself excluded.
+
+    Why: A song's neighbours only change when the model is retrained,
+    so we pay for the brute-force search once, offline, and recommend()
+    becomes a single array lookup.
+
+    Returns:
+        (ids, scores): (n, k) int32 and float32 arrays, best first
+    """
+    unit = unit_rows(features)
+    n = len(unit)
+    k = min(k, n - 1)
+    ids = np.empty((n, max(k, 0)), dtype=np.int32)
+    scores = np.empty((n, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return ids, scores
+
+    def fill(rows):
+        sims = unit[rows] @ unit.T
+        sims[np.arange(len(rows)), rows] = -np.inf  # Never recommend the seed itself
+        best = top_k(sims, k)
+        ids[rows] = best
+        scores[rows] = np.take_along_axis(sims, best, axis=1)
+
+    blocks = _blocks(np.arange(n), n)
+    logger.info(f"🧮 Precomputing {k} neighbours for {n} songs ({len(blocks)} blocks)...")
+    _run_blocks(fill, blocks, workers)
+    return ids, scores
+
+
+def extend_neighbour_table(features, ids, workers=None, changed=None):
+    """
+    Songs were appended after row len(ids) and/or the songs at rows 'changed'
+    got new vectors: update the table without redoing it all.
+    - new and changed songs: full search against the whole catalog
+    - songs that had a changed song as a neighbour: full search too
+      (it may have moved away, and we don't know who was next in line)
+    - every other song: merge its current neighbours with the new + changed songs
+    """
+    unit = unit_rows(features)
+    n, start, k = len(unit), len(ids), ids.shape[1]
+    changed = np.unique(np.asarray(changed if changed is not None else [], dtype=np.int64))
+    moved = np.concatenate([changed, np.arange(start, n)])
+
+    stale = np.zeros(start, dtype=bool)
+    stale[changed] = True
+    if len(changed):
+        is_changed = np.zeros(n, dtype=bool)
+        is_changed[changed] = True
+        stale |= is_changed[ids].any(axis=1)
+
+    merged_ids = np.empty((n, k), dtype=np.int32)
+    merged_scores = np.empty((n, k), dtype=np.float32)
+
+    def merge_old(rows):
+        candidates = np.concatenate([ids[rows], np.broadcast_to(moved, (len(rows), len(moved)))], axis=1)
+        # Re-score the current neighbours (older tables hold float16 scores, too coarse to merge against)
+        current = np.einsum('rd,rkd->rk', unit[rows], unit[ids[rows]])
+        sims = np.concatenate([current, unit[rows] @ unit[moved].T], axis=1)
+        best = top_k(sims, k)
+        merged_ids[rows] = np.take_along_axis(candidates, best, axis=1)
+        merged_scores[rows] = np.take_along_axis(sims, best, axis=1)
+
+    def search_new(rows):
+        sims = unit[rows] @ unit.T
+        sims[np.arange(len(rows)), rows] = -np.inf
+        best = top_k(sims, k)
+        merged_ids[rows] = best
+        merged_scores[rows] = np.take_along_axis(sims, best, axis=1)
+
+    _run_blocks(merge_old, _blocks(np.flatnonzero(~stale), k + len(moved)), workers)
+    _run_blocks(search_new, _blocks(np.concatenate([np.flatnonzero(stale), np.arange(start, n)]), n), workers)
+    return merged_ids, merged_scores
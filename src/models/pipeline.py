@@ -2,6 +2,7 @@ from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.impute import SimpleImputer
 from sklearn.compose import ColumnTransformer
+import numpy as np
 import pandas as pd
 from src.logger import get_logger
 
@@ -16,16 +17,18 @@ class MusicPipeline:
     new data is treated EXACTLY like training data.
     """
     
+    # The specific audio features we care about (The "DNA" of the song)
+    NUMERIC_FEATURES = [
+        'danceability', 'energy', 'valence', 'tempo', 
+        'acousticness', 'instrumentalness', 'popularity'
+    ]
+    
     @staticmethod
     def get_pipeline():
         """
         Returns a Scikit-Learn Pipeline for numeric feature engineering.
         """
-        # The specific audio features we care about (The "DNA" of the song)
-        numeric_features = [
-            'danceability', 'energy', 'valence', 'tempo', 
-            'acousticness', 'instrumentalness', 'popularity'
-        ]
+        numeric_features = MusicPipeline.NUMERIC_FEATURES
         
         # The Recipe:
         # 1. Imputer: If a value is missing (NaN), convert it to the Mean (Average).
@@ -43,3 +46,61 @@ class MusicPipeline:
             ])
             
         return preprocessor
+
+
+class FeatureStats:
+    """
+    Running mean / std of the SCALED feature vectors.
+    
+    Why: When we append songs with the frozen pipeline, the scaler keeps using
+    the averages it learned at training time. Right after a fit, every scaled
+    column has mean 0 and std 1. As the catalog grows, those numbers drift;
+    once they drift too far, the scaling is stale and we should refit.
+    
+    We only keep sums, so adding a batch is O(batch), never O(catalog).
+    """
+    
+    def __init__(self, n_features):
+        self.count = 0
+        self.sum = np.zeros(n_features)
+        self.sum_sq = np.zeros(n_features)
+        self.fit_mean = np.zeros(n_features)
+        self.fit_std = np.ones(n_features)
+        
+    @classmethod
+    def from_features(cls, features):
+        """Stats of a freshly fitted feature matrix (becomes the drift baseline)"""
+        stats = cls(features.shape[1])
+        stats.update(features)
+        stats.fit_mean, stats.fit_std = stats.mean, stats.std
+        return stats
+        
+    def update(self, features):
+        features = np.asarray(features, dtype=np.float64)
+        self.count += len(features)
+        self.sum += features.sum(axis=0)
+        self.sum_sq += np.square(features).sum(axis=0)
+        
+    def replace(self, old, new):
+        """Songs changed in place: swap their old vectors' contribution for the new ones"""
+        old = np.asarray(old, dtype=np.float64)
+        new = np.asarray(new, dtype=np.float64)
+        self.sum += new.sum(axis=0) - old.sum(axis=0)
+        self.sum_sq += np.square(new).sum(axis=0) - np.square(old).sum(axis=0)
+        
+    @property
+    def mean(self):
+        return self.sum / max(self.count, 1)
+        
+    @property
+    def std(self):
+        return np.sqrt(np.maximum(self.sum_sq / max(self.count, 1) - np.square(self.mean), 0))
+        
+    def drift(self):
+        """
+        Largest change of any column's mean or std since the fit,
+        in units of the training standard deviation.
+        """
+        shift = np.abs(self.mean - self.fit_mean)
+        spread = np.abs(self.std - self.fit_std)
+        return float(max(shift.max(), spread.max()))
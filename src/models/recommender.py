@@ -4,7 +4,12 @@ import joblib
 from sklearn.neighbors import NearestNeighbors
 from pathlib import Path
 from src.config import Config
-from src.models.pipeline import MusicPipeline
+from src.models.pipeline import MusicPipeline, FeatureStats
+from src.models.topk import top_k, SongColumns
+from src.models.lookup import SongLookup
+from src.models.neighbours import unit_rows, build_neighbour_table, extend_neighbour_table
+from src.models.artifacts import save_artifact, load_artifact, load_array, artifact_exists, update_artifact
+from src.metrics import metrics
 from src.logger import get_logger
 
 logger = get_logger(__name__)
@@ -18,17 +23,28 @@ class ContentBasedRecommender:
     We find the nearest points to recommend similar music.
     """
     
+    # Output key -> catalog column for every recommendation
+    RESULT_FIELDS = {'name': 'name', 'artist': 'artist', 'spotify_id': 'id'}
+    
     def __init__(self):
         self.model = NearestNeighbors(metric='cosine', algorithm='brute')
         self.pipeline = MusicPipeline.get_pipeline()
         self.data = None
         self.features_matrix = None
+        self.columns = None  # Columnar copy of self.data for fast result building
+        self.lookup = None   # Name / (Name, Artist) / ID -> row
+        self.stats = None    # Running feature stats (drift detection for appended songs)
+        self.watermark = None  # Track store watermark this model is up to date with
+        # Precomputed top-K neighbours of every song (None = always search live)
+        self.neighbour_ids = None
+        self.neighbour_scores = None
         
         # Where to save the "Brain" (Serialized Model)
-        self.model_path = Config.DATA_DIR / "models" / "recommender.pkl"
+        self.model_path = Config.MODELS_DIR / "recommender"
+        self.legacy_path = Config.MODELS_DIR / "recommender.pkl"  # Old single-pickle format
         self.model_path.parent.mkdir(parents=True, exist_ok=True)
 
-    def train(self, data: pd.DataFrame):
+    def train(self, data: pd.DataFrame, watermark=None):
         """
         Training the model.
         1. Learn the scaling (Fit Pipeline)
@@ -37,76 +53,303 @@ class ContentBasedRecommender:
         """
         logger.info("🧠 Training Recommender Model...")
         self.data = data.reset_index(drop=True)
+        self.columns = SongColumns(self.data)
+        self.lookup = SongLookup(self.data)
+        self.watermark = watermark
         
         # Transform: Raw Data -> Normalized Vectors
-        self.features_matrix = self.pipeline.fit_transform(self.data)
+        self.features_matrix = np.asarray(self.pipeline.fit_transform(self.data), dtype=np.float32)
+        self.stats = FeatureStats.from_features(self.features_matrix)
         
         # Fit: Create the spatial index
         self.model.fit(self.features_matrix)
         
+        # Offline: every song's neighbours, so recommend() is a lookup
+        self.neighbour_ids = self.neighbour_scores = None
+        if Config.NEIGHBOUR_K > 0:
+            self.neighbour_ids, self.neighbour_scores = build_neighbour_table(
+                self.features_matrix, Config.NEIGHBOUR_K, Config.NEIGHBOUR_WORKERS
+            )
+        
         # Save: Persistence
         self.save_model()
         logger.info("✅ Model Trained and Saved")
 
-    def recommend(self, song_name: str, n_recommendations=5):
+    def recommend(self, song_name: str, n_recommendations=5, artist: str = None):
         """
         The magic function.
         1. Find the song in our database.
         2. Get its vector.
         3. Ask model: "Who are the nearest neighbors?"
+        
+        Pass 'artist' when several songs share a title.
         """
         if self.data is None:
             self.load_model()
             
-        # Case insensitive search
-        song_idx = self.data.index[self.data['name'].str.lower() == song_name.lower()].tolist()
+        # Case insensitive O(1) lookup
+        song_idx = self.lookup.find(song_name, artist)
         
         if not song_idx:
             logger.warning(f"⚠️ Song not found: {song_name}")
             return []
+        if len(song_idx) > 1:
+            logger.info(f"ℹ️ '{song_name}' is ambiguous ({len(song_idx)} songs). Using the first; pass an artist to choose.")
+            
+        return self._recommend_row(song_idx[0], n_recommendations)
+
+    def recommend_by_id(self, spotify_id: str, n_recommendations=5):
+        """Same as recommend(), but the seed is an exact Spotify ID"""
+        if self.data is None:
+            self.load_model()
+            
+        song_idx = self.lookup.find_id(spotify_id)
+        if song_idx is None:
+            logger.warning(f"⚠️ Song not found: {spotify_id}")
+            return []
+            
+        return self._recommend_row(song_idx, n_recommendations)
+
+    def suggest(self, prefix: str, limit=10):
+        """Autocomplete: songs whose title starts with 'prefix'"""
+        if self.data is None:
+            self.load_model()
             
-        song_idx = song_idx[0]
+        rows = np.array(self.lookup.prefix(prefix, limit), dtype=np.int64)
+        return self.columns.gather(rows[None, :], None, fields=self.RESULT_FIELDS)[0]
+
+    def _recommend_row(self, song_idx, n_recommendations):
+        ids, scores = self.neighbour_rows([song_idx], n_recommendations)
+        return self.columns.gather(
+            ids, scores, fields=self.RESULT_FIELDS, score_key='similarity_score'
+        )[0]
+
+    @metrics.timer('recommender_stage_seconds', "Audio-feature recommender time per stage", stage='neighbours')
+    def neighbour_rows(self, song_rows, n_recommendations):
+        """
+        Nearest songs for several seed rows at once.
+        Returns (ids, similarity scores), both (len(song_rows), n), best first.
+        """
+        song_rows = np.asarray(song_rows, dtype=np.int64)
         
-        # Get the vector for this song
-        song_vector = self.features_matrix[song_idx].reshape(1, -1)
+        # Precomputed? Then it's just an array lookup
+        if self.neighbour_ids is not None and n_recommendations <= self.neighbour_ids.shape[1]:
+            return (
+                self.neighbour_ids[song_rows, :n_recommendations],
+                self.neighbour_scores[song_rows, :n_recommendations]
+            )
+            
+        # Asked for more than we precomputed: live search
+        # Get the vectors for these songs
+        song_vectors = np.asarray(self.features_matrix[song_rows]).reshape(len(song_rows), -1)
         
         # Find neighbors (distance, index)
-        distances, indices = self.model.kneighbors(song_vector, n_neighbors=n_recommendations+1)
-        
-        # Format results
-        recommendations = []
-        for i in range(1, len(indices[0])): # Skip 0 because it's the song itself
-            idx = indices[0][i]
-            dist = distances[0][i]
-            song = self.data.iloc[idx]
-            
-            recommendations.append({
-                'name': song['name'],
-                'artist': song['artist'],
-                'similarity_score': 1 - dist, # Convert distance to similarity %
-                'spotify_id': song.get('id', '')
-            })
-            
-        return recommendations
+        n_neighbors = min(n_recommendations + 1, len(self.data))
+        distances, indices = self.model.kneighbors(song_vectors, n_neighbors=n_neighbors)
+        
+        # Skip 0 because it's the song itself
+        # Convert distance to similarity %
+        return indices[:, 1:], 1 - distances[:, 1:]
+
+    def recommend_many(self, song_names, n_recommendations=5):
+        """
+        Batch version of recommend() for offline jobs.
+        All seed songs are scored against the catalog in ONE matrix product.
+        Songs we can't find get an empty list.
+        """
+        if self.data is None:
+            self.load_model()
+            
+        # Case insensitive lookup, first match wins (same as recommend)
+        seeds = [(self.lookup.find(name) or [-1])[0] for name in song_names]
+        found = np.array([s for s in seeds if s >= 0], dtype=np.int64)
+        
+        results = [[] for _ in song_names]
+        k = min(n_recommendations, len(self.data) - 1)
+        if len(found) == 0 or k <= 0:
+            return results
+        
+        if self.neighbour_ids is not None and k <= self.neighbour_ids.shape[1]:
+            # Precomputed: one fancy-index for all seeds
+            top = self.neighbour_ids[found, :k]
+            top_scores = self.neighbour_scores[found, :k]
+        else:
+            # Cosine similarity = dot product of unit vectors
+            unit = unit_rows(self.features_matrix)
+            sims = unit[found] @ unit.T
+            sims[np.arange(len(found)), found] = -np.inf  # Never recommend the seed itself
+            
+            # O(n) selection per row, then sort only the winners
+            top = top_k(sims, k)
+            top_scores = np.take_along_axis(sims, top, axis=1)
+            
+        found_results = iter(self.columns.gather(
+            top, top_scores, fields=self.RESULT_FIELDS, score_key='similarity_score'
+        ))
+        
+        for i, seed in enumerate(seeds):
+            if seed < 0:
+                logger.warning(f"⚠️ Song not found: {song_names[i]}")
+                continue
+            results[i] = next(found_results)
+            
+        return results
+
+    def add_tracks(self, data: pd.DataFrame):
+        """
+        Add new songs and apply changes to known ones WITHOUT retraining.
+        
+        New songs are scaled with the frozen pipeline (same recipe as training)
+        and appended to the feature matrix. Songs we already have (same Spotify
+        ID) are updates: their metadata is replaced and, if their features
+        changed, their rows are overwritten in place. Untouched vectors are
+        never rewritten.
+        
+        If the changes shift the feature distribution too much
+        (see FeatureStats.drift), we do a full refit instead.
+        Returns the number of songs added or updated.
+        """
+        if self.data is None:
+            self.load_model()
+            
+        data = data.reset_index(drop=True)
+        known = pd.DataFrame(columns=data.columns)
+        known_rows = np.empty(0, dtype=np.int64)
+        if 'id' in data:
+            data = data.drop_duplicates('id')
+            rows = np.array([self.lookup.by_id.get(song_id, -1) for song_id in data['id']], dtype=np.int64)
+            known, known_rows = data[rows >= 0].reset_index(drop=True), rows[rows >= 0]
+            data = data[rows < 0].reset_index(drop=True)
+        if len(data) == 0 and len(known) == 0:
+            logger.info("ℹ️ No new or changed songs")
+            if artifact_exists(self.model_path):
+                update_artifact(self.model_path, meta={'watermark': self.watermark})
+            return 0
+            
+        new_features = np.asarray(self.pipeline.transform(data), dtype=np.float32) if len(data) else None
+        
+        # Known songs: only those whose vector actually changed touch the matrix
+        changed_rows = np.empty(0, dtype=np.int64)
+        changed_features = None
+        if len(known):
+            known_features = np.asarray(self.pipeline.transform(known), dtype=np.float32)
+            old_features = np.asarray(self.features_matrix[known_rows], dtype=np.float32)
+            moved = np.any(known_features != old_features, axis=1)
+            changed_rows, changed_features = known_rows[moved], known_features[moved]
+            self.stats.replace(old_features[moved], changed_features)
+        if new_features is not None:
+            self.stats.update(new_features)
+            
+        # Metadata of known songs (popularity, names...) is always refreshed
+        catalog = self.data
+        if len(known):
+            catalog = self.data.copy()
+            for column in known.columns.intersection(catalog.columns):
+                catalog.loc[known_rows, column] = known[column].to_numpy()
+        
+        drift = self.stats.drift()
+        if drift > Config.RECOMMENDER_DRIFT_THRESHOLD:
+            logger.info(f"📈 Feature drift {drift:.2f} > {Config.RECOMMENDER_DRIFT_THRESHOLD}. Full refit...")
+            self.train(pd.concat([catalog, data], ignore_index=True), watermark=self.watermark)
+            return len(data) + len(known)
+            
+        offset = len(catalog)
+        renamed = len(known) and not (
+            self.data.loc[known_rows, ['name', 'artist']].to_numpy() == known[['name', 'artist']].to_numpy()
+        ).all()
+        self.data = pd.concat([catalog, data], ignore_index=True) if len(data) else catalog
+        self.columns = SongColumns(self.data)
+        if renamed:
+            self.lookup = SongLookup(self.data)  # Rare: rebuild instead of patching every key
+        elif len(data):
+            self.lookup.extend(data, offset)
+        
+        all_features = np.asarray(self.features_matrix, dtype=np.float32)
+        if len(changed_rows):
+            all_features = all_features.copy()
+            all_features[changed_rows] = changed_features
+        if new_features is not None:
+            all_features = np.concatenate([all_features, new_features])
+        if self.neighbour_ids is not None and (len(data) or len(changed_rows)):
+            # Old songs may have a new closest neighbour; new / changed songs need a full search
+            self.neighbour_ids, self.neighbour_scores = extend_neighbour_table(
+                all_features, self.neighbour_ids, Config.NEIGHBOUR_WORKERS, changed=changed_rows
+            )
+        
+        if artifact_exists(self.model_path):
+            # In place: only the new and changed rows are written
+            update_artifact(
+                self.model_path,
+                append={'features': new_features} if new_features is not None else None,
+                overwrite={'features': (changed_rows, changed_features)} if len(changed_rows) else None,
+                replace=self._neighbour_arrays(),
+                data=self.data,
+                objects={'pipeline': self.pipeline, 'lookup': self.lookup, 'stats': self.stats},
+                meta={'watermark': self.watermark}
+            )
+            self.features_matrix = load_array(self.model_path, 'features')
+        else:
+            self.features_matrix = all_features
+            self.save_model()
+            
+        # Brute-force neighbours just keep a reference to the matrix: instant
+        self.model.fit(self.features_matrix)
+        logger.info(
+            f"➕ Added {len(data)} songs, updated {len(known)} ({len(changed_rows)} with new features), drift {drift:.2f}"
+        )
+        return len(data) + len(known)
 
     def save_model(self):
-        """Save the fitted model and data to disk"""
-        state = {
-            'pipeline': self.pipeline,
-            'model': self.model,
-            'data': self.data,
-            'features': self.features_matrix
-        }
-        joblib.dump(state, self.model_path)
+        """
+        Save the fitted model and data to disk as a memory-mappable artifact.
+        The NearestNeighbors model is NOT pickled: with algorithm='brute' it is
+        just a reference to features_matrix, so we re-fit it (instantly) on load.
+        """
+        save_artifact(
+            self.model_path,
+            arrays={'features': np.asarray(self.features_matrix, dtype=np.float32), **self._neighbour_arrays()},
+            data=self.data,
+            objects={'pipeline': self.pipeline, 'lookup': self.lookup, 'stats': self.stats},
+            meta={'metric': self.model.metric, 'watermark': self.watermark}
+        )
+        
+    def _neighbour_arrays(self):
+        if self.neighbour_ids is None:
+            return {}
+        return {'neighbour_ids': self.neighbour_ids, 'neighbour_scores': self.neighbour_scores}
         
+    @metrics.timer('model_load_seconds', model='recommender')
     def load_model(self):
         """Load the model from disk"""
-        if not self.model_path.exists():
+        if not artifact_exists(self.model_path) and not self.legacy_path.exists():
             raise FileNotFoundError("Brain not found! Run training first.")
             
         logger.info("loading model from disk...")
-        state = joblib.load(self.model_path)
-        self.pipeline = state['pipeline']
-        self.model = state['model']
-        self.data = state['data']
-        self.features_matrix = state['features']
+        if artifact_exists(self.model_path):
+            arrays, self.data, objects, manifest = load_artifact(self.model_path)
+            self.pipeline = objects['pipeline']
+            self.lookup = objects.get('lookup')
+            self.stats = objects.get('stats')
+            self.watermark = manifest['meta'].get('watermark')
+            self.features_matrix = arrays['features']  # Memory-mapped, shared between workers
+            self.neighbour_ids = arrays.get('neighbour_ids')
+            self.neighbour_scores = arrays.get('neighbour_scores')
+            if self.neighbour_scores is not None and self.neighbour_scores.dtype != np.float32:
+                # Older artifacts stored float16 scores: serve the same precision as the live path
+                logger.warning("⚠️ Neighbour scores are float16 (older model). Re-run train_model.py to store float32.")
+                self.neighbour_scores = self.neighbour_scores.astype(np.float32)
+            self.model.fit(self.features_matrix)
+        else:
+            logger.warning(f"⚠️ Loading legacy pickle {self.legacy_path}. Re-run train_model.py to upgrade.")
+            state = joblib.load(self.legacy_path)
+            self.pipeline = state['pipeline']
+            self.model = state['model']
+            self.data = state['data']
+            self.features_matrix = state['features']
+            self.lookup = state.get('lookup')
+            
+        self.columns = SongColumns(self.data)
+        # Older models were saved before the lookup index / feature stats existed
+        self.lookup = self.lookup or SongLookup(self.data)
+        if self.stats is None:
+            self.stats = FeatureStats.from_features(np.asarray(self.features_matrix))
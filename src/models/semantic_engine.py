@@ -3,7 +3,19 @@ import numpy as np
 import pandas as pd
 from src.logger import get_logger
 from src.config import Config
+from src.metrics import metrics
+from src.cache import TTLCache
+from src.models.index import build_index
+from src.models.topk import SongColumns
+from src.models.filters import MetadataIndex
+from src.models.neighbours import unit_rows
+from src.models.artifacts import save_artifact, load_artifact, load_array, artifact_exists, artifact_version, read_manifest, update_artifact
+import hashlib
 import joblib
+import json
+import math
+import os
+import shutil
 
 logger = get_logger(__name__)
 
@@ -18,80 +30,502 @@ class SemanticEngine:
         self.model_name = 'all-MiniLM-L6-v2'
         self.encoder = None
         self.song_embeddings = None
+        self.index = None
         self.data = None
-        self.save_path = Config.DATA_DIR / "models" / "semantic_index.pkl"
+        self.columns = None  # Columnar copy of self.data for fast result building
+        self.metadata = None  # Bitmap index over language / region / tags for filtered search
+        self.hashes = None   # Content hash of every song's description (skip unchanged songs)
+        self.deleted = None  # Tombstones: removed songs stay in the matrix until compaction
+        self.watermark = None  # Track store watermark this index is up to date with
+        self.version = None    # Changes whenever the catalog/index changes (cache invalidation)
+        self.save_path = Config.MODELS_DIR / "semantic_index"
+        self.legacy_path = Config.MODELS_DIR / "semantic_index.pkl"  # Old single-pickle format
+        
+        # Users repeat the same prompts a lot, so remember their vectors
+        self.query_cache = TTLCache(Config.EMBEDDING_CACHE_SIZE, Config.EMBEDDING_CACHE_TTL)
         
     def load_model(self):
         """Load the massive Deep Learning model into memory"""
         if self.encoder is None:
             logger.info(f"🤖 Loading Deep Learning Model: {self.model_name}...")
-            self.encoder = SentenceTransformer(self.model_name)
+            with metrics.timer('model_load_seconds', "Time to load a model / index from disk", model='semantic_encoder'):
+                self.encoder = SentenceTransformer(self.model_name)
             logger.info("✅ Model Loaded!")
 
-    def train(self, data: pd.DataFrame):
+    def warm_up(self):
+        """
+        Run one throwaway inference so the first real user doesn't pay
+        for lazy initialisation (kernels, tokenizer, memory pools).
+        Bypasses the query cache on purpose.
+        """
+        self.load_model()
+        vector = self.encode(["warm up"])
+        if self.index is not None:
+            self.index.search(vector, 1)
+
+    def train(self, data: pd.DataFrame, watermark=None):
         """
         'Training' here means encoding all our songs into vectors.
         We combine Name + Artist + Search Tags to create a 'Description'.
         """
         self.load_model()
         self.data = data.reset_index(drop=True)
+        self.columns = SongColumns(self.data)
+        self.metadata = MetadataIndex(self.data)
         
         # Create a rich description for each song
         # "Shape of You by Ed Sheeran [Pop, Happy]"
-        descriptions = self.data.apply(
-            lambda x: f"{x['name']} by {x['artist']} {x.get('search_tag', '')}", 
-            axis=1
-        ).tolist()
+        descriptions = self.describe(self.data)
+        self.hashes = self.content_hashes(descriptions)
+        self.deleted = np.zeros(len(self.data), dtype=bool)
+        self.watermark = watermark
         
         logger.info(f"🧠 Encoding {len(descriptions)} songs. This involves heavy math...")
-        self.song_embeddings = self.encoder.encode(descriptions, show_progress_bar=True)
+        build_path = self.save_path.with_name(self.save_path.name + ".build")
+        self.song_embeddings = self.encode_to_file(descriptions, build_path)
+        self.index = build_index(self.song_embeddings)
         
         self.save()
+        # The artifact holds the vectors now: serve them from there and drop the build files
+        self._load_embeddings(load_array(self.save_path, 'embeddings'))
+        codes = load_array(self.save_path, 'codes') if self.index.quantizer is not None else None
+        self.index.attach(self.song_embeddings, codes)
+        shutil.rmtree(build_path, ignore_errors=True)
         logger.info("✅ Semantic Index Built!")
 
-    def search(self, query: str, top_k=5):
+    def encode_to_file(self, descriptions, build_path, chunk_size=None, workers=None):
+        """
+        Encode descriptions chunk by chunk, straight into an on-disk .npy matrix.
+        
+        Why: One encode() call over the whole catalog keeps every vector (and
+        the Transformer's batches) in RAM until save(), and a crash near the
+        end throws hours of work away. Here only one chunk is in memory at a
+        time, and 'progress.json' records the finished chunks, so running
+        train() again on the same catalog resumes where it stopped.
+        Each chunk is spread over a pool of encoder processes (all cores).
+        
+        Returns: (n, d) float32 matrix of unit vectors (memory-mapped)
+        """
+        chunk_size = chunk_size or Config.ENCODE_CHUNK_SIZE
+        workers = workers or Config.ENCODE_WORKERS or os.cpu_count() or 1
+        matrix_path, progress_path = build_path / "embeddings.npy", build_path / "progress.json"
+        n_chunks = math.ceil(len(descriptions) / chunk_size)
+        
+        # A build only resumes for exactly the same job (catalog, model, chunking)
+        job = {
+            'model_name': self.model_name,
+            'rows': len(descriptions),
+            'chunk_size': chunk_size,
+            'catalog': hashlib.sha1(self.content_hashes(descriptions).tobytes()).hexdigest()
+        }
+        done = []
+        if progress_path.exists() and matrix_path.exists():
+            progress = json.loads(progress_path.read_text())
+            if progress['job'] == job:
+                done = progress['done']
+                logger.info(f"⏩ Resuming semantic build: {len(done)}/{n_chunks} chunks already encoded")
+        if not done:
+            shutil.rmtree(build_path, ignore_errors=True)
+            build_path.mkdir(parents=True)
+        
+        todo = [c for c in range(n_chunks) if c not in set(done)]
+        pool = None
+        if workers > 1 and len(descriptions) > chunk_size and todo:
+            pool = self.encoder.start_multi_process_pool(['cpu'] * workers)
+        try:
+            matrix = np.load(matrix_path, mmap_mode='r+') if done else None
+            for c in todo:
+                texts = descriptions[c * chunk_size:(c + 1) * chunk_size]
+                if pool is not None:
+                    vectors = unit_rows(self.encoder.encode_multi_process(texts, pool))
+                else:
+                    vectors = self.encode(texts)
+                if matrix is None:
+                    # Width comes from the first chunk
+                    matrix = np.lib.format.open_memmap(
+                        matrix_path, mode='w+', dtype=np.float32, shape=(len(descriptions), vectors.shape[1])
+                    )
+                matrix[c * chunk_size:c * chunk_size + len(texts)] = vectors
+                matrix.flush()
+                
+                # Mark the chunk done only once its vectors are on disk
+                done.append(c)
+                tmp = progress_path.with_suffix('.tmp')
+                tmp.write_text(json.dumps({'job': job, 'done': done}))
+                os.replace(tmp, progress_path)
+                logger.info(f"🧠 Encoded chunk {len(done)}/{n_chunks} ({len(texts)} songs)")
+        finally:
+            if pool is not None:
+                self.encoder.stop_multi_process_pool(pool)
+                
+        return np.load(matrix_path, mmap_mode='r')
+
+    def encode(self, texts, **kwargs):
+        """
+        Texts -> (n, d) matrix of UNIT vectors (C-order float32).
+        
+        Why: With length-1 vectors the dot product IS the cosine similarity,
+        so scoring is one plain matrix product (BLAS GEMM) and a long
+        description can't win just because its vector is longer.
+        """
+        vectors = self.encoder.encode(texts, normalize_embeddings=True, **kwargs)
+        # Re-normalize anyway: cheap, and scores stay cosine even for an encoder that ignores the flag
+        return unit_rows(vectors)
+
+    @staticmethod
+    def describe(data: pd.DataFrame):
+        """
+        One 'Description' string per song (this is what gets encoded).
+        Whole-column string ops: apply(axis=1) builds a pandas Series for every song.
+        """
+        tags = data['search_tag'].astype(str) if 'search_tag' in data else ''
+        return (data['name'].astype(str) + " by " + data['artist'].astype(str) + " " + tags).tolist()
+
+    @staticmethod
+    def content_hashes(descriptions):
+        """SHA-1 of each description. Same hash = same vector, no need to re-encode."""
+        return np.array(
+            [hashlib.sha1(d.encode('utf-8')).hexdigest() for d in descriptions],
+            dtype='S40'
+        )
+
+    @staticmethod
+    def normalize_query(query: str):
+        """'  Sad   Heartbreak ' and 'sad heartbreak' are the same question"""
+        return " ".join(query.lower().split())
+
+    def encode_query(self, query: str):
+        """
+        Query -> Vector, with a cache in front of the Transformer.
+        """
+        return self.encode_queries([query])[0]
+
+    def encode_queries(self, queries):
+        """
+        Many queries -> (n, d) matrix.
+        Cached queries skip the Transformer; the rest go through it in ONE batch.
+        """
+        keys = [self.normalize_query(q) for q in queries]
+        vectors = [self.query_cache.get(k) for k in keys]
+        
+        missing = list(dict.fromkeys(k for k, v in zip(keys, vectors) if v is None))
+        if missing:
+            with metrics.timer('semantic_stage_seconds', "Semantic search time per stage", stage='encode'):
+                fresh = dict(zip(missing, self.encode(missing)))
+            for k, v in fresh.items():
+                self.query_cache.put(k, v)
+            vectors = [fresh[k] if v is None else v for k, v in zip(keys, vectors)]
+            
+        return np.vstack(vectors)
+
+    def search(self, query: str, top_k=5, filters=None):
         """
         Deep Learning Search.
         1. Convert user query "sad heartbreak" to numbers.
-        2. Find songs with similar meaning numbers.
+        2. Ask the index for songs with similar meaning numbers.
+        
+        filters: e.g. {'tags': ['mood:sad']} (see MetadataIndex.mask)
+        """
+        if self.song_embeddings is None:
+            self.load_from_disk()
+            
+        # Encode user query (cached)
+        query_vector = self.encode_query(query)
+        return self.search_vectors(query_vector[None, :], top_k, filters)[0]
+
+    def search_many(self, queries, top_k=5, filters=None):
+        """
+        Batch version of search() for offline jobs (playlists, nightly precompute).
+        One Transformer batch + one matrix-matrix product for all queries.
         """
         if self.song_embeddings is None:
             self.load_from_disk()
             
-        # Encode user query
-        query_vector = self.encoder.encode([query])[0]
+        return self.search_vectors(self.encode_queries(queries), top_k, filters)
+
+    def search_vectors(self, query_vectors, top_k=5, filters=None):
+        """
+        Score a (n, d) matrix of query vectors in one pass.
+        Returns one result list per query.
+        """
+        scores, top_indices = self.search_rows(query_vectors, top_k, filters)
         
+        # Gather whole columns at once instead of one pandas row per hit
+        # (-1 = the ANN index found fewer than top_k candidates, skipped)
+        with metrics.timer('semantic_stage_seconds', stage='format'):
+            return self.columns.gather(
+                top_indices, scores,
+                fields={'name': 'name', 'artist': 'artist', 'tags': 'search_tag', 'spotify_id': 'id'}
+            )
+
+    def search_rows(self, query_vectors, top_k=5, filters=None, mask=None):
+        """
+        Like search_vectors(), but returns raw (scores, catalog rows), both (n, top_k).
+        mask: a filter_mask() the caller already computed (instead of 'filters')
+        """
         # Calculate Cosine Similarity (Dot product for normalized vectors)
-        # We use numpy for fast matrix math
-        # Scores = dot(query, all_songs)
-        scores = np.dot(self.song_embeddings, query_vector)
-        
-        # Get top K indices
-        top_indices = np.argsort(scores)[::-1][:top_k]
-        
-        results = []
-        for idx in top_indices:
-            song = self.data.iloc[idx]
-            results.append({
-                'name': song['name'],
-                'artist': song['artist'],
-                'score': float(scores[idx]),
-                'tags': song.get('search_tag', '')
-            })
-            
-        return results
+        # Songs are unit vectors since training; queries are re-normalized here
+        # (cheap, and covers vectors from an older query cache file)
+        query_vectors = unit_rows(np.atleast_2d(query_vectors))
+        
+        # The index decides whether to score every song (flat) or only nearby buckets (ivf)
+        # Filtered-out and removed songs are never scored
+        if mask is None:
+            with metrics.timer('semantic_stage_seconds', stage='filter'):
+                mask = self.filter_mask(filters)
+        with metrics.timer('semantic_stage_seconds', stage='search'):
+            return self.index.search(query_vectors, top_k, mask=mask)
+
+    def filter_mask(self, filters=None):
+        """
+        Boolean mask of songs a search may return (metadata filters AND not removed).
+        None = every song.
+        """
+        mask = self.metadata.mask(**filters) if filters else None
+        if self.deleted is not None and self.deleted.any():
+            mask = ~self.deleted if mask is None else mask & ~self.deleted
+        return mask
 
     def save(self):
-        joblib.dump({
-            'embeddings': self.song_embeddings,
-            'data': self.data
-        }, self.save_path)
+        """
+        Save as a memory-mappable artifact (see src/models/artifacts.py).
+        The embedding matrix is a raw .npy file, so every worker shares one copy.
+        """
+        manifest = save_artifact(
+            self.save_path,
+            arrays={
+                'embeddings': self.song_embeddings.astype(Config.EMBEDDING_STORAGE_DTYPE, copy=False),
+                'hashes': self.hashes,
+                'deleted': self.deleted,
+                # Quantized copy the index scores on (memory-mapped like the embeddings)
+                **({'codes': self.index.codes} if self.index.codes is not None else {})
+            },
+            data=self.data,
+            objects={'index': self.index},
+            meta={
+                'model_name': self.model_name,
+                'index': self.index.kind,
+                'quantization': self.index.quantizer.kind if self.index.quantizer else 'none',
+                'dim': int(self.song_embeddings.shape[1]),
+                'normalized': True,
+                'watermark': self.watermark
+            }
+        )
+        self.version = artifact_version(manifest)
 
-    def load_from_disk(self):
-        if not self.save_path.exists():
+    @metrics.timer('model_load_seconds', model='semantic_index')
+    def load_from_disk(self, load_encoder=True):
+        """
+        load_encoder=False loads only the index + catalog (plain arrays), e.g. in a
+        server parent process before it forks; call load_model() in each worker.
+        """
+        if not artifact_exists(self.save_path) and not self.legacy_path.exists():
             raise FileNotFoundError("Run training first!")
             
-        self.load_model()
-        saved = joblib.load(self.save_path)
-        self.song_embeddings = saved['embeddings']
-        self.data = saved['data']
+        if load_encoder:
+            self.load_model()
+        if Config.EMBEDDING_CACHE_PATH:
+            warmed = self.query_cache.load(Config.EMBEDDING_CACHE_PATH)
+            logger.info(f"🔥 Query cache warmed with {warmed} entries")
+            
+        arrays = {}
+        if artifact_exists(self.save_path):
+            arrays, self.data, objects, manifest = load_artifact(self.save_path)
+            index = objects.get('index')
+            self.watermark = manifest['meta'].get('watermark')
+            self.version = artifact_version(manifest)
+            self._load_embeddings(arrays['embeddings'])
+            normalized = manifest['meta'].get('normalized', False)
+        else:
+            logger.warning(f"⚠️ Loading legacy pickle {self.legacy_path}. Re-run train_semantic.py to upgrade.")
+            saved = joblib.load(self.legacy_path)
+            self.song_embeddings = saved['embeddings']
+            self.data = saved['data']
+            index = saved.get('index')
+            normalized = False
+            self.version = f"legacy-{self.legacy_path.stat().st_mtime_ns:x}"
+            
+        if not normalized:
+            # Older indexes stored raw vectors: scores weren't true cosine similarities
+            logger.warning("⚠️ Semantic index has unnormalized vectors. Normalizing in memory; re-run train_semantic.py.")
+            self.song_embeddings = unit_rows(self.song_embeddings)
+            index = None  # Centroids / quantization were learned on the raw vectors
+            
+        if len(self.data) != len(self.song_embeddings):
+            raise ValueError(f"Semantic index is inconsistent ({len(self.data)} songs, {len(self.song_embeddings)} vectors). Re-run train_semantic.py")
+            
+        self.columns = SongColumns(self.data)
+        self.metadata = MetadataIndex(self.data)
+        
+        # Older artifacts have no hashes / tombstones yet
+        self.hashes = np.asarray(arrays['hashes']) if 'hashes' in arrays else self.content_hashes(self.describe(self.data))
+        self.deleted = np.array(arrays['deleted']) if 'deleted' in arrays else np.zeros(len(self.data), dtype=bool)
+        
+        codes = arrays.get('codes')
+        if codes is not None and len(codes) != len(self.song_embeddings):
+            codes = None  # Re-encoded from the embeddings in attach()
+            
+        # Older artifacts were saved before we had an index
+        if index is None:
+            self.index = build_index(self.song_embeddings)
+        elif index.kind == 'ivf' and len(index.list_ids) < len(self.song_embeddings):
+            # An update crashed after appending vectors but before saving the index
+            indexed = len(index.list_ids)
+            self.index = index.attach(self.song_embeddings[:indexed]).extend(self.song_embeddings)
+        else:
+            self.index = index.attach(self.song_embeddings, codes)
+
+    def _load_embeddings(self, embeddings):
+        # Zero-copy: a float32 artifact stays memory-mapped.
+        # float16 artifacts are upcast once here for scoring.
+        self.song_embeddings = embeddings
+        if self.song_embeddings.dtype != np.float32:
+            self.song_embeddings = self.song_embeddings.astype(np.float32)
+
+    # --- Incremental Updates (no full re-encode) ---
+
+    def add_songs(self, df: pd.DataFrame):
+        """
+        Encode and append songs we don't have yet (matched on Spotify 'id').
+        Songs already in the index are skipped; use update_songs() to change them.
+        """
+        return self._upsert(df, update_existing=False)
+
+    def update_songs(self, df: pd.DataFrame):
+        """
+        Upsert: new songs are added, changed songs are re-encoded,
+        and songs whose description hash didn't change are skipped entirely.
+        """
+        return self._upsert(df, update_existing=True)
+
+    def remove_songs(self, ids):
+        """Tombstone songs by Spotify id. They disappear from search immediately."""
+        self._ensure_loaded()
+        live = self._live_rows_by_id()
+        rows = [live[i] for i in dict.fromkeys(ids) if i in live]
+        self._apply_changes(self.data.iloc[0:0], tombstones=rows)
+        logger.info(f"🗑️ Removed {len(rows)} songs")
+        return len(rows)
+
+    def compact(self):
+        """
+        Drop tombstoned songs for good and rewrite the artifact from scratch.
+        Also rebuilds the index (IVF buckets get re-learned on the current catalog).
+        Nothing is re-encoded.
+        """
+        self._ensure_loaded()
+        keep = ~self.deleted
+        logger.info(f"🧹 Compacting semantic index: dropping {int(self.deleted.sum())} removed songs")
+        
+        self.song_embeddings = np.ascontiguousarray(self.song_embeddings[keep], dtype=np.float32)
+        self.data = self.data[keep].reset_index(drop=True)
+        self.hashes = self.hashes[keep]
+        self.deleted = np.zeros(len(self.data), dtype=bool)
+        self.columns = SongColumns(self.data)
+        self.metadata = MetadataIndex(self.data)
+        self.index = build_index(self.song_embeddings)
+        self.save()
+
+    def _ensure_loaded(self):
+        if self.song_embeddings is None:
+            self.load_from_disk()
+
+    def _live_rows_by_id(self):
+        ids = self.data['id'].to_numpy()
+        rows = np.flatnonzero(~self.deleted)
+        return dict(zip(ids[rows], rows.tolist()))
+
+    def _upsert(self, df, update_existing):
+        self._ensure_loaded()
+        df = df.reset_index(drop=True)
+        hashes = self.content_hashes(self.describe(df))
+        live = self._live_rows_by_id()
+        
+        new_rows, tombstones, seen = [], [], set()
+        for i, (song_id, new_hash) in enumerate(zip(df['id'], hashes)):
+            if song_id in seen:
+                continue  # First one wins (like drop_duplicates)
+            seen.add(song_id)
+            
+            row = live.get(song_id)
+            if row is None:
+                new_rows.append(i)
+            elif update_existing and self.hashes[row] != new_hash:
+                new_rows.append(i)
+                tombstones.append(row)
+                
+        self._apply_changes(df.iloc[new_rows], tombstones)
+        logger.info(
+            f"🔁 Semantic index: {len(new_rows) - len(tombstones)} added, {len(tombstones)} re-encoded, "
+            f"{len(seen) - len(new_rows)} unchanged (skipped)"
+        )
+        return len(new_rows)
+
+    def _apply_changes(self, new_data, tombstones):
+        """Encode + append new rows, tombstone old rows, persist, maybe compact"""
+        if len(new_data) == 0 and not tombstones:
+            if artifact_exists(self.save_path):
+                update_artifact(self.save_path, meta={'watermark': self.watermark})
+            return
+            
+        descriptions = self.describe(new_data) if len(new_data) else []
+        new_hashes = self.content_hashes(descriptions)
+        dim = self.song_embeddings.shape[1]
+        if descriptions:
+            self.load_model()
+            new_vectors = self.encode(descriptions)
+        else:
+            new_vectors = np.empty((0, dim), dtype=np.float32)
+        
+        self.deleted[tombstones] = True
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(new_data), dtype=bool)])
+        self.hashes = np.concatenate([self.hashes, new_hashes])
+        self.data = pd.concat([self.data, new_data], ignore_index=True)
+        self.columns = SongColumns(self.data)
+        self.metadata = MetadataIndex(self.data)
+        
+        # An index over zero songs has no buckets / quantizer to extend: build a real one
+        was_empty = len(self.index) == 0
+        # Only append to an artifact that stores the same (unit) vectors we have in memory
+        in_place = (
+            not was_empty and artifact_exists(self.save_path)
+            and read_manifest(self.save_path)['meta'].get('normalized', False)
+        )
+        if in_place:
+            # Append in place: existing vectors are never rewritten
+            append = {'embeddings': new_vectors.astype(Config.EMBEDDING_STORAGE_DTYPE), 'hashes': new_hashes}
+            if self.index.quantizer is not None:
+                append['codes'] = self.index.quantizer.encode(new_vectors)
+            replace = {'deleted': self.deleted}
+            if 'hashes' not in read_manifest(self.save_path)['arrays']:
+                replace['hashes'] = self.hashes  # Artifact from before hashes existed
+                del append['hashes']
+            update_artifact(
+                self.save_path,
+                append=append,
+                replace=replace,
+                data=self.data,
+                meta={'watermark': self.watermark}
+            )
+            self._load_embeddings(load_array(self.save_path, 'embeddings'))
+            codes = load_array(self.save_path, 'codes') if self.index.quantizer is not None else None
+        else:
+            self.song_embeddings = np.concatenate([self.song_embeddings, new_vectors])
+            codes = None
+            
+        if was_empty:
+            self.index = build_index(self.song_embeddings)
+        else:
+            self.index.extend(self.song_embeddings, codes)
+        
+        if self.deleted.any() and self.deleted.mean() > Config.COMPACT_TOMBSTONE_RATIO:
+            self.compact()
+        elif in_place:
+            self.version = artifact_version(update_artifact(self.save_path, objects={'index': self.index}))
+        else:
+            self.save()
+
+    def save_query_cache(self):
+        """Write the query cache to disk for the next warm start (if configured)"""
+        if Config.EMBEDDING_CACHE_PATH:
+            self.query_cache.save(Config.EMBEDDING_CACHE_PATH)
@@ -0,0 +1,117 @@
+import numpy as np
+
+
+def top_k(scores, k):
+    """
+    Indices of the k highest scores, best first.
+
+    Why not np.argsort? Sorting the whole catalog is O(n log n) just to keep k rows.
+    np.argpartition selects the k winners in O(n); we then sort only those k.
+
+    Args:
+        scores: (n,) vector or (m, n) matrix (one row per query)
+        k: how many to keep
+    Returns:
+        (k,) or (m, k) integer array
+    """
+    scores = np.asarray(scores)
+    if scores.ndim == 1:
+        return top_k(scores[None, :], k)[0]
+
+    n = scores.shape[1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape)
+
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1)
+
+
+class PackedStrings:
+    """
+    A column of strings stored as two flat arrays: UTF-8 bytes + row offsets.
+
+    Why: An object array holds one Python str per song, and every read
+    bumps that str's reference count, i.e. WRITES to its memory page.
+    In forked server workers that slowly copies the whole column into
+    every process (copy-on-write). Flat byte buffers are only ever read,
+    so all workers keep sharing the parent's pages. Also ~3x smaller.
+    """
+
+    def __init__(self, values):
+        encoded = [('' if v is None or v != v else str(v)).encode('utf-8') for v in values]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=self.offsets[1:])
+        self.buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, rows):
+        """Positions (any shape) -> object array of str with the same shape"""
+        rows = np.asarray(rows)
+        starts, ends = self.offsets[rows].ravel().tolist(), self.offsets[rows + 1].ravel().tolist()
+        out = np.empty(len(starts), dtype=object)
+        out[:] = [self.buffer[s:e].tobytes().decode('utf-8') for s, e in zip(starts, ends)]
+        return out[0] if rows.ndim == 0 else out.reshape(rows.shape)
+
+    def tolist(self):
+        raw = self.buffer.tobytes()
+        bounds = self.offsets.tolist()
+        return [raw[s:e].decode('utf-8') for s, e in zip(bounds[:-1], bounds[1:])]
+
+
+class SongColumns:
+    """
+    Columnar view of the song catalog for building results.
+
+    Why: self.data.iloc[idx] builds a whole pandas Series per hit.
+    We pull the few columns we need out as NumPy arrays ONCE,
+    then fancy-index them with all hit positions at the same time.
+    """
+
+    COLUMNS = ('name', 'artist', 'id', 'search_tag')
+
+    def __init__(self, data):
+        self.columns = {}
+        for col in self.COLUMNS:
+            values = data[col].tolist() if col in data else [''] * len(data)
+            self.columns[col] = PackedStrings(values)
+
+    def __len__(self):
+        return len(self.columns['name'])
+
+    def gather(self, rows, scores, fields, score_key='score'):
+        """
+        Turn (m, k) hit positions + scores into m lists of result dicts.
+
+        Args:
+            rows: (m, k) positions into the catalog. -1 = empty slot (skipped)
+            scores: (m, k) scores matching 'rows', or None for no score
+            fields: {output key: catalog column}, e.g. {'tags': 'search_tag'}
+            score_key: output key for the score
+        """
+        rows = np.atleast_2d(rows)
+        valid = rows >= 0
+        if not valid.any():
+            return [[] for _ in range(len(rows))]  # Also covers an empty catalog (no row 0 to stand in)
+        safe = np.where(valid, rows, 0)
+
+        keys = list(fields)
+        values = [self.columns[col][safe] for col in fields.values()]
+        if scores is not None:
+            keys.append(score_key)
+            values.append(np.atleast_2d(scores).astype(np.float64))
+
+        results = []
+        for i in range(len(rows)):
+            picked = np.flatnonzero(valid[i])
+            row_values = [v[i, picked].tolist() for v in values]
+            results.append([dict(zip(keys, hit)) for hit in zip(*row_values)])
+        return results
@@ -0,0 +1,115 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from src.models.filters import filter_key
+from src.metrics import metrics
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class QueryBatcher:
+    """
+    Request Coalescing (Micro-Batching).
+
+    Why: The Transformer is much faster on 1 batch of 16 queries than on
+    16 separate queries, and it must never run on the event loop.
+
+    How:
+    1. Each request drops its query in a queue and awaits a Future.
+    2. A background task grabs the first query, then keeps collecting
+       until 'max_batch_size' queries or 'max_wait_ms' have passed.
+    3. The whole batch is encoded + scored in one call on a worker thread.
+
+    Knobs:
+        max_batch_size: Bigger = more throughput under load.
+        max_wait_ms: Longer = fuller batches, but every request waits up to this long.
+    """
+
+    def __init__(self, engine, max_batch_size=32, max_wait_ms=5.0, executor=None):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # One worker: batches are already parallel inside BLAS/torch
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-batcher")
+        self._queue = None
+        self._worker = None
+        self.batch_sizes = metrics.histogram(
+            'query_batch_size', "Queries per micro-batch", buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+        )
+
+    def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def search(self, query: str, top_k=5, filters=None):
+        """Drop-in async replacement for engine.search()"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, top_k, filters, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _search_batch(self, queries, top_k, filters=None):
+        """
+        One Transformer batch for every query; then one index search per
+        distinct set of filters (a search call takes a single mask).
+        """
+        vectors = self.engine.encode_queries(queries)
+        filters = filters or [None] * len(queries)
+
+        groups = {}
+        for i, f in enumerate(filters):
+            groups.setdefault(filter_key(f), []).append(i)
+
+        results = [None] * len(queries)
+        for rows in groups.values():
+            found = self.engine.search_vectors(vectors[rows], top_k, filters[rows[0]])
+            for i, result in zip(rows, found):
+                results[i] = result
+        return results
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            queries = [query for query, _, _, _ in batch]
+            filters = [f for _, _, f, _ in batch]
+            top_k = max(k for _, k, _, _ in batch)
+            self.batch_sizes.observe(len(batch))
+
+            try:
+                results = await loop.run_in_executor(self.executor, self._search_batch, queries, top_k, filters)
+            except Exception as e:
+                logger.error(f"❌ Batch search failed ({len(batch)} queries): {e}")
+                for _, _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, k, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result[:k])
@@ -0,0 +1,66 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class PoolFull(Exception):
+    """Too many jobs waiting: the caller should back off and retry (HTTP 429)"""
+
+
+class InferencePool:
+    """
+    Bounded worker pool for blocking model calls (TensorFlow, OpenCV).
+
+    Why: An 'async def' endpoint that calls the model directly freezes the
+    event loop, so one slow image stalls every other request. The pool
+    runs that work on its own threads. TensorFlow and OpenCV release the
+    GIL, and threads share the one loaded model (a process pool would need
+    a copy of it per process).
+
+    Backpressure: at most 'max_pending' jobs may be queued or running.
+    Past that, run() raises PoolFull right away instead of letting the
+    queue (and every caller's latency) grow without limit.
+    """
+
+    def __init__(self, workers=2, max_pending=16, name="inference"):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self.name = name
+        self.pending = 0  # Only touched on the event loop thread
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on a worker thread. Raises PoolFull if the queue is full."""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PoolFull(f"{self.name} pool is full ({self.pending} jobs)")
+
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        # Run in a copy of our context so the job's log records keep the request id
+        future = self.executor.submit(contextvars.copy_context().run, fn, *args)
+        # Released when the job really finishes, even if the caller gave up waiting
+        future.add_done_callback(lambda _: self._release(loop))
+        return await asyncio.wrap_future(future)
+
+    def _release(self, loop):
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self._decrement)
+
+    def _decrement(self):
+        self.pending -= 1
+
+    def snapshot(self):
+        return {
+            'workers': self.workers,
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'rejected': self.rejected
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,81 @@
+import threading
+import time
+from contextlib import contextmanager
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+PENDING = "pending"
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+class Readiness:
+    """
+    Tracks the load state of every AI engine.
+
+    Why: Loading the Transformer + TensorFlow takes many seconds.
+    The server should answer health checks while that happens, and the
+    orchestrator should only route traffic to pods that are fully warmed.
+
+    States: pending -> loading -> warming -> ready (or failed)
+
+    Optional engines back only some endpoints (e.g. emotion -> /detect-emotion).
+    We still wait for them to finish loading, but if one fails the pod is
+    'degraded', not unready: otherwise one broken model keeps every
+    endpoint out of rotation forever.
+    """
+
+    def __init__(self, engines, optional=()):
+        self._lock = threading.Lock()
+        self.optional = set(optional)
+        self._engines = {
+            name: {'state': PENDING, 'load_seconds': None, 'error': None}
+            for name in [*engines, *optional]
+        }
+
+    def set_state(self, name, state):
+        with self._lock:
+            self._engines[name]['state'] = state
+
+    @contextmanager
+    def loading(self, name):
+        """
+        with readiness.loading("semantic"):
+            ... load + warm up ...
+        Marks the engine ready (with its load time) or failed.
+        """
+        start = time.perf_counter()
+        self.set_state(name, LOADING)
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                self._engines[name].update(state=FAILED, error=str(e), load_seconds=time.perf_counter() - start)
+            logger.error(f"❌ Engine '{name}' failed to load: {e}")
+            raise
+        else:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._engines[name].update(state=READY, load_seconds=elapsed)
+            logger.info(f"✅ Engine '{name}' ready in {elapsed:.1f}s")
+
+    def is_ready(self, name=None):
+        with self._lock:
+            if name is not None:
+                return self._engines[name]['state'] == READY
+            return all(
+                e['state'] == READY or (e['state'] == FAILED and name in self.optional)
+                for name, e in self._engines.items()
+            )
+
+    def degraded(self):
+        """Optional engines that failed to load (their endpoints answer 503)"""
+        with self._lock:
+            return sorted(name for name in self.optional if self._engines[name]['state'] == FAILED)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(status) for name, status in self._engines.items()}
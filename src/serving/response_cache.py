@@ -0,0 +1,99 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ResponseCache:
+    """
+    Full-Response Cache: normalized request -> rendered JSON bytes + ETag.
+
+    Why: The same prompts come in over and over, and each one pays for
+    the index search, Spotify covers, 30 track dicts with URL building and
+    JSON encoding. A hit skips all of it and returns the stored bytes.
+
+    Rules:
+    1. Bounded by BYTES (responses differ a lot in size), LRU eviction.
+    2. Entries expire after 'ttl' seconds (covers / links can change).
+    3. Every entry belongs to one index version. When the version changes
+       (songs added/removed, index rebuilt) the whole cache is dropped.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl  # None = never expires
+        self.version = None
+        self._entries = OrderedDict()  # key -> (stored_at, body, etag)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def etag(body):
+        """Strong ETag: same bytes, same tag (in every worker and after restarts)"""
+        return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._entries:
+                logger.info(f"♻️ Index changed ({self.version} -> {version}): dropping {len(self._entries)} cached responses")
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self.version = version
+
+    def get(self, key, version):
+        """(body, etag) or None"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None or (self.ttl is not None and time.time() - entry[0] > self.ttl):
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, version, body):
+        """Store a rendered response. Returns its ETag."""
+        etag = self.etag(body)
+        with self._lock:
+            if version != self.version or len(body) > self.max_bytes:
+                return etag  # Computed on an index that changed meanwhile (or too big)
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.time(), body, etag)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+        return etag
+
+    def _drop(self, key):
+        _, body, _ = self._entries.pop(key)
+        self._bytes -= len(body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'version': self.version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'invalidations': self.invalidations
+        }
@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# Run from anywhere: make 'src' / 'server' importable
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Config.validate() needs credentials at import time; tests never call Spotify
+os.environ.setdefault("SPOTIFY_CLIENT_ID", "test")
+os.environ.setdefault("SPOTIFY_CLIENT_SECRET", "test")
@@ -0,0 +1,29 @@
+import zlib
+import numpy as np
+import pandas as pd
+
+
+class RawEncoder:
+    """Deterministic fake Transformer that ignores normalize_embeddings: vectors of very different lengths"""
+
+    def __init__(self):
+        self.encoded = 0  # Texts encoded so far
+
+    def encode(self, texts, **kwargs):
+        self.encoded += len(texts)
+        vectors = []
+        for text in texts:
+            rng = np.random.default_rng(zlib.crc32(text.encode('utf-8')))
+            vectors.append(rng.standard_normal(32) * rng.uniform(0.2, 5.0))
+        return np.array(vectors, dtype=np.float32)
+
+
+def catalog(n=300, start=0):
+    """Songs start .. start + n - 1 (the same song always gets the same row values)"""
+    tags = ['genre:pop', 'genre:rock', 'mood:sad']
+    return pd.DataFrame({
+        'name': [f"Song {i}" for i in range(start, start + n)],
+        'artist': [f"Artist {i % 17}" for i in range(start, start + n)],
+        'id': [str(i) for i in range(start, start + n)],
+        'search_tag': [tags[i % 3] for i in range(start, start + n)]
+    })
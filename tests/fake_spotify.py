@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeSpotify:
+    """
+    A tiny local stand-in for the Spotify token + Web API endpoints.
+
+    Knows every track id that starts with 'known'. Records what it was asked
+    so tests can check batching, token reuse and how many calls overlap.
+
+        with FakeSpotify() as server:
+            Config.SPOTIFY_API_URL = server.api_url
+            Config.SPOTIFY_TOKEN_URL = server.token_url
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay           # Seconds each API call takes (so calls overlap)
+        self.rate_limited = 0        # Answer this many API calls with 429 first
+        self.token_requests = 0
+        self.requests = []           # (path, query) of every API call
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    @property
+    def api_url(self):
+        return self.url + "/v1/"
+
+    @property
+    def token_url(self):
+        return self.url + "/api/token"
+
+    def calls(self, endpoint):
+        return [query for path, query in self.requests if path.strip('/') == f"v1/{endpoint}"]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
+
+    @staticmethod
+    def track(track_id):
+        return {
+            'id': track_id,
+            'name': f"Song {track_id}",
+            'artists': [{'name': "Artist"}],
+            'album': {'name': "Album", 'images': [{'url': "big.jpg"}, {'url': "medium.jpg"}]},
+            'popularity': 50,
+            'preview_url': None
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, headers=None):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with fake._lock:
+                    fake.token_requests += 1
+                self._send(200, {'access_token': "fake-token", 'token_type': "Bearer", 'expires_in': 3600})
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query)
+                with fake._lock:
+                    fake.requests.append((parsed.path, query))
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                    limited = fake.rate_limited > 0
+                    fake.rate_limited -= limited
+                try:
+                    time.sleep(fake.delay)
+                    if limited:
+                        self._send(429, {'error': {'status': 429, 'message': "API rate limit exceeded"}},
+                                   headers={'Retry-After': '0'})
+                    elif parsed.path.strip('/') == 'v1/tracks':
+                        ids = query['ids'][0].split(',')
+                        tracks = [fake.track(i) if i.startswith('known') else None for i in ids]
+                        self._send(200, {'tracks': tracks})
+                    else:
+                        self._send(404, {'error': {'status': 404, 'message': "Not found"}})
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+        return Handler
@@ -0,0 +1,95 @@
+import pytest
+from fastapi.testclient import TestClient
+from fake_encoder import RawEncoder, catalog
+from src.config import Config
+from src.data.spotify_client import Lookup
+from src.models.semantic_engine import SemanticEngine
+from src.serving.batcher import QueryBatcher
+from src.serving.readiness import Readiness
+from src.serving.response_cache import ResponseCache
+from server import api
+
+
+class FakeCovers:
+    """Spotify handler stand-in: art for every id, or (failing=True) a lookup where every batch errored"""
+
+    def __init__(self, failing=False):
+        self.failing = failing
+
+    def get_cover_art(self, ids):
+        if self.failing:
+            return Lookup(failed=ids)
+        return Lookup({track_id: f"https://covers/{track_id}.jpg" for track_id in ids})
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'SEMANTIC_INDEX', 'flat')
+    monkeypatch.setattr(Config, 'EMBEDDING_QUANTIZATION', 'none')
+    monkeypatch.setattr(Config, 'EMBEDDING_CACHE_PATH', None)
+    monkeypatch.setattr(Config, 'ENCODE_WORKERS', 1)
+    monkeypatch.setattr(Config, 'SPOTIFY_COVER_ART', True)
+
+    engine = SemanticEngine()
+    engine.save_path = tmp_path / "semantic_index"
+    engine.encoder = RawEncoder()
+    engine.train(catalog(50))
+
+    monkeypatch.setattr(api, 'semantic_engine', engine)
+    monkeypatch.setattr(api, 'query_batcher', QueryBatcher(engine))
+    monkeypatch.setattr(api, 'response_cache', ResponseCache())
+    monkeypatch.setattr(api, 'get_spotify_handler', lambda: FakeCovers())
+    # Engines are set up above: skip loading the real models
+    monkeypatch.setattr(api.app.router, 'on_startup', [])
+    monkeypatch.setattr(api.app.router, 'on_shutdown', [])
+    with TestClient(api.app) as client:
+        yield client
+
+
+def test_get_recommend_without_emotion(client):
+    response = client.get("/recommend", params={'query': "song"})
+
+    assert response.status_code == 200
+    assert len(response.json()['tracks']) == 30
+    assert response.headers['etag']
+
+
+def test_failed_cover_lookup_is_not_cached(client, monkeypatch):
+    monkeypatch.setattr(api, 'get_spotify_handler', lambda: FakeCovers(failing=True))
+    response = client.post("/recommend", json={'query': "song"})
+
+    assert response.status_code == 200
+    assert response.headers['cache-control'] == "no-store"
+    assert 'etag' not in response.headers
+    assert all("picsum.photos" in track['cover'] for track in response.json()['tracks'])
+    assert api.response_cache.stats()['size'] == 0
+
+    # Spotify is back: real art, and now it's worth caching
+    monkeypatch.setattr(api, 'get_spotify_handler', lambda: FakeCovers())
+    response = client.post("/recommend", json={'query': "song"})
+
+    assert all(track['cover'].startswith("https://covers/") for track in response.json()['tracks'])
+    assert response.headers['etag']
+    assert api.response_cache.stats()['size'] == 1
+
+
+def test_readyz_survives_a_failed_emotion_model(client, monkeypatch):
+    readiness = Readiness(["recommender", "semantic"], optional=["emotion"])
+    for name in ["recommender", "semantic"]:
+        with readiness.loading(name):
+            pass
+    with pytest.raises(RuntimeError), readiness.loading("emotion"):
+        raise RuntimeError("no weights")
+    monkeypatch.setattr(api, 'readiness', readiness)
+    response = client.get("/readyz")
+
+    assert response.status_code == 200
+    assert response.json()['degraded'] == ["emotion"]
+    assert client.get("/recommend", params={'query': "song"}).status_code == 200
+
+
+@pytest.mark.parametrize("limit", [0, -1, 51])
+def test_suggest_limit_out_of_range_is_rejected(client, limit):
+    response = client.get("/songs/suggest", params={'q': "so", 'limit': limit})
+
+    assert response.status_code == 422
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.models import artifacts
+from src.models.artifacts import (
+    MANIFEST_FILE, save_artifact, load_artifact, load_array, append_rows, update_artifact, artifact_version
+)
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    directory = tmp_path / "model"
+    save_artifact(
+        directory,
+        arrays={'vectors': np.arange(12, dtype=np.float32).reshape(4, 3), 'flags': np.zeros(4, dtype=bool)},
+        data=pd.DataFrame({'id': list("abcd")}),
+        objects={'answer': 42},
+        meta={'watermark': 1.0}
+    )
+    return directory
+
+
+def test_save_and_load_round_trip(artifact):
+    arrays, data, objects, manifest = load_artifact(artifact)
+
+    np.testing.assert_array_equal(arrays['vectors'], np.arange(12).reshape(4, 3))
+    assert isinstance(arrays['vectors'], np.memmap)
+    assert data['id'].tolist() == list("abcd")
+    assert objects == {'answer': 42}
+    assert manifest['meta'] == {'watermark': 1.0}
+
+
+def test_append_rows_grows_the_file_in_place(artifact):
+    path = artifact / "vectors.npy"
+    expected = np.load(path)
+    for i in range(50):  # Many appends: the row count outgrows its original digits
+        rows = np.full((3, 3), i, dtype=np.float32)
+        assert append_rows(path, rows) == (len(expected) + 3, 3)
+        expected = np.concatenate([expected, rows])
+
+    np.testing.assert_array_equal(np.load(path, mmap_mode='r'), expected)
+
+
+def test_append_rows_rejects_a_different_width(artifact):
+    with pytest.raises(ValueError):
+        append_rows(artifact / "vectors.npy", np.zeros((2, 5), dtype=np.float32))
+
+
+def test_append_after_a_crashed_append(artifact):
+    path = artifact / "vectors.npy"
+    with open(path, 'ab') as f:
+        f.write(b"\x00" * 7)  # Rows written, header never patched
+    np.testing.assert_array_equal(np.load(path), np.arange(12).reshape(4, 3))
+
+    append_rows(path, np.ones((1, 3), dtype=np.float32))
+
+    np.testing.assert_array_equal(np.load(path)[-1], [1, 1, 1])
+    assert np.load(path).shape == (5, 3)
+
+
+def test_update_artifact_round_trip(artifact):
+    before = artifact_version(load_artifact(artifact)[3])
+    reader = load_array(artifact, 'vectors')  # A worker's existing memory map
+
+    manifest = update_artifact(
+        artifact,
+        append={'vectors': np.full((2, 3), 7, dtype=np.float32)},
+        overwrite={'vectors': ([1], np.full((1, 3), -1, dtype=np.float32))},
+        replace={'flags': np.array([True, False, False, True, False, False])},
+        data=pd.DataFrame({'id': list("abcdef")}),
+        objects={'answer': 43},
+        meta={'watermark': 2.0}
+    )
+    arrays, data, objects, loaded = load_artifact(artifact)
+
+    assert arrays['vectors'].shape == (6, 3) and manifest['arrays']['vectors']['shape'] == [6, 3]
+    np.testing.assert_array_equal(arrays['vectors'][1], [-1, -1, -1])
+    np.testing.assert_array_equal(arrays['vectors'][4:], 7)
+    np.testing.assert_array_equal(reader[1], [-1, -1, -1])  # Overwrites are visible to open maps
+    assert arrays['flags'].tolist() == [True, False, False, True, False, False]
+    assert data['id'].tolist() == list("abcdef") and loaded['rows'] == 6
+    assert objects == {'answer': 43}
+    assert loaded['meta'] == {'watermark': 2.0}
+    assert artifact_version(loaded) != before
+
+
+def crash_before_manifest(monkeypatch):
+    """Every file of the update gets written, then the process dies before the manifest swap"""
+    real = artifacts._replace_file
+
+    def replace_file(path, write):
+        if path.name == MANIFEST_FILE:
+            raise KeyboardInterrupt("killed")
+        return real(path, write)
+    monkeypatch.setattr(artifacts, '_replace_file', replace_file)
+
+
+def test_crashed_update_leaves_the_previous_version(artifact, monkeypatch):
+    with monkeypatch.context() as patch:
+        crash_before_manifest(patch)
+        with pytest.raises(KeyboardInterrupt):
+            update_artifact(
+                artifact,
+                append={'vectors': np.full((2, 3), 7, dtype=np.float32)},
+                replace={'flags': np.ones(6, dtype=bool)},
+                data=pd.DataFrame({'id': list("abcdef")}),
+                objects={'answer': 43}
+            )
+
+    arrays, data, objects, _ = load_artifact(artifact)
+    assert len(arrays['vectors']) == len(arrays['flags']) == len(data) == 4
+    assert objects == {'answer': 42}
+
+    # The retry appends over the orphaned rows
+    update_artifact(artifact, append={'vectors': np.full((1, 3), 9, dtype=np.float32)}, data=pd.DataFrame({'id': list("abcde")}))
+    arrays, data, _, _ = load_artifact(artifact)
+    assert len(arrays['vectors']) == len(data) == 5
+    np.testing.assert_array_equal(np.load(artifact / "vectors.npy")[4], [9, 9, 9])
+    assert np.load(artifact / "vectors.npy").shape == (5, 3)
+
+
+def test_superseded_files_are_cleaned_up(artifact):
+    for i in range(3):
+        update_artifact(artifact, replace={'flags': np.zeros(4, dtype=bool)}, data=pd.DataFrame({'id': list("abcd")}))
+
+    files = sorted(path.name for path in artifact.iterdir())
+    # The current files + the previous generation (a reader may still be loading it)
+    assert files == sorted([
+        "manifest.json", "vectors.npy", "objects.joblib",
+        "flags.2.npy", "flags.3.npy", "data.2.parquet", "data.3.parquet"
+    ])
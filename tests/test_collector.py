@@ -0,0 +1,66 @@
+import pytest
+from src.config import Config
+from src.data import collector
+from src.data.track_store import TrackStore
+
+
+class BlockedHandler:
+    """Search works, audio features are blocked (403), one result is malformed"""
+
+    def ensure_token(self):
+        pass
+
+    def search_tracks(self, query, offset):
+        items = [
+            {'id': f"song{i}", 'name': f"Song {i}", 'artists': [{'name': "Artist"}], 'popularity': 10}
+            for i in range(5)
+        ]
+        return items + [{'id': "broken", 'name': "No artist", 'artists': [], 'popularity': 1}]
+
+    def fetch_audio_features(self, track_ids, max_workers=None):
+        return {}
+
+
+@pytest.fixture
+def store_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'TRACK_STORE_PATH', tmp_path / "tracks.db")
+    monkeypatch.setattr(Config, 'RAW_DATA_PATH', tmp_path / "songs_raw.csv")
+    monkeypatch.setattr(Config, 'TRACK_STALE_AFTER', 0.0)  # Every run refreshes every song
+    monkeypatch.setattr(collector, 'SpotifyHandler', BlockedHandler)
+    return tmp_path / "tracks.db"
+
+
+def crawl():
+    collector.run_pipeline(queries=["mood:happy"], pages_per_query=1, restart=True)
+    store = TrackStore()
+    try:
+        return store.read().set_index('id'), store.watermark()
+    finally:
+        store.close()
+
+
+def test_refresh_keeps_stored_synthetic_features(store_path):
+    first, first_watermark = crawl()
+    second, second_watermark = crawl()
+
+    assert first['is_synthetic'].all()
+    assert second[['danceability', 'energy', 'valence', 'tempo']].equals(first[['danceability', 'energy', 'valence', 'tempo']])
+    assert second_watermark == first_watermark  # Nothing changed: nothing to retrain
+
+
+def test_malformed_tracks_are_counted(store_path, caplog):
+    songs, _ = crawl()
+
+    assert len(songs) == 5
+    assert "Skipped 1 malformed tracks" in caplog.text
+
+
+def test_tracks_record_the_language_and_region_of_their_query(store_path):
+    collector.run_pipeline(queries=["genre:k-pop year:2020-2025"], pages_per_query=1)
+    collector.run_pipeline(queries=["workout"], pages_per_query=1, restart=True)  # Says nothing about language
+    store = TrackStore()
+    songs = store.read()
+    store.close()
+
+    assert (songs['language'] == "Korean").all()
+    assert (songs['region'] == "South Korea").all()
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from src.models.filters import MetadataIndex, request_filters
+
+
+def catalog(synthetic):
+    return pd.DataFrame({
+        'name': ["a", "b", "c", "d"],
+        'search_tag': ["genre:k-pop", "bollywood", "workout", "genre:k-pop"],
+        'language': ["Korean", "Hindi", None, "Korean"],
+        'region': [None, None, None, None],
+        'is_synthetic': synthetic,
+    })
+
+
+def test_ui_labels_filter_on_catalog_values():
+    index = MetadataIndex(catalog([True, False, True, False]))
+    filters, unsupported = request_filters(index, language="Korean (K-Pop)", region="Global")
+
+    assert unsupported == {}
+    assert np.flatnonzero(index.mask(**filters)).tolist() == [0, 3]
+
+
+def test_columns_without_values_are_unsupported():
+    index = MetadataIndex(catalog([True, False, True, False]))
+    filters, unsupported = request_filters(index, language="Hindi", region="India")
+
+    assert filters == {'language': "hindi"}
+    assert unsupported == {'region': "India"}
+
+
+def test_include_synthetic_false_is_applied_when_real_songs_exist():
+    index = MetadataIndex(catalog([True, False, True, False]))
+    filters, _ = request_filters(index, include_synthetic=False)
+
+    assert np.flatnonzero(index.mask(**filters)).tolist() == [1, 3]
+
+
+def test_include_synthetic_false_is_ignored_when_every_song_is_synthetic(caplog):
+    index = MetadataIndex(catalog([True] * 4))
+    filters, unsupported = request_filters(index, include_synthetic=False)
+
+    assert filters == {}
+    assert unsupported == {'is_synthetic': False}
+    assert "Every song has synthetic features" in caplog.text
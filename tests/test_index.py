@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from src.models.index import build_index
+
+
+@pytest.fixture(params=['flat', 'ivf'])
+def index(request):
+    vectors = np.random.default_rng(0).normal(size=(20, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    params = {'n_lists': 4, 'n_probe': 4} if request.param == 'ivf' else {}
+    return build_index(vectors, kind=request.param, quantization='none', **params)
+
+
+def queries():
+    return np.random.default_rng(1).normal(size=(3, 8)).astype(np.float32)
+
+
+def test_k_larger_than_catalog_is_padded(index):
+    scores, ids = index.search(queries(), 25)
+
+    assert scores.shape == ids.shape == (3, 25)
+    assert (ids[:, :20] >= 0).all()
+    assert (ids[:, 20:] == -1).all() and np.isneginf(scores[:, 20:]).all()
+
+
+@pytest.mark.parametrize('allowed', [2, 15])  # Subset scan and full scan + mask
+def test_mask_with_fewer_songs_than_k_is_padded(index, allowed):
+    mask = np.zeros(20, dtype=bool)
+    mask[:allowed] = True
+    scores, ids = index.search(queries(), 18, mask=mask)
+
+    assert scores.shape == ids.shape == (3, 18)
+    assert set(ids[ids >= 0].tolist()) <= set(range(allowed))
+    assert ((ids == -1) == np.isneginf(scores)).all()
@@ -0,0 +1,51 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+import pytest
+from src.logger import RateLimitFilter
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def record(name, level=logging.INFO):
+    return logging.LogRecord(name, level, __file__, 1, "msg", None, None)
+
+
+def test_rate_limit_drops_chatty_records_and_counts_them():
+    limiter = RateLimitFilter({'src.models.emotion': 2})
+
+    passed = [limiter.filter(record('src.models.emotion')) for _ in range(5)]
+
+    assert passed == [True, True, False, False, False]
+    assert limiter.filter(record('src.models.emotion', logging.WARNING))  # Warnings always pass
+    assert limiter.filter(record('src.models.recommender'))               # Not limited
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs os.fork")
+def test_forked_child_gets_its_own_listener():
+    # The listener thread doesn't survive fork(): without the restart, the child's records stay queued forever
+    script = textwrap.dedent("""
+        import os
+        from src.logger import get_logger, shutdown_logging
+        logger = get_logger("forktest")
+        logger.info("parent before fork")
+        pid = os.fork()
+        if pid == 0:
+            logger.info("from child")
+            shutdown_logging()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        logger.info("parent after fork")
+    """)
+    env = dict(os.environ, PYTHONPATH=str(ROOT), LOG_FORMAT='json', LOG_LEVEL='INFO')
+    env.setdefault('SPOTIFY_CLIENT_ID', 'test')
+    env.setdefault('SPOTIFY_CLIENT_SECRET', 'test')
+    result = subprocess.run([sys.executable, "-c", script], env=env, cwd=ROOT, capture_output=True, text=True, timeout=60)
+
+    messages = [json.loads(line)['msg'] for line in result.stdout.splitlines() if line.startswith('{')]
+    assert result.returncode == 0, result.stderr
+    assert {"parent before fork", "from child", "parent after fork"} <= set(messages)
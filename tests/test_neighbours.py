@@ -0,0 +1,26 @@
+import numpy as np
+from src.models.neighbours import build_neighbour_table, extend_neighbour_table
+
+
+def reference(features, k):
+    unit = features / np.linalg.norm(features, axis=1, keepdims=True)
+    sims = unit @ unit.T
+    np.fill_diagonal(sims, -np.inf)
+    return np.sort(sims, axis=1)[:, ::-1][:, :k]
+
+
+def test_table_scores_are_float32_precise():
+    features = np.random.default_rng(0).normal(size=(300, 6))
+    ids, scores = build_neighbour_table(features, 10, workers=1)
+
+    assert scores.dtype == np.float32
+    np.testing.assert_allclose(scores, reference(features, 10), atol=1e-6)
+
+
+def test_extended_table_scores_are_float32_precise():
+    features = np.random.default_rng(1).normal(size=(300, 6))
+    ids, _ = build_neighbour_table(features[:250], 10, workers=1)
+    ids, scores = extend_neighbour_table(features, ids, workers=1, changed=[3, 40])
+
+    assert scores.dtype == np.float32
+    np.testing.assert_allclose(scores, reference(features, 10), atol=1e-6)
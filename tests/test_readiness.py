@@ -0,0 +1,41 @@
+import pytest
+from src.serving.readiness import Readiness, FAILED
+
+
+def load(readiness, name, fail=False):
+    try:
+        with readiness.loading(name):
+            if fail:
+                raise RuntimeError("no weights")
+    except RuntimeError:
+        pass
+
+
+def test_ready_once_every_engine_is_loaded():
+    readiness = Readiness(["recommender", "semantic"], optional=["emotion"])
+    load(readiness, "recommender")
+    load(readiness, "semantic")
+
+    assert not readiness.is_ready()  # Still waiting for emotion to finish
+    load(readiness, "emotion")
+    assert readiness.is_ready() and readiness.degraded() == []
+
+
+def test_failed_optional_engine_is_degraded_not_unready():
+    readiness = Readiness(["recommender", "semantic"], optional=["emotion"])
+    load(readiness, "recommender")
+    load(readiness, "semantic")
+    load(readiness, "emotion", fail=True)
+
+    assert readiness.is_ready()
+    assert readiness.degraded() == ["emotion"]
+    assert readiness.snapshot()["emotion"]["state"] == FAILED
+
+
+@pytest.mark.parametrize("engine", ["recommender", "semantic"])
+def test_failed_required_engine_is_unready(engine):
+    readiness = Readiness(["recommender", "semantic"], optional=["emotion"])
+    for name in ["recommender", "semantic", "emotion"]:
+        load(readiness, name, fail=name == engine)
+
+    assert not readiness.is_ready()
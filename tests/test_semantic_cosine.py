@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from fake_encoder import RawEncoder, catalog
+from src.config import Config
+from src.models.semantic_engine import SemanticEngine
+
+
+def reference_cosine(queries, songs):
+    """cos(q, v) = q.v / (|q| |v|), float64"""
+    q, v = queries.astype(np.float64), songs.astype(np.float64)
+    return (q @ v.T) / np.outer(np.linalg.norm(q, axis=1), np.linalg.norm(v, axis=1))
+
+
+@pytest.fixture(params=['flat', 'ivf'])
+def engine(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'SEMANTIC_INDEX', request.param)
+    # Probe every list, so IVF must agree with exact search too
+    monkeypatch.setattr(Config, 'IVF_N_LISTS', 4)
+    monkeypatch.setattr(Config, 'IVF_N_PROBE', 4)
+    monkeypatch.setattr(Config, 'EMBEDDING_QUANTIZATION', 'none')
+    monkeypatch.setattr(Config, 'EMBEDDING_CACHE_PATH', None)
+
+    engine = SemanticEngine()
+    engine.save_path = tmp_path / "semantic_index"
+    engine.encoder = RawEncoder()
+    engine.train(catalog())
+    assert engine.index.kind == request.param
+    return engine
+
+
+def test_scores_and_ranking_match_reference_cosine(engine):
+    k = 10
+    songs = engine.encoder.encode(engine.describe(engine.data))
+    queries = RawEncoder().encode([f"query {i}" for i in range(20)]) * 7  # Not unit length either
+    reference = reference_cosine(queries, songs)
+
+    results = engine.search_vectors(queries, k)
+
+    for row, hits in zip(reference, results):
+        got = np.array([hit['score'] for hit in hits])
+        rows = np.array([int(hit['spotify_id']) for hit in hits])
+        assert len(hits) == k
+        np.testing.assert_allclose(got, np.sort(row)[::-1][:k], atol=1e-5)
+        np.testing.assert_allclose(row[rows], got, atol=1e-5)
+
+
+def test_stored_vectors_are_unit_length(engine):
+    norms = np.linalg.norm(np.asarray(engine.song_embeddings, dtype=np.float64), axis=1)
+    np.testing.assert_allclose(norms, 1.0, atol=1e-5)
@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+from fake_encoder import RawEncoder, catalog
+from src.config import Config
+from src.models import artifacts
+from src.models.semantic_engine import SemanticEngine
+
+
+@pytest.fixture(params=['flat', 'ivf'])
+def settings(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'SEMANTIC_INDEX', request.param)
+    monkeypatch.setattr(Config, 'IVF_N_LISTS', 4)
+    monkeypatch.setattr(Config, 'IVF_N_PROBE', 4)
+    monkeypatch.setattr(Config, 'EMBEDDING_QUANTIZATION', 'none')
+    monkeypatch.setattr(Config, 'EMBEDDING_CACHE_PATH', None)
+    monkeypatch.setattr(Config, 'COMPACT_TOMBSTONE_RATIO', 1.0)  # Compact only when a test asks
+    monkeypatch.setattr(Config, 'ENCODE_WORKERS', 1)
+    return tmp_path / "semantic_index"
+
+
+def new_engine(save_path):
+    engine = SemanticEngine()
+    engine.save_path = save_path
+    engine.encoder = RawEncoder()
+    return engine
+
+
+def reload(save_path):
+    engine = new_engine(save_path)
+    engine.load_from_disk(load_encoder=False)
+    return engine
+
+
+def top_id(engine, songs):
+    """Best hit for each song's own description (i.e. 'find this song')"""
+    vectors = RawEncoder().encode(engine.describe(songs))
+    return [hits[0]['spotify_id'] if hits else None for hits in engine.search_vectors(vectors, 1)]
+
+
+def test_add_skips_known_songs_and_survives_reload(settings):
+    engine = new_engine(settings)
+    engine.train(catalog(100))
+    engine.encoder.encoded = 0
+
+    added = engine.add_songs(catalog(10, start=95))  # 5 known, 5 new
+
+    assert added == 5 and engine.encoder.encoded == 5
+    assert len(engine.data) == 105
+    fresh = catalog(5, start=100)
+    assert top_id(engine, fresh) == fresh['id'].tolist()
+    assert top_id(reload(settings), fresh) == fresh['id'].tolist()
+
+
+def test_update_re_encodes_only_changed_songs(settings):
+    engine = new_engine(settings)
+    engine.train(catalog(100))
+    engine.encoder.encoded = 0
+    changed = catalog(3)
+    changed.loc[0, 'name'] = "Renamed"
+
+    assert engine.update_songs(changed) == 1 and engine.encoder.encoded == 1
+    reloaded = reload(settings)
+    assert top_id(reloaded, changed.iloc[:1]) == ["0"]
+    hits = reloaded.search_vectors(RawEncoder().encode(reloaded.describe(changed.iloc[:1])), 100)[0]
+    assert [hit['name'] for hit in hits if hit['spotify_id'] == "0"] == ["Renamed"]
+
+
+def test_remove_then_compact(settings):
+    engine = new_engine(settings)
+    engine.train(catalog(100))
+    gone = catalog(10)
+
+    assert engine.remove_songs(gone['id']) == 10
+    assert not set(top_id(engine, gone)) & set(gone['id'])
+    assert not set(top_id(reload(settings), gone)) & set(gone['id'])
+
+    kept = catalog(20, start=10)
+    before = top_id(engine, kept)
+    engine.compact()
+    compacted = reload(settings)
+
+    assert len(compacted.data) == 90 and not compacted.deleted.any()
+    assert len(compacted.song_embeddings) == 90
+    assert top_id(compacted, kept) == before == kept['id'].tolist()
+
+
+class FlakyEncoder(RawEncoder):
+    """Crashes (once) after encoding 'fail_after' texts"""
+
+    def __init__(self, fail_after):
+        super().__init__()
+        self.fail_after = fail_after
+
+    def encode(self, texts, **kwargs):
+        if self.fail_after is not None and self.encoded + len(texts) > self.fail_after:
+            self.fail_after = None
+            raise RuntimeError("crashed mid-build")
+        return super().encode(texts, **kwargs)
+
+
+def test_interrupted_build_resumes_from_finished_chunks(settings, monkeypatch):
+    monkeypatch.setattr(Config, 'ENCODE_CHUNK_SIZE', 25)
+    songs = catalog(100)
+    engine = new_engine(settings)
+    engine.encoder = FlakyEncoder(fail_after=50)
+
+    with pytest.raises(RuntimeError):
+        engine.train(songs)
+    engine.encoder.encoded = 0
+    engine.train(songs)
+
+    assert engine.encoder.encoded == 50  # Only the 2 chunks that weren't finished
+    expected = RawEncoder().encode(engine.describe(songs))
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    np.testing.assert_allclose(reload(settings).song_embeddings, expected, atol=1e-6)
+
+
+@pytest.mark.parametrize('quantization', ['none', 'int8', 'float16'])
+def test_removing_every_song(settings, monkeypatch, quantization):
+    monkeypatch.setattr(Config, 'EMBEDDING_QUANTIZATION', quantization)
+    monkeypatch.setattr(Config, 'COMPACT_TOMBSTONE_RATIO', 0.2)  # The default: removing everything auto-compacts
+    engine = new_engine(settings)
+    engine.train(catalog(50))
+
+    assert engine.remove_songs(catalog(50)['id']) == 50
+    assert len(engine.data) == 0
+    assert engine.search("anything", 5) == []
+    assert engine.search_many(["a", "b"], 5) == [[], []]
+
+    reloaded = reload(settings)
+    assert reloaded.search_many(["a"], 5) == [[]]
+
+    # ... and the index can grow again from nothing
+    assert reloaded.add_songs(catalog(5, start=100)) == 5
+    assert top_id(reloaded, catalog(5, start=100)) == catalog(5, start=100)['id'].tolist()
+
+
+def test_crashed_update_still_loads_and_retries(settings, monkeypatch):
+    engine = new_engine(settings)
+    engine.train(catalog(50))
+
+    with monkeypatch.context() as patch:
+        real = artifacts._replace_file
+        def replace_file(path, write):
+            if path.name == artifacts.MANIFEST_FILE:
+                raise KeyboardInterrupt("killed")
+            return real(path, write)
+        patch.setattr(artifacts, '_replace_file', replace_file)
+        with pytest.raises(KeyboardInterrupt):
+            engine.add_songs(catalog(5, start=50))
+
+    restarted = reload(settings)
+    assert len(restarted.data) == len(restarted.song_embeddings) == 50
+    assert restarted.add_songs(catalog(5, start=50)) == 5
+    assert top_id(reload(settings), catalog(5, start=50)) == catalog(5, start=50)['id'].tolist()
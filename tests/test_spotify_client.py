@@ -0,0 +1,83 @@
+import pytest
+from fake_spotify import FakeSpotify
+from src.config import Config
+from src.data.spotify_client import SpotifyHandler, TRACKS_BATCH_SIZE
+
+
+@pytest.fixture
+def server(monkeypatch):
+    with FakeSpotify(delay=0.05) as fake:
+        monkeypatch.setattr(Config, 'SPOTIFY_API_URL', fake.api_url)
+        monkeypatch.setattr(Config, 'SPOTIFY_TOKEN_URL', fake.token_url)
+        monkeypatch.setattr(Config, 'SPOTIFY_MAX_CONCURRENCY', 2)
+        yield fake
+
+
+def ids(n, prefix='known'):
+    return [f"{prefix}{i:04d}" for i in range(n)]
+
+
+def test_tracks_are_fetched_50_ids_per_call(server):
+    handler = SpotifyHandler()
+    tracks = handler.get_tracks(ids(120))
+
+    assert len(tracks) == 120
+    assert tracks['known0007']['cover'] == "medium.jpg"
+    sizes = sorted(len(query['ids'][0].split(',')) for query in server.calls('tracks'))
+    assert sizes == [20, TRACKS_BATCH_SIZE, TRACKS_BATCH_SIZE]
+
+
+def test_token_is_fetched_once_and_reused(server):
+    handler = SpotifyHandler()
+    handler.get_tracks(ids(60))
+    handler.get_tracks(ids(30, prefix='knownB'))
+    handler.ensure_token()
+
+    assert server.token_requests == 1
+
+
+def test_cached_tracks_skip_the_api(server):
+    handler = SpotifyHandler()
+    first = handler.get_tracks(ids(10) + ['missing1'])
+    calls = len(server.calls('tracks'))
+    second = handler.get_tracks(ids(10) + ['missing1'])
+
+    assert second == first
+    assert 'missing1' not in second
+    assert len(server.calls('tracks')) == calls  # Unknown ids are cached too
+    assert handler.track_cache.stats()['hits'] == 11
+
+
+def test_expired_tracks_are_fetched_again(server, monkeypatch):
+    monkeypatch.setattr(Config, 'SPOTIFY_CACHE_TTL', 0.0)
+    handler = SpotifyHandler()
+    handler.get_tracks(ids(5))
+    handler.get_tracks(ids(5))
+
+    assert len(server.calls('tracks')) == 2
+
+
+def test_concurrency_is_limited(server):
+    handler = SpotifyHandler()
+    handler.get_tracks(ids(8 * TRACKS_BATCH_SIZE))
+
+    assert len(server.calls('tracks')) == 8
+    assert server.max_in_flight == Config.SPOTIFY_MAX_CONCURRENCY
+
+
+def test_rate_limit_is_retried_by_one_layer_only(server):
+    handler = SpotifyHandler()
+    server.rate_limited = 1
+    tracks = handler.get_tracks(ids(5))
+
+    assert len(tracks) == 5
+    assert len(server.calls('tracks')) == 2  # The 429 + one retry
+
+
+def test_persistent_rate_limit_gives_up_after_max_retries(server, monkeypatch):
+    monkeypatch.setattr(Config, 'SPOTIFY_MAX_RETRIES', 2)
+    handler = SpotifyHandler()
+    server.rate_limited = 100
+
+    assert handler.get_tracks(ids(5)) == {}
+    assert len(server.calls('tracks')) == 3  # Not multiplied by the HTTP adapter's own retries
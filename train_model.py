@@ -1,10 +1,31 @@
+import argparse
 import pandas as pd
 from src.config import Config
+from src.data.track_store import load_tracks, current_watermark
 from src.models.recommender import ContentBasedRecommender
 from src.logger import get_logger
 
 logger = get_logger(__name__)
 
+def update_model():
+    """
+    Incremental mode: apply songs added to (or refreshed in) the track store since the last run.
+    Falls back to a full refit by itself if the feature distribution drifted.
+    """
+    recommender = ContentBasedRecommender()
+    recommender.load_model()
+    
+    # Read the watermark BEFORE the delta, so concurrent writes are picked up next time
+    watermark = current_watermark()
+    if watermark is None:
+        logger.error("❌ Incremental updates need the track store. Run the collector first!")
+        return
+        
+    df = load_tracks(since=recommender.watermark)
+    logger.info(f"📊 {len(df)} songs changed since the last training run")
+    recommender.watermark = watermark
+    recommender.add_tracks(df)
+
 def train_and_test():
     """
     1. Load Data
@@ -13,17 +34,19 @@ def train_and_test():
     """
     logger.info("🚀 Starting Model Training...")
     
-    # 1. Load Data
-    if not Config.RAW_DATA_PATH.exists():
-        logger.error(f"❌ Data file not found at {Config.RAW_DATA_PATH}. Run collector first!")
+    # 1. Load Data (track store if we have one, else the raw CSV)
+    try:
+        watermark = current_watermark()
+        df = load_tracks()
+    except FileNotFoundError as e:
+        logger.error(f"❌ {e}")
         return
 
-    df = pd.read_csv(Config.RAW_DATA_PATH)
     logger.info(f"📊 Loaded {len(df)} songs for training")
     
     # 2. Train
     recommender = ContentBasedRecommender()
-    recommender.train(df)
+    recommender.train(df, watermark=watermark)
     
     # 3. Test
     test_song = df.iloc[0]['name']
@@ -35,4 +58,11 @@ def train_and_test():
         logger.info(f"   {i+1}. {r['name']} (Score: {r['similarity_score']:.2f})")
 
 if __name__ == "__main__":
-    train_and_test()
+    parser = argparse.ArgumentParser(description="Train the content-based recommender")
+    parser.add_argument("--update", action="store_true", help="Only apply songs added or changed since the last run")
+    args = parser.parse_args()
+    
+    if args.update:
+        update_model()
+    else:
+        train_and_test()
@@ -1,24 +1,48 @@
+import argparse
 import pandas as pd
 from src.config import Config
+from src.data.track_store import load_tracks, current_watermark
 from src.models.semantic_engine import SemanticEngine
+from src.models.index import IVFIndex, recall_report, quantization_report
 from src.logger import get_logger
 
 logger = get_logger(__name__)
 
+def update_semantic():
+    """
+    Incremental mode: only encode songs that were added/changed in the
+    track store since the last run. Unchanged songs are never re-encoded.
+    """
+    engine = SemanticEngine()
+    engine.load_from_disk()
+    
+    # Read the watermark BEFORE the delta, so concurrent writes are picked up next time
+    watermark = current_watermark()
+    if watermark is None:
+        logger.error("❌ Incremental updates need the track store. Run the collector first!")
+        return
+        
+    df = load_tracks(since=engine.watermark)
+    logger.info(f"📊 {len(df)} songs changed since the last index update")
+    engine.watermark = watermark
+    engine.update_songs(df)
+
 def train_semantic():
     logger.info("🚀 Starting Semantic Indexing (Deep Learning)...")
     
-    # 1. Load Data
-    if not Config.RAW_DATA_PATH.exists():
-        logger.error(f"❌ Data file not found at {Config.RAW_DATA_PATH}. Run collector first!")
+    # 1. Load Data (track store if we have one, else the raw CSV)
+    try:
+        watermark = current_watermark()
+        df = load_tracks()
+    except FileNotFoundError as e:
+        logger.error(f"❌ {e}")
         return
 
-    df = pd.read_csv(Config.RAW_DATA_PATH)
     logger.info(f"📊 Loaded {len(df)} songs for indexing")
     
     # 2. Train (Encode)
     engine = SemanticEngine()
-    engine.train(df)
+    engine.train(df, watermark=watermark)
     
     # 3. Test
     test_query = "songs for a rainy breakup"
@@ -28,6 +52,39 @@ def train_semantic():
     
     for i, r in enumerate(results):
         logger.info(f"   {i+1}. {r['name']} by {r['artist']} (Confidence: {r['score']:.2f})")
+    
+    # 4. Recall vs Exact (how much does the approximate index lose?)
+    report_index = engine.index
+    if report_index.kind == 'flat':
+        # Small catalog: build a throwaway IVF index just to show the trade-off
+        report_index = IVFIndex().build(engine.song_embeddings)
+    
+    logger.info("📏 ANN Recall Report (vs exact search):")
+    for row in recall_report(report_index, engine.song_embeddings):
+        logger.info(
+            f"   {row['index']} n_probe={row.get('n_probe', '-')}: "
+            f"recall@k={row['recall@k']:.3f}, {row['ms_per_query']:.3f} ms/query "
+            f"(exact: {row['exact_ms_per_query']:.3f} ms)"
+        )
+        
+    # 5. Memory vs Recall of compressed vectors (EMBEDDING_QUANTIZATION)
+    logger.info("🗜️ Quantization Report (vs float32):")
+    for row in quantization_report(engine.song_embeddings):
+        logger.info(
+            f"   {row['quantization']:>7} rerank={row['rerank']}: {row['mb']:.2f} MB "
+            f"({row['memory_saved']:.0%} saved), recall@k={row['recall@k']:.3f}, "
+            f"{row['ms_per_query']:.3f} ms/query"
+        )
 
 if __name__ == "__main__":
-    train_semantic()
+    parser = argparse.ArgumentParser(description="Build the semantic search index")
+    parser.add_argument("--update", action="store_true", help="Only encode songs changed since the last run")
+    parser.add_argument("--compact", action="store_true", help="Drop removed songs and rebuild the index")
+    args = parser.parse_args()
+    
+    if args.compact:
+        SemanticEngine().compact()
+    elif args.update:
+        update_semantic()
+    else:
+        train_semantic()